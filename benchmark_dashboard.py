@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Load and latency benchmark for the SIA Local Control Dashboard.
+
+Runs the dashboard in a child process, updates it at a fixed rate and connects N
+Socket.IO clients and M /api/data pollers. Each update carries its send time in
+the system status, so clients can measure update_data -> receipt latency. Results
+(latency percentiles, throughput, server CPU and RSS) are written as JSON.
+
+    python benchmark_dashboard.py --clients 200 --pollers 20 --duration 30
+    python benchmark_dashboard.py --baseline old.json   # fail on a p99 regression
+    python benchmark_dashboard.py --wire --units 50     # JSON vs binary payload size and encode time
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import aiohttp
+import socketio
+
+
+def percentiles(samples):
+    """p50/p90/p99/max of a list of values, by nearest rank."""
+    if not samples:
+        return {"count": 0, "p50": None, "p90": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def process_usage(pid):
+    """CPU seconds, current and peak RSS (MB) of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        memory = {}
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    memory[key] = int(value.split()[0]) / 1024
+        return cpu, memory.get("VmRSS"), memory.get("VmHWM")
+    except (OSError, IndexError, ValueError):
+        return None, None, None
+
+
+def serve(args):
+    """Child process: run the dashboard and push an update every 1/rate seconds."""
+    from src.sia_local_control_ui.dashboard import DashboardInterface, SiaDashboard
+    from src.sia_local_control_ui.fleet import Fleet
+
+    dashboard = SiaDashboard(
+        host="127.0.0.1",
+        port=args.port,
+        max_broadcast_rate=args.max_broadcast_rate,
+        serving_mode=args.serving_mode,
+    )
+    dashboard_interface = DashboardInterface(dashboard)
+    dashboard_interface.start_dashboard()
+
+    names = [f"pump-{i}" for i in range(args.units)]
+    interval = 1.0 / args.rate
+    next_update = time.monotonic()
+    sequence = 0
+    while True:
+        sequence += 1
+        pumps = Fleet.from_rows(
+            "pumps",
+            names,
+            [
+                {
+                    "target_rate": 15.0,
+                    "flow_rate": 14.0 + (sequence + i) % 10 / 10,
+                    "pump_state": "auto",
+                }
+                for i in range(len(names))
+            ],
+        )
+        with dashboard_interface.batch():
+            dashboard_interface.update_pump_fleet(pumps)
+            dashboard_interface.update_tank_data(tank_level_mm=1000.0 + sequence % 100)
+            # the send time travels with the update, for the clients to measure latency
+            dashboard_interface.update_system_status(
+                f"bench {sequence} {time.time_ns()}"
+            )
+        next_update += interval
+        time.sleep(max(0.0, next_update - time.monotonic()))
+
+
+def wire_benchmark(args):
+    """Compare the size and encode time of JSON and binary payloads, without a server.
+
+    Data comes from a simulated fleet of ``--units`` pump and solar controllers. Full
+    updates are timed from ``to_dict()``, since neither format can reuse a cached dict;
+    patches are timed from the diff, which both formats share.
+    """
+    from src.sia_local_control_ui.delta import PatchLog
+    from src.sia_local_control_ui.encoding import RawJSON
+    from src.sia_local_control_ui.fleet import Fleet
+    from src.sia_local_control_ui.simulator import FleetSimulator
+    from src.sia_local_control_ui.snapshot import DashboardData
+    from src.sia_local_control_ui.tags import PUMP_TAGS, SOLAR_TAGS
+    from src.sia_local_control_ui.wire import BinaryCodec
+
+    simulator = FleetSimulator(pumps=args.units, solar=args.units, seed=1)
+    pump_apps = [pump.app_key for pump in simulator.pumps]
+    solar_apps = [solar.app_key for solar in simulator.solar]
+    codec = BinaryCodec()
+    patch_log = PatchLog()
+    snapshot = DashboardData()
+    samples = {"full": {"json": [], "binary": []}, "patch": {"json": [], "binary": []}}
+    sizes = {"full": {"json": [], "binary": []}, "patch": {"json": [], "binary": []}}
+
+    def encode_json(payload):
+        return RawJSON.encode(payload).data
+
+    def measure(kind, fmt, encode, payload):
+        start = time.perf_counter()
+        data = encode(payload)
+        samples[kind][fmt].append((time.perf_counter() - start) * 1000)
+        sizes[kind][fmt].append(len(data))
+
+    tags = simulator.store.tags
+    for step in range(args.iterations):
+        simulator.step(step * 0.2)
+        pumps = Fleet.from_rows(
+            "pumps",
+            pump_apps,
+            [
+                {
+                    metric: tags.get(app, {}).get(tag)
+                    for metric, tag in PUMP_TAGS.items()
+                }
+                for app in pump_apps
+            ],
+        )
+        solar = Fleet.from_rows(
+            "solar_units",
+            solar_apps,
+            [
+                {
+                    metric: tags.get(app, {}).get(tag)
+                    for metric, tag in SOLAR_TAGS.items()
+                }
+                for app in solar_apps
+            ],
+        )
+        tank = tags.get("sim_tank_1", {})
+        snapshot = snapshot.with_updates(
+            {
+                "pumps": pumps,
+                "solar_units": solar,
+                "pump": {
+                    "flow_rate": pumps.columns["flow_rate"][0],
+                    "target_rate": pumps.columns["target_rate"][0],
+                },
+                "solar": {
+                    "battery_percentage": solar.summary()["battery_percentage"]["mean"]
+                    or 0.0
+                },
+                "tank": {
+                    "tank_level_mm": tank.get("tank_level_mm", 0.0),
+                    "tank_level_percent": tank.get("tank_level_percent", 0.0),
+                },
+            }
+        )
+
+        # both formats encode the same payload dict
+        payload = {**snapshot.to_dict(), "version": snapshot.version}
+        measure("full", "json", encode_json, payload)
+        measure("full", "binary", codec.encode, payload)
+        patch = patch_log.record(snapshot.to_dict(), snapshot.version)
+        if patch is not None and step:
+            measure("patch", "json", encode_json, patch)
+            measure("patch", "binary", codec.encode, patch)
+
+    def summary(values):
+        return round(sum(values) / len(values), 4) if values else None
+
+    result = {
+        kind: {
+            fmt: {
+                "bytes": summary(sizes[kind][fmt]),
+                "encode_ms": summary(samples[kind][fmt]),
+            }
+            for fmt in ("json", "binary")
+        }
+        for kind in ("full", "patch")
+    }
+    for kind in ("full", "patch"):
+        json_bytes, binary_bytes = (
+            result[kind]["json"]["bytes"],
+            result[kind]["binary"]["bytes"],
+        )
+        result[kind]["binary_size_ratio"] = (
+            round(binary_bytes / json_bytes, 3) if json_bytes else None
+        )
+    result["units"] = args.units
+    result["iterations"] = args.iterations
+    return result
+
+
+class Results:
+    def __init__(self):
+        self.measuring = False
+        self.latencies = []
+        self.messages = 0
+        self.connected = 0
+        self.connect_errors = 0
+        self.poll_latencies = []
+        self.polls = 0
+        self.not_modified = 0
+        self.poll_errors = 0
+
+
+def receive(results, message, key):
+    """Record the latency of an update carrying a bench status."""
+    if not results.measuring:
+        return
+    results.messages += 1
+    section = message.get(key, {}) if isinstance(message, dict) else {}
+    status = (
+        section.get("system", {}).get("status") if isinstance(section, dict) else None
+    )
+    if isinstance(status, str) and status.startswith("bench "):
+        sent = int(status.split()[2])
+        results.latencies.append((time.time_ns() - sent) / 1e6)
+
+
+async def run_client(url, results, stop):
+    client = socketio.AsyncClient(reconnection=False)
+    client.on("data_patch", lambda message: receive(results, message, "patch"))
+    client.on(
+        "data_update", lambda message: receive(results, {"data": message}, "data")
+    )
+    try:
+        await client.connect(url, transports=["websocket"])
+        results.connected += 1
+    except Exception:
+        results.connect_errors += 1
+        return
+    await stop.wait()
+    await client.disconnect()
+
+
+async def run_poller(url, interval, results, stop):
+    etag = None
+    async with aiohttp.ClientSession() as session:
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                headers = {"If-None-Match": etag} if etag else {}
+                async with session.get(f"{url}/api/data", headers=headers) as response:
+                    await response.read()
+                    etag = response.headers.get("ETag", etag)
+                    if results.measuring:
+                        results.polls += 1
+                        results.not_modified += response.status == 304
+                        results.poll_latencies.append(
+                            (time.perf_counter() - start) * 1000
+                        )
+            except aiohttp.ClientError:
+                if results.measuring:
+                    results.poll_errors += 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+async def wait_for_server(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{url}/api/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Dashboard did not start on {url}")
+
+
+async def benchmark(args, pid):
+    url = f"http://127.0.0.1:{args.port}"
+    await wait_for_server(url)
+
+    results = Results()
+    stop = asyncio.Event()
+    tasks = [
+        asyncio.create_task(run_client(url, results, stop)) for _ in range(args.clients)
+    ]
+    tasks += [
+        asyncio.create_task(run_poller(url, args.poll_interval, results, stop))
+        for _ in range(args.pollers)
+    ]
+
+    await asyncio.sleep(args.warmup)
+    cpu_start, _rss, _peak = process_usage(pid)
+    started = time.monotonic()
+    results.measuring = True
+    await asyncio.sleep(args.duration)
+    results.measuring = False
+    elapsed = time.monotonic() - started
+    cpu_end, rss, peak_rss = process_usage(pid)
+
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("serve", "output", "baseline")
+        },
+        "platform": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "socket": {
+            "clients_connected": results.connected,
+            "connect_errors": results.connect_errors,
+            "messages": results.messages,
+            "messages_per_s": round(results.messages / elapsed, 1),
+            "latency_ms": percentiles(results.latencies),
+        },
+        "pollers": {
+            "requests": results.polls,
+            "requests_per_s": round(results.polls / elapsed, 1),
+            "not_modified": results.not_modified,
+            "errors": results.poll_errors,
+            "latency_ms": percentiles(results.poll_latencies),
+        },
+        "server": {
+            "cpu_percent": round((cpu_end - cpu_start) / elapsed * 100, 1)
+            if cpu_start is not None
+            else None,
+            "rss_mb": round(rss, 1) if rss is not None else None,
+            "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+        },
+    }
+
+
+def check_baseline(result, baseline_path, tolerance):
+    """Compare p99 latencies with a previous result; returns a list of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for section in ("socket", "pollers"):
+        old = baseline.get(section, {}).get("latency_ms", {}).get("p99")
+        new = result[section]["latency_ms"]["p99"]
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(
+                f"{section} p99 latency {new} ms is more than {tolerance:.0%} over baseline {old} ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--clients", type=int, default=50, help="Socket.IO clients")
+    parser.add_argument("--pollers", type=int, default=10, help="/api/data pollers")
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between each poller's requests",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=5.0, help="Dashboard updates per second"
+    )
+    parser.add_argument(
+        "--units", type=int, default=10, help="Pumps in the simulated fleet"
+    )
+    parser.add_argument("--max-broadcast-rate", type=float, default=5.0)
+    parser.add_argument(
+        "--serving-mode", choices=("threading", "async"), default="threading"
+    )
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=3.0, help="Seconds before measuring"
+    )
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument(
+        "--baseline", help="Earlier results file to compare p99 latency with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed p99 regression over the baseline",
+    )
+    parser.add_argument(
+        "--wire",
+        action="store_true",
+        help="Only compare JSON and binary payload size and encode time (per pump/solar --units)",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="Updates encoded by --wire"
+    )
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    if args.wire:
+        result = wire_benchmark(args)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(json.dumps(result, indent=2))
+        return
+
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", *sys.argv[1:]],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        result = asyncio.run(benchmark(args, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(
+        json.dumps(
+            {key: result[key] for key in ("socket", "pollers", "server")}, indent=2
+        )
+    )
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = check_baseline(result, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
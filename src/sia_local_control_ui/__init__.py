@@ -1,3 +1,5 @@
+# first, so that startup timings include every import
+from .startup import STARTUP
 from pydoover.docker import run_app
 
 from .application import SiaLocalControlUiApplication
@@ -7,4 +9,5 @@ def main():
     """
     Run the application.
     """
+    STARTUP.mark("imports")
     run_app(SiaLocalControlUiApplication(config=SiaLocalControlUiConfig()))
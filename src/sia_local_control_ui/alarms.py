@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .encoding import is_nan
+
+log = logging.getLogger(__name__)
+
+# high/low: the metric above/below the threshold
+# deviation: the metric differs from a reference metric by more than the threshold
+# rate: the metric changes faster than the threshold, in units per second
+ALARM_KINDS = ("high", "low", "deviation", "rate")
+SEVERITIES = ("info", "warning", "critical")
+
+
+def _config_value(element) -> Any:
+    """A config element's value; elements left out of an array item get their default (or None)."""
+    try:
+        return element.value
+    except ValueError:
+        return None if element.required else element.default
+
+
+class AlarmRule:
+    """One declarative alarm, e.g. ``solar.battery_percentage`` low at 20% with a 2% deadband.
+
+    ``metric`` (and ``reference``, for deviation rules) are metric names as in the
+    history: ``section.key``, or ``fleet.unit.metric``. An alarm raises when its
+    condition has held for ``on_delay`` seconds, and clears once the value is back
+    past the threshold by ``deadband`` and has stayed there for ``off_delay`` seconds.
+    """
+
+    __slots__ = (
+        "name",
+        "metric",
+        "kind",
+        "threshold",
+        "reference",
+        "deadband",
+        "on_delay",
+        "off_delay",
+        "severity",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        metric: str,
+        kind: str,
+        threshold: float,
+        reference: Optional[str] = None,
+        deadband: float = 0.0,
+        on_delay: float = 0.0,
+        off_delay: float = 0.0,
+        severity: str = "warning",
+    ):
+        if kind not in ALARM_KINDS:
+            raise ValueError(
+                f"Unknown alarm kind: {kind!r}, expected one of {ALARM_KINDS}"
+            )
+        if severity not in SEVERITIES:
+            raise ValueError(
+                f"Unknown alarm severity: {severity!r}, expected one of {SEVERITIES}"
+            )
+        if not name or not metric:
+            raise ValueError("An alarm needs a name and a metric")
+        if kind == "deviation" and not reference:
+            raise ValueError(f"Deviation alarm {name!r} needs a reference metric")
+        self.name = name
+        self.metric = metric
+        self.kind = kind
+        self.threshold = float(threshold)
+        self.reference = reference if kind == "deviation" else None
+        self.deadband = abs(float(deadband))
+        self.on_delay = max(float(on_delay), 0.0)
+        self.off_delay = max(float(off_delay), 0.0)
+        self.severity = severity
+
+    @classmethod
+    def from_config(cls, element) -> "AlarmRule":
+        """A rule from one element of the ``alarms`` config array."""
+        return cls(
+            _config_value(element.name),
+            _config_value(element.metric),
+            _config_value(element.kind),
+            _config_value(element.threshold),
+            reference=_config_value(element.reference_metric) or None,
+            deadband=_config_value(element.deadband),
+            on_delay=_config_value(element.on_delay),
+            off_delay=_config_value(element.off_delay),
+            severity=_config_value(element.severity),
+        )
+
+    @property
+    def metrics(self) -> Tuple[str, ...]:
+        """The metrics this rule depends on."""
+        return (self.metric, self.reference) if self.reference else (self.metric,)
+
+    def measure(
+        self, values: Dict[str, float], rates: Dict[str, float]
+    ) -> Optional[float]:
+        """The quantity compared with the threshold, or None if it can't be known yet."""
+        if self.kind == "rate":
+            rate = rates.get(self.metric)
+            return abs(rate) if rate is not None else None
+        value = values.get(self.metric)
+        if value is None:
+            return None
+        if self.kind == "deviation":
+            reference = values.get(self.reference)
+            return abs(value - reference) if reference is not None else None
+        return value
+
+    def condition(self, measured: float, active: bool) -> bool:
+        """Whether the alarm condition holds; an active alarm only clears past the deadband."""
+        if self.kind == "low":
+            return measured < self.threshold + (self.deadband if active else 0.0)
+        return measured > self.threshold - (self.deadband if active else 0.0)
+
+
+class AlarmState:
+    __slots__ = ("active", "since", "pending_since", "measured")
+
+    def __init__(self):
+        self.active = False
+        self.since: Optional[float] = None  # when the alarm last raised or cleared
+        self.pending_since: Optional[float] = (
+            None  # the condition changed, waiting out the delay
+        )
+        self.measured: Optional[float] = None
+
+
+class AlarmEngine:
+    """Evaluates :class:`AlarmRule` s incrementally as metrics change.
+
+    Rules are indexed by the metrics they depend on, so :meth:`update` only evaluates
+    the rules of metrics whose value actually changed: its cost depends on the
+    changes, not on the number of rules. Rules waiting out an on or off delay are
+    kept apart and rechecked by :meth:`tick`.
+
+    Both return alarm events, one per alarm raised or cleared. The active alarms are
+    kept by name in :attr:`active`; :meth:`record` adds events evaluated elsewhere,
+    e.g. by a relay's primary dashboard.
+    """
+
+    def __init__(self, rules: Iterable[AlarmRule] = ()):
+        self._lock = threading.Lock()
+        self.active: Dict[str, Dict[str, Any]] = {}
+        self.evaluations = 0
+        self.set_rules(rules)
+
+    def set_rules(self, rules: Iterable[AlarmRule]):
+        rules = list(rules)
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Alarm names must be unique")
+        with self._lock:
+            self.rules = {rule.name: rule for rule in rules}
+            self._by_metric: Dict[str, List[AlarmRule]] = {}
+            for rule in rules:
+                for metric in rule.metrics:
+                    self._by_metric.setdefault(metric, []).append(rule)
+            self._states = {rule.name: AlarmState() for rule in rules}
+            self._timed: Dict[
+                str, AlarmRule
+            ] = {}  # rules with a pending delay, or active rate alarms
+            self._values: Dict[str, float] = {}
+            self._rates: Dict[str, float] = {}
+            self._changed: Dict[str, float] = {}  # when each metric last changed
+            self.active = {}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def update(
+        self, values: Iterable[Tuple[str, float]], now: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Take new ``(metric, value)`` readings and evaluate the rules of those that changed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            touched = {}
+            for metric, value in values:
+                rules = self._by_metric.get(metric)
+                if rules is None or value is None or is_nan(value):
+                    continue
+                previous = self._values.get(metric)
+                if previous == value:
+                    continue
+                changed = self._changed.get(metric)
+                if previous is not None and changed is not None and now > changed:
+                    self._rates[metric] = (value - previous) / (now - changed)
+                self._values[metric] = value
+                self._changed[metric] = now
+                for rule in rules:
+                    touched[rule.name] = rule
+            return self._evaluate(touched.values(), now)
+
+    def tick(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Recheck rules waiting out a delay, and rate alarms whose metric has stopped changing."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._timed:
+                return []
+            for rule in self._timed.values():
+                if (
+                    rule.kind == "rate"
+                    and now - self._changed.get(rule.metric, now) >= 1.0
+                ):
+                    self._rates[rule.metric] = 0.0
+            return self._evaluate(list(self._timed.values()), now)
+
+    def _evaluate(self, rules: Iterable[AlarmRule], now: float) -> List[Dict[str, Any]]:
+        events = []
+        for rule in rules:
+            self.evaluations += 1
+            state = self._states[rule.name]
+            measured = rule.measure(self._values, self._rates)
+            if measured is None:
+                continue
+            state.measured = measured
+            if rule.condition(measured, state.active) == state.active:
+                state.pending_since = None
+            else:
+                if state.pending_since is None:
+                    state.pending_since = now
+                if now - state.pending_since >= (
+                    rule.off_delay if state.active else rule.on_delay
+                ):
+                    state.active = not state.active
+                    state.since = now
+                    state.pending_since = None
+                    events.append(self._event(rule, state))
+            if state.pending_since is not None or state.active and rule.kind == "rate":
+                self._timed[rule.name] = rule
+            else:
+                self._timed.pop(rule.name, None)
+        for event in events:
+            self._record(event)
+        return events
+
+    def _event(self, rule: AlarmRule, state: AlarmState) -> Dict[str, Any]:
+        subject = {
+            "deviation": f"{rule.metric} off {rule.reference} by",
+            "rate": f"{rule.metric} changing at",
+        }
+        comparison = "below" if rule.kind == "low" else "above"
+        message = f"{subject.get(rule.kind, rule.metric)} {state.measured:.4g}, {comparison} {rule.threshold:g}"
+        return {
+            "name": rule.name,
+            "metric": rule.metric,
+            "kind": rule.kind,
+            "severity": rule.severity,
+            "active": state.active,
+            "value": state.measured,
+            "threshold": rule.threshold,
+            "since": state.since,
+            "message": message if state.active else f"{rule.name} cleared",
+        }
+
+    def record(self, event: Dict[str, Any]):
+        """Track an alarm event evaluated elsewhere."""
+        with self._lock:
+            self._record(event)
+
+    def _record(self, event: Dict[str, Any]):
+        if event.get("active"):
+            self.active[event["name"]] = event
+        else:
+            self.active.pop(event.get("name"), None)
+
+    def replace_active(self, events: Iterable[Dict[str, Any]]):
+        """Replace the active alarms with those evaluated elsewhere, e.g. on reconnecting to a primary."""
+        with self._lock:
+            self.active = {
+                event["name"]: event for event in events if event.get("active")
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rules": len(self.rules),
+                "metrics": len(self._by_metric),
+                "active": len(self.active),
+                "timed": len(self._timed),
+                "evaluations": self.evaluations,
+            }
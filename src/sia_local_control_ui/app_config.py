@@ -22,6 +22,180 @@ class SiaLocalControlUiConfig(config.Schema):
         self.pressure_sensor_app = config.Application("Pressure Sensor App", description="A pressure sensor application")
             
         self.tank_level_app = config.Application("Tank Level App", description="The tank level application")
+        
+        self.pump_state_command_tag = config.String(
+            "Pump State Command Tag",
+            default="StateCommand",
+            description="Tag written on a pump controller app to change its state from the dashboard"
+        )
+        
+        self.target_rate_command_tag = config.String(
+            "Target Rate Command Tag",
+            default="TargetRateCommand",
+            description="Tag written on a pump controller app to change its target rate from the dashboard"
+        )
+        
+        self.pump_poll_interval = config.Number(
+            "Pump Poll Interval",
+            default=0.2,
+            minimum=0.05,
+            description="Seconds between reads of the pump controllers and skid sensors while their values are changing"
+        )
+        
+        self.solar_poll_interval = config.Number(
+            "Solar Poll Interval",
+            default=2.0,
+            minimum=0.05,
+            description="Seconds between reads of the solar controllers while their values are changing"
+        )
+        
+        self.tank_poll_interval = config.Number(
+            "Tank Poll Interval",
+            default=2.0,
+            minimum=0.05,
+            description="Seconds between reads of the tank level app while its values are changing"
+        )
+        
+        self.max_poll_interval = config.Number(
+            "Max Poll Interval",
+            default=10.0,
+            minimum=0.05,
+            description="Longest interval a data source backs off to while its values are stable and no client is connected"
+        )
+        
+        self.pump_stale_after = config.Number(
+            "Pump Stale After",
+            default=5.0,
+            minimum=0.1,
+            description="Seconds a pump or skid sensor tag may fail to read before its last good value is shown as stale"
+        )
+        
+        self.solar_stale_after = config.Number(
+            "Solar Stale After",
+            default=30.0,
+            minimum=0.1,
+            description="Seconds a solar controller tag may fail to read before its last good value is shown as stale"
+        )
+        
+        self.tank_stale_after = config.Number(
+            "Tank Stale After",
+            default=30.0,
+            minimum=0.1,
+            description="Seconds a tank level tag may fail to read before its last good value is shown as stale"
+        )
+        
+        self.max_broadcast_rate = config.Number(
+            "Max Broadcast Rate",
+            default=5.0,
+            minimum=0.0,
+            description="Maximum number of dashboard updates pushed to clients per second (0 to push every change)"
+        )
+        
+        self.client_queue_depth = config.Integer(
+            "Client Queue Depth",
+            default=8,
+            minimum=1,
+            description="Broadcasts queued for a slow client before its backlog is replaced by the newest data"
+        )
+        
+        self.client_max_lag = config.Number(
+            "Client Max Lag",
+            default=30.0,
+            minimum=1.0,
+            description="Seconds a client may stay behind before it is disconnected"
+        )
+        
+        self.serving_mode = config.Enum(
+            "Serving Mode",
+            choices=["threading", "async"],
+            default="threading",
+            description="Web server for the dashboard: 'threading' (Werkzeug, a thread per connection) or 'async' "
+                        "(asyncio Socket.IO server on aiohttp, for many concurrent clients)"
+        )
+        
+        self.dashboard_startup = config.Enum(
+            "Dashboard Startup",
+            choices=["parallel", "after_first_loop"],
+            default="parallel",
+            description="When the web server starts: 'parallel' (alongside setup and the first tag reads) or "
+                        "'after_first_loop' (once the first tag reads have been published)"
+        )
+        
+        self.enable_metrics = config.Boolean(
+            "Enable Metrics",
+            default=False,
+            description="Collect hot-path timings and serve them at /api/metrics (Prometheus text, or JSON with ?format=json)"
+        )
+        
+        self.history_directory = config.String(
+            "History Directory",
+            default="/data/sia_history",
+            description="Directory for the on-device history of dashboard values (leave empty to keep history in memory only)"
+        )
+        
+        self.record_tags_directory = config.String(
+            "Record Tags Directory",
+            default="",
+            description="Directory to record every tag read to, for replaying an incident with "
+                        "'python -m sia_local_control_ui.recorder' (leave empty to not record)"
+        )
+        
+        alarm = config.Object("Alarm", description="An alarm on one dashboard metric")
+        alarm.add_elements(
+            config.String("Name", description="Unique name of the alarm, e.g. 'Low battery'"),
+            config.String(
+                "Metric",
+                description="Metric checked, as in the history: 'section.key' (e.g. 'solar.battery_percentage') or "
+                            "'fleet.unit.metric' (e.g. 'pumps.<app key>.flow_rate')"
+            ),
+            config.Enum(
+                "Kind",
+                choices=["high", "low", "deviation", "rate"],
+                default="low",
+                description="'high'/'low': the metric above/below the threshold; 'deviation': the metric differs from "
+                            "the reference metric by more than the threshold; 'rate': the metric changes by more than "
+                            "the threshold per second"
+            ),
+            config.Number("Threshold", description="Value at which the alarm raises"),
+            config.String(
+                "Reference Metric",
+                default="",
+                description="For deviation alarms, the metric compared against (e.g. 'pump.target_rate')"
+            ),
+            config.Number(
+                "Deadband",
+                default=0.0,
+                minimum=0.0,
+                description="How far back past the threshold the value must go before the alarm clears"
+            ),
+            config.Number(
+                "On Delay",
+                default=0.0,
+                minimum=0.0,
+                description="Seconds the condition must hold before the alarm raises"
+            ),
+            config.Number(
+                "Off Delay",
+                default=0.0,
+                minimum=0.0,
+                description="Seconds the condition must stay clear before the alarm clears"
+            ),
+            config.Enum("Severity", choices=["info", "warning", "critical"], default="warning"),
+        )
+        self.alarms = config.Array(
+            "Alarms",
+            element=alarm,
+            description="Alarms evaluated on the dashboard data and pushed to connected clients"
+        )
+        # optional: no alarms unless configured (Array doesn't take a default argument)
+        self.alarms.default = []
+        
+        self.history_retention_days = config.Number(
+            "History Retention Days",
+            default=7.0,
+            minimum=1.0,
+            description="Number of days of history kept on the device"
+        )
 
 def export():
     SiaLocalControlUiConfig().export(Path(__file__).parents[2] / "doover_config.json", "sia_local_control_ui")
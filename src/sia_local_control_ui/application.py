@@ -1,11 +1,21 @@
+import asyncio
 import logging
 import time
 
 from pydoover.docker import Application
 from pydoover import ui
 
+from .alarms import AlarmRule
 from .app_config import SiaLocalControlUiConfig
-from .dashboard import SiaDashboard, DashboardInterface
+from .commands import Command, CommandQueue
+from .dashboard import SERVING_MODES, SiaDashboard, DashboardInterface
+from .fleet import Fleet
+from .polling import PollScheduler
+from .recorder import TagRecorder
+from .segments import SegmentStore
+from .startup import STARTUP
+from .tagcache import TagCache
+from .tags import PUMP_COMMAND_TAGS, PUMP_TAGS, SOLAR_TAGS, TagReadPlan, TagReader
 
 log = logging.getLogger()
 
@@ -13,162 +23,271 @@ class SiaLocalControlUiApplication(Application):
     config: SiaLocalControlUiConfig  # not necessary, but helps your IDE provide autocomplete!
 
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        with STARTUP.phase("application init"):
+            super().__init__(*args, **kwargs)
 
-        self.started: float = time.time()
-        
-        # Initialize dashboard
-        self.dashboard = SiaDashboard(host="0.0.0.0", port=8091, debug=False)
-        self.dashboard_interface = DashboardInterface(self.dashboard)
+            self.started: float = time.time()
+            
+            # Initialize dashboard; its web stack is only imported when it starts
+            self.dashboard = SiaDashboard(host="0.0.0.0", port=8091, debug=False)
+            self.dashboard_interface = DashboardInterface(self.dashboard)
+            
+            # Commands from the UI, written to the pump controllers as soon as they arrive
+            self.command_queue = CommandQueue(self.dispatch_command, self.dashboard.command_done)
+            self._first_loop = True
+            self.tag_recorder = None
 
     async def setup(self):
-        self.loop_target_period = 0.2
+        STARTUP.mark("setup started")
+        self.dashboard.publisher.max_rate = self.config.max_broadcast_rate.value
+        serving_mode = self.config.serving_mode.value
+        if serving_mode in SERVING_MODES:
+            self.dashboard.serving_mode = serving_mode
+        else:
+            log.error(f"Unknown serving mode {serving_mode!r}, expected one of {SERVING_MODES}; "
+                      f"serving in {self.dashboard.serving_mode!r} mode")
+        self.dashboard.fanout.max_queue = self.config.client_queue_depth.value
+        self.dashboard.fanout.max_lag = self.config.client_max_lag.value
+        self.dashboard.metrics.enabled = self.config.enable_metrics.value
+        
+        # Keep history on disk so it survives restarts
+        history_directory = self.config.history_directory.value
+        if history_directory:
+            try:
+                with STARTUP.phase("history index"):
+                    self.dashboard.history.archive = SegmentStore(
+                        history_directory, retention=self.config.history_retention_days.value * 86400
+                    )
+            except OSError as e:
+                log.warning(f"History will not be kept on disk, {history_directory} is not usable: {e}")
+        
+        # A bad alarm rule is skipped rather than disabling every alarm
+        rules = {}
+        for element in self.config.alarms.elements:
+            try:
+                rule = AlarmRule.from_config(element)
+            except (TypeError, ValueError) as e:
+                log.error(f"Ignoring alarm {element.name.value!r}: {e}")
+                continue
+            if rule.name in rules:
+                log.error(f"Ignoring alarm {rule.name!r}: the name is already used")
+                continue
+            rules[rule.name] = rule
+        self.dashboard.alarms.set_rules(rules.values())
+        
+        # Tags written on the pump controllers for UI commands; a blank one keeps its default
+        self.command_tags = {
+            "pump_state": self.config.pump_state_command_tag.value or PUMP_COMMAND_TAGS["pump_state"],
+            "target_rate": self.config.target_rate_command_tag.value or PUMP_COMMAND_TAGS["target_rate"],
+        }
+        await self.command_queue.start()
+        self.dashboard.command_handler = self.command_queue.submit
         
-        # Start dashboard
+        # "parallel": import and start the web stack in its own thread now, alongside the
+        # rest of setup and the first tag reads. "after_first_loop": wait until the first
+        # loop has read and published the tags, so the web stack can't delay them at all.
+        self.dashboard_startup = self.config.dashboard_startup.value
+        if self.dashboard_startup == "parallel":
+            self.start_dashboard()
+        
+        # Work out every tag we need to read once, rather than on every loop
+        self.tag_plan = TagReadPlan.from_config(self.config)
+        self.tag_reader = TagReader(self.tag_plan, self.get_tag, metrics=self.dashboard.metrics)
+        log.info(f"Reading {len(self.tag_plan)} tags from {len(self.tag_plan.pump_apps)} pump "
+                 f"and {len(self.tag_plan.solar_apps)} solar controllers")
+        
+        # Each source is polled at its own rate, backing off while its values are stable,
+        # and keeps showing its last good values for a while if its reads start failing
+        tag_cache = TagCache()
+        tag_cache.set_ttl(self.tag_plan.source_reads["pumps"], self.config.pump_stale_after.value)
+        tag_cache.set_ttl(self.tag_plan.source_reads["solar"], self.config.solar_stale_after.value)
+        tag_cache.set_ttl(self.tag_plan.source_reads["tank"], self.config.tank_stale_after.value)
+        self.poll_scheduler = PollScheduler(self.tag_plan.poll_sources({
+            "pumps": self.config.pump_poll_interval.value,
+            "solar": self.config.solar_poll_interval.value,
+            "tank": self.config.tank_poll_interval.value,
+        }, self.config.max_poll_interval.value), tag_cache)
+        self.loop_target_period = self.poll_scheduler.tick
+        self._published_status = None
+        
+        # Record every tag read, so an incident can be replayed later with identical input
+        self.read_tags = self.tag_reader.read
+        record_directory = self.config.record_tags_directory.value
+        if record_directory:
+            try:
+                self.tag_recorder = TagRecorder.create(record_directory, self.recording_config())
+                self.read_tags = self.tag_recorder.wrap(self.tag_reader.read)
+                log.info(f"Recording tags to {self.tag_recorder.path}")
+            except OSError as e:
+                log.warning(f"Tags will not be recorded, {record_directory} is not usable: {e}")
+        STARTUP.mark("setup")
+    
+    def recording_config(self) -> dict:
+        """The deployment config a tag recording needs to be replayed as it was read."""
+        plan = self.tag_plan
+        return {
+            "pump_controllers": plan.pump_apps,
+            "solar_controllers": plan.solar_apps,
+            "tank_level_app": plan.tank_app,
+            "flow_sensor_app": plan.flow_sensor_app,
+            "pressure_sensor_app": plan.pressure_sensor_app,
+            "pump_stale_after": self.config.pump_stale_after.value,
+            "solar_stale_after": self.config.solar_stale_after.value,
+            "tank_stale_after": self.config.tank_stale_after.value,
+            "max_broadcast_rate": self.config.max_broadcast_rate.value,
+        }
+    
+    def start_dashboard(self):
+        """Start the dashboard server in its background thread."""
         self.dashboard_interface.start_dashboard()
-        log.info("Dashboard started on port 8091")
+        log.info(f"Dashboard starting on port {self.dashboard.port}")
+
+    async def close(self):
+        """Shut down cleanly: stop taking commands, stop the dashboard, which writes out its
+        pending history, and finish the tag recording so it ends with a complete gzip trailer."""
+        await self.command_queue.stop()
+        # stopping the dashboard joins its threads, so keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.dashboard_interface.stop_dashboard)
+        if self.tag_recorder is not None:
+            self.tag_recorder.close()
+            log.info(f"Closed tag recording {self.tag_recorder.path}")
+        await super().close()
 
     async def main_loop(self):
+        metrics = self.dashboard.metrics
+        start = time.perf_counter()
+        scheduler = self.poll_scheduler
+        scheduler.set_active(bool(self.dashboard.connected_clients))
+        polled, changed = scheduler.poll(self.read_tags)
+        for source in polled:
+            metrics.polls.labels(source).inc()
+        
+        # Acquisition should only be a small slice of the loop period
+        if polled:
+            if self.tag_reader.last_duration > self.loop_target_period / 4:
+                log.warning(f"Tag acquisition is slow: {self.tag_reader.stats()}")
+            else:
+                log.debug(f"Tag acquisition of {polled}: {self.tag_reader.stats()}")
         
-        self.get_tag("flow_rate", self.config.flow_sensor_app.value)
-        self.get_tag("pressure", self.config.pressure_sensor_app.value)
-        self.get_tag("tank_level", self.config.tank_level_app.value)
-        # a random value we set inside our simulator. Go check it out in simulators/sample!
-        # Update dashboard with example data
-        await self.update_dashboard_data()
+        # Only publish when something changed; clients already have the rest
+        status = self.get_system_status()
+        if changed or status != self._published_status:
+            with metrics.update_duration.time():
+                await self.update_dashboard_data(scheduler.values)
+            self._published_status = status
+        elif polled:
+            metrics.unchanged_polls.inc()
+        
+        if self._first_loop:
+            self._first_loop = False
+            STARTUP.mark("first loop")
+            if self.dashboard_startup == "after_first_loop":
+                self.start_dashboard()
+        
+        if metrics.enabled:
+            duration = time.perf_counter() - start
+            metrics.loop_duration.observe(duration)
+            if duration > self.loop_target_period:
+                metrics.loop_overruns.inc()
     
-    async def update_dashboard_data(self):
-        """Update dashboard with data from various sources."""
+    async def dispatch_command(self, command: Command):
+        """Write a UI command to the pump controller it is for."""
+        pump_apps = self.tag_plan.pump_apps
+        if command.pump in pump_apps:
+            app_key = command.pump
+        else:
+            # "pump" and "pump2" are the first two pump controllers
+            index = {"pump": 0, "pump2": 1}.get(command.pump)
+            if index is None or index >= len(pump_apps):
+                raise ValueError(f"Unknown pump: {command.pump}")
+            app_key = pump_apps[index]
+        
+        await self.set_tag_async(self.command_tags[command.field], command.value, app_key=app_key, only_if_changed=False)
+        # Show the pump's response as soon as it has one
+        self.poll_scheduler.wake("pumps")
+    
+    async def update_dashboard_data(self, tags=None):
+        """Update dashboard with data from various sources.
+        
+        ``tags`` maps ``(app key, tag)`` to the value to show, by default the last good
+        values held in the poll scheduler's tag cache. A section whose tags have gone
+        stale keeps its last good values and is marked with when they were read.
+        """
+        cache = self.poll_scheduler.cache
+        if tags is None:
+            tags = cache.values
+        plan = self.tag_plan
+        
         try:
-            # Get pump control data from simulators
-            target_rate = self.get_tag("TargetRate", self.config.pump_controllers.elements[0]) if self.config.pump_controllers else 15.5
-            flow_rate = self.get_tag("FlowRate", self.config.pump_controllers.elements[0]) if self.config.pump_controllers else 14.2
-            pump_state = self.get_tag("StateString", self.config.pump_controllers.elements[0]) if self.config.pump_controllers else "auto"
-            
-            # Update pump data
-            self.dashboard_interface.update_pump_data(
-                target_rate=target_rate,
-                flow_rate=flow_rate,
-                pump_state=pump_state
-            )
-            
-            # Get pump 2 control data from simulators
-            if len(self.config.pump_controllers.elements) > 1:
-                pump2_target_rate = self.get_tag("TargetRate", self.config.pump_controllers.elements[1])
-                pump2_flow_rate = self.get_tag("FlowRate", self.config.pump_controllers.elements[1])
-                pump2_pump_state = self.get_tag("StateString", self.config.pump_controllers.elements[1])
-            else:
-                # Fallback values for pump 2 if not configured
-                pump2_target_rate = "-"
-                pump2_flow_rate = "-"
-                pump2_pump_state = "-"
-            
-            # Update pump 2 data
-            self.dashboard_interface.update_pump2_data(
-                target_rate=pump2_target_rate,
-                flow_rate=pump2_flow_rate,
-                pump_state=pump2_pump_state
-            )
-            
-            # Get and aggregate solar control data from all simulators
-            if self.config.solar_controllers:
-                battery_voltages = []
-                battery_percentages = []
-                panel_power_values = []
-                battery_ah_values = []
+            with self.dashboard_interface.batch():
+                # Per-unit data for every configured pump and solar controller
+                pumps = Fleet.from_rows("pumps", plan.pump_apps, plan.unit_rows(tags, plan.pump_apps, PUMP_TAGS))
+                solar_units = Fleet.from_rows("solar_units", plan.solar_apps, plan.unit_rows(tags, plan.solar_apps, SOLAR_TAGS))
+                self.dashboard_interface.update_pump_fleet(pumps)
+                self.dashboard_interface.update_solar_fleet(solar_units)
                 
-                # Collect data from all solar controllers
-                for solar_controller in self.config.solar_controllers.elements:
-                    battery_voltages.append(self.get_tag("b_voltage", solar_controller))
-                    battery_percentages.append(self.get_tag("b_percent", solar_controller))
-                    panel_power_values.append(self.get_tag("panel_power", solar_controller))
-                    battery_ah_values.append(self.get_tag("remaining_ah", solar_controller))
+                # The first two pumps also fill the pump and pump 2 panels
+                if plan.pump_apps:
+                    pump = pumps.unit(plan.pump_apps[0])
+                    
+                    # Update pump data
+                    self.dashboard_interface.update_pump_data(
+                        target_rate=pump["target_rate"],
+                        flow_rate=pump["flow_rate"],
+                        pump_state=pump["pump_state"]
+                    )
                 
-                # Aggregate data: average voltages/percentages, sum battery_ah
-                battery_voltage = sum(battery_voltages) / len(battery_voltages)
-                battery_percentage = sum(battery_percentages) / len(battery_percentages)
-                panel_power = sum(panel_power_values) / len(panel_power_values)
-                battery_ah = sum(battery_ah_values)
-            else:
-                # Fallback values if no solar controllers configured
-                battery_voltage = 24.5
-                battery_percentage = 78.0
-                panel_power = 150.0
-                battery_ah = 120.0
-            
-            # Update solar data
-            self.dashboard_interface.update_solar_data(
-                battery_voltage=battery_voltage,
-                battery_percentage=battery_percentage,
-                array_voltage=panel_power,
-                battery_ah=battery_ah
-            )
-            
-            # Get tank control data from simulators
-            tank_level_mm = self.get_tag("tank_level_mm", self.config.tank_level_app.value) if self.config.tank_apps else 1250.0
-            tank_level_percent = self.get_tag("tank_level_percent", self.config.tank_level_app.value) if self.config.tank_apps else 62.5
-            
-            # Update tank data
-            self.dashboard_interface.update_tank_data(
-                tank_level_mm=tank_level_mm,
-                tank_level_percent=tank_level_percent
-            )
-            
-            # Update system status
-            system_status = "running" if self.state.state == "on" else "standby"
-            self.dashboard_interface.update_system_status(system_status)
+                if len(plan.pump_apps) > 1:
+                    pump2 = pumps.unit(plan.pump_apps[1])
+                    
+                    # Update pump 2 data
+                    self.dashboard_interface.update_pump2_data(
+                        target_rate=pump2["target_rate"],
+                        flow_rate=pump2["flow_rate"],
+                        pump_state=pump2["pump_state"]
+                    )
+                
+                # Aggregate solar data across all controllers: average voltages/percentages, sum battery_ah
+                if plan.solar_apps:
+                    summary = solar_units.summary()
+                    
+                    # Update solar data
+                    self.dashboard_interface.update_solar_data(
+                        battery_voltage=summary["battery_voltage"]["mean"],
+                        battery_percentage=summary["battery_percentage"]["mean"],
+                        array_voltage=summary["panel_power"]["mean"],
+                        battery_ah=summary["battery_ah"]["total"]
+                    )
+                
+                # Update tank data
+                if plan.tank_app:
+                    self.dashboard_interface.update_tank_data(
+                        tank_level_mm=tags.get((plan.tank_app, "tank_level_mm")),
+                        tank_level_percent=tags.get((plan.tank_app, "tank_level_percent"))
+                    )
+                
+                # Skid flow and pressure come from the flow and pressure sensor apps
+                self.dashboard_interface.update_skid_data(
+                    skid_flow=tags.get((plan.flow_sensor_app, "flow_rate")),
+                    skid_pressure=tags.get((plan.pressure_sensor_app, "pressure"))
+                )
+                
+                # A failing source only marks its own sections stale
+                self.dashboard_interface.update_stale_sections({
+                    section: cache.stale_since(reads) for section, reads in plan.section_reads.items()
+                })
+                
+                # Update system status
+                system_status = self.get_system_status()
+                self.dashboard_interface.update_system_status(system_status)
             
         except Exception as e:
             log.error(f"Error updating dashboard data: {e}")
-            # Use fallback data if simulators are not available
-            self.update_dashboard_with_fallback_data()
     
-    def update_dashboard_with_fallback_data(self):
-        """Update dashboard with fallback data when simulators are not available."""
-        import random
-        
-        # Generate realistic fallback data
-        target_rate = 15.0 + random.uniform(-2.0, 2.0)
-        flow_rate = target_rate + random.uniform(-1.0, 1.0)
-        pump_state = random.choice(["standby", "auto", "calibration"])
-        
-        self.dashboard_interface.update_pump_data(
-            target_rate=target_rate,
-            flow_rate=flow_rate,
-            pump_state=pump_state
-        )
-        
-        # Generate pump 2 fallback data
-        pump2_target_rate = 12.0 + random.uniform(-1.5, 1.5)
-        pump2_flow_rate = pump2_target_rate + random.uniform(-0.8, 0.8)
-        pump2_pump_state = random.choice(["standby", "auto", "calibration"])
-        
-        self.dashboard_interface.update_pump2_data(
-            target_rate=pump2_target_rate,
-            flow_rate=pump2_flow_rate,
-            pump_state=pump2_pump_state
-        )
-        
-        # Generate realistic fallback solar data (simulating aggregated values)
-        battery_voltage = 24.0 + random.uniform(-2.0, 2.0)
-        battery_percentage = 75.0 + random.uniform(-10.0, 10.0)
-        panel_power = 150.0 + random.uniform(-30.0, 30.0)
-        battery_ah = 120.0 + random.uniform(-20.0, 20.0)
-        
-        self.dashboard_interface.update_solar_data(
-            battery_voltage=battery_voltage,
-            battery_percentage=battery_percentage,
-            array_voltage=panel_power,
-            battery_ah=battery_ah
-        )
-        
-        tank_level_mm = 1000.0 + random.uniform(-200.0, 200.0)
-        tank_level_percent = (tank_level_mm / 2000.0) * 100
-        
-        self.dashboard_interface.update_tank_data(
-            tank_level_mm=tank_level_mm,
-            tank_level_percent=tank_level_percent
-        )
-        
-        system_status = "running" if self.state.state == "on" else "standby"
-        self.dashboard_interface.update_system_status(system_status)
+    def get_system_status(self) -> str:
+        """Get the system status shown on the dashboard."""
+        # this app doesn't have a state machine (yet), so it's running whenever the loop is
+        state = getattr(self, "state", None)
+        if state is None:
+            return "running"
+        return "running" if state.state == "on" else "standby"
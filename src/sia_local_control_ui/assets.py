@@ -0,0 +1,271 @@
+import functools
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(PACKAGE_DIR, "static")
+TEMPLATE_DIR = os.path.join(PACKAGE_DIR, "templates")
+STATIC_PREFIX = "/static/"
+
+# fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# files worth compressing, and the precompressed variants kept beside them, best first
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_STATIC_URL = re.compile(
+    r"\{\{\s*url_for\(\s*'static'\s*,\s*filename\s*=\s*'([^']+)'\s*\)\s*\}\}"
+)
+
+# (status, headers, body)
+AssetResponse = Tuple[int, Dict[str, str], bytes]
+
+
+def _compress(coding: str, data: bytes) -> Optional[bytes]:
+    if coding == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if coding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+
+def accepted_encodings(header: Optional[str]) -> set:
+    """Content codings an ``Accept-Encoding`` header allows."""
+    codings = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q=") and quality[2:].strip() in (
+            "0",
+            "0.0",
+            "0.00",
+            "0.000",
+        ):
+            continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
+
+
+class Asset:
+    """One servable body and its compressed variants."""
+
+    __slots__ = ("content_type", "etag", "cache_control", "variants")
+
+    def __init__(
+        self,
+        content_type: str,
+        etag: str,
+        cache_control: str,
+        variants: Dict[str, bytes],
+    ):
+        self.content_type = content_type
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variants = variants  # content coding ("identity", "gzip", "br") -> body
+
+    def respond(
+        self, accept_encoding: Optional[str] = None, if_none_match: Optional[str] = None
+    ) -> AssetResponse:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(if_none_match, self.etag):
+            return 304, headers, b""
+        accepted = accepted_encodings(accept_encoding)
+        coding = next(
+            (
+                coding
+                for coding, _suffix in ENCODINGS
+                if coding in accepted and coding in self.variants
+            ),
+            "identity",
+        )
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        headers["Content-Type"] = self.content_type
+        return 200, headers, self.variants[coding]
+
+
+def _file_variants(path: str, data: bytes) -> Dict[str, bytes]:
+    """A file's body and its precompressed variants, compressing any that are missing or stale."""
+    variants = {"identity": data}
+    if os.path.splitext(path)[1] not in COMPRESSIBLE:
+        return variants
+    mtime = os.path.getmtime(path)
+    for coding, suffix in ENCODINGS:
+        try:
+            if os.path.getmtime(path + suffix) >= mtime:
+                with open(path + suffix, "rb") as f:
+                    variants[coding] = f.read()
+                continue
+        except OSError:
+            pass
+        compressed = _compress(coding, data)
+        if compressed is not None:
+            log.debug(
+                f"No precompressed {coding} variant of {path}, compressed it at startup"
+            )
+            variants[coding] = compressed
+    return {
+        coding: body
+        for coding, body in variants.items()
+        if len(body) < len(data) or coding == "identity"
+    }
+
+
+class StaticAssets:
+    """The files under ``static/``, served under fingerprinted URLs.
+
+    Every file is also served as ``name.<hash>.ext``, where ``<hash>`` is taken from its
+    contents; :meth:`url` returns that URL, so it can be cached for a year and a new
+    release is picked up straight away. Precompressed ``.br``/``.gz`` variants written
+    next to the files by :func:`build` are served as they are, to clients that accept
+    them. Files are read once, when the assets are first loaded.
+    """
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self._urls: Dict[str, str] = {}
+        self._assets: Dict[str, Asset] = {}
+        for name in _static_files(directory):
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, ext = os.path.splitext(name)
+            fingerprinted = f"{stem}.{digest}{ext}"
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type in (
+                "application/javascript",
+                "image/svg+xml",
+            ):
+                content_type += "; charset=utf-8"
+            variants = _file_variants(path, data)
+            self._urls[name] = STATIC_PREFIX + fingerprinted
+            self._assets[fingerprinted] = Asset(
+                content_type, f'"{digest}"', IMMUTABLE, variants
+            )
+            # the plain name keeps working, but must be revalidated
+            self._assets[name] = Asset(
+                content_type, f'"{digest}"', REVALIDATE, variants
+            )
+
+    def url(self, filename: str) -> str:
+        """The fingerprinted URL of a static file."""
+        return self._urls.get(filename, STATIC_PREFIX + filename)
+
+    def respond(
+        self,
+        filename: str,
+        accept_encoding: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Optional[AssetResponse]:
+        """Serve ``/static/<filename>``, or None if there is no such file."""
+        asset = self._assets.get(filename)
+        if asset is None:
+            return None
+        return asset.respond(accept_encoding, if_none_match)
+
+
+def _static_files(directory: str) -> Iterable[str]:
+    suffixes = tuple(suffix for _coding, suffix in ENCODINGS)
+    for root, _dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.endswith(suffixes):
+                yield os.path.relpath(os.path.join(root, name), directory).replace(
+                    os.sep, "/"
+                )
+
+
+@functools.cache
+def static_assets() -> StaticAssets:
+    """The package's static files, loaded once per process."""
+    return StaticAssets()
+
+
+def static_url(filename: str) -> str:
+    return static_assets().url(filename)
+
+
+@functools.cache
+def index_asset() -> Asset:
+    """The dashboard page, rendered once per process.
+
+    Its only template expressions are ``url_for('static', ...)`` asset URLs, so it is
+    filled in with fingerprinted URLs without Jinja, and both serving modes serve the
+    same cached bytes.
+    """
+    with open(os.path.join(TEMPLATE_DIR, "dashboard.html"), encoding="utf-8") as f:
+        template = f.read()
+    page = _STATIC_URL.sub(lambda match: static_url(match.group(1)), template).encode(
+        "utf-8"
+    )
+    variants = {"identity": page}
+    for coding, _suffix in ENCODINGS:
+        compressed = _compress(coding, page)
+        if compressed is not None:
+            variants[coding] = compressed
+    digest = hashlib.sha256(page).hexdigest()[:12]
+    return Asset("text/html; charset=utf-8", f'"{digest}"', REVALIDATE, variants)
+
+
+def index_page() -> bytes:
+    return index_asset().variants["identity"]
+
+
+def build(directory: str = STATIC_DIR) -> int:
+    """Write precompressed variants of the compressible static files; returns how many were written.
+
+    Run at image build time (``python -m sia_local_control_ui.assets``) so the dashboard
+    serves them straight from disk.
+    """
+    encodings = ENCODINGS
+    if brotli is None:
+        log.warning("Not writing brotli variants, the brotli module is not installed")
+        encodings = tuple(
+            (coding, suffix) for coding, suffix in ENCODINGS if coding != "br"
+        )
+    written = 0
+    for name in _static_files(directory):
+        path = os.path.join(directory, name)
+        if os.path.splitext(name)[1] not in COMPRESSIBLE:
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        for coding, suffix in encodings:
+            compressed = _compress(coding, data)
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+                written += 1
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Wrote {build()} precompressed static files to {STATIC_DIR}")
@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# commandable pump fields and how their values are validated
+PUMP_STATES = ("standby", "auto", "calibration")
+PUMP_COMMAND_FIELDS = {
+    "pump_state": lambda value: PUMP_STATES[PUMP_STATES.index(str(value))],
+    "target_rate": lambda value: _non_negative(float(value)),
+}
+
+
+def _non_negative(value: float) -> float:
+    if not value >= 0:
+        raise ValueError(f"{value} is not a valid rate")
+    return value
+
+
+class Command:
+    """A UI command for one field of one pump, e.g. set pump 2's state to ``auto``.
+
+    ``pump`` is a pump controller app key, or ``"pump"``/``"pump2"`` for the first
+    two pumps. ``id`` is chosen by the client and echoed back in its ack.
+    """
+
+    __slots__ = ("id", "pump", "field", "value", "sid", "received")
+
+    def __init__(
+        self, id: Any, pump: str, field: str, value: Any, sid: Optional[str] = None
+    ):
+        self.id = id
+        self.pump = pump
+        self.field = field
+        self.value = value
+        self.sid = sid
+        self.received = time.perf_counter()
+
+    @classmethod
+    def from_message(cls, data: Any, sid: Optional[str] = None) -> "Command":
+        """Validate a ``send_command`` message; raises ``ValueError`` if it isn't a valid command."""
+        if not isinstance(data, dict):
+            raise ValueError("Command must be an object")
+        field = data.get("field")
+        if field not in PUMP_COMMAND_FIELDS:
+            raise ValueError(f"Unknown command field: {field}")
+        pump = data.get("pump", "pump")
+        if not isinstance(pump, str) or not pump:
+            raise ValueError(f"Invalid pump: {pump!r}")
+        try:
+            value = PUMP_COMMAND_FIELDS[field](data.get("value"))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid {field}: {data.get('value')!r}") from None
+        return cls(data.get("id"), pump, field, value, sid)
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """Commands with the same key supersede each other."""
+        return self.pump, self.field
+
+    def ack(
+        self, status: str, error: Optional[str] = None, **timings: float
+    ) -> Dict[str, Any]:
+        """The ``command_ack`` message for this command."""
+        message = {
+            "id": self.id,
+            "pump": self.pump,
+            "field": self.field,
+            "value": self.value,
+            "status": status,
+        }
+        if error:
+            message["error"] = error
+        message.update(
+            {name: round(value * 1000, 3) for name, value in timings.items()}
+        )
+        return message
+
+
+class CommandQueue:
+    """Dispatches UI commands from the application's event loop as soon as they arrive.
+
+    Commands may be submitted from any thread. A command still waiting when a newer
+    one for the same pump and field arrives is superseded and never dispatched, so a
+    burst of clicks results in one write of the final value. ``dispatch(command)``
+    performs the write; ``done(command, status, error, queued, total)`` is called
+    once per command with ``status`` one of ``"ok"``, ``"failed"`` or ``"superseded"``
+    and the time spent queued and in total, in seconds.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[Command], Awaitable[None]],
+        done: Callable[[Command, str, Optional[str], float, float], None],
+    ):
+        self._dispatch = dispatch
+        self._done = done
+        self._pending: Dict[Tuple[str, str], Command] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def start(self):
+        """Start dispatching on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def submit(self, command: Command):
+        """Queue a command. Safe to call from any thread."""
+        if self._loop is None:
+            raise RuntimeError("Command queue is not running")
+        self._loop.call_soon_threadsafe(self._enqueue, command)
+
+    def _enqueue(self, command: Command):
+        previous = self._pending.pop(command.key, None)
+        if previous is not None:
+            self._finish(previous, "superseded")
+        self._pending[command.key] = command
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                key = next(iter(self._pending))
+                command = self._pending.pop(key)
+                started = time.perf_counter()
+                try:
+                    await self._dispatch(command)
+                except Exception as e:
+                    log.error(
+                        f"Command {command.field}={command.value!r} for {command.pump} failed: {e}"
+                    )
+                    self._finish(command, "failed", str(e), started)
+                else:
+                    self._finish(command, "ok", None, started)
+
+    def _finish(
+        self,
+        command: Command,
+        status: str,
+        error: Optional[str] = None,
+        started: Optional[float] = None,
+    ):
+        now = time.perf_counter()
+        queued = (started if started is not None else now) - command.received
+        try:
+            self._done(command, status, error, queued, now - command.received)
+        except Exception as e:
+            log.error(f"Error acknowledging command: {e}")
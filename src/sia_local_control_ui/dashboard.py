@@ -3,245 +3,724 @@ import json
 import logging
 import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Mapping, Optional, Tuple
 
-from flask import Flask, render_template, request
-from flask_socketio import SocketIO, emit
-import socketio
+from .alarms import AlarmEngine
+from .assets import TEMPLATE_DIR, index_asset, static_assets
+from .commands import Command
+from .delta import PatchLog, select_topics
+from .encoding import PacketJSON, RawJSON
+from .fanout import FanOut
+from .fleet import FLEETS, Fleet
+from .history import HistoryStore
+from .metrics import DashboardMetrics
+from .publisher import CoalescingPublisher
+from .snapshot import FIELD_INDEX, DashboardData, SnapshotStore, iter_metrics
+from .startup import STARTUP
+from .stream import STREAM_HEADERS, DataStream, StreamHub
+from .wire import FORMATS, BinaryCodec, WirePayload
 
 log = logging.getLogger(__name__)
 
+# "threading": Flask-SocketIO on the Werkzeug server, a thread per connection.
+# "async": an asyncio Socket.IO server on aiohttp, see serving.py.
+SERVING_MODES = ("threading", "async")
 
-class DashboardData:
-    """Container for dashboard data with validation and default values."""
-    
-    def __init__(self):
-        # Pump Control Data
-        self.target_rate: float = 0.0
-        self.flow_rate: float = 0.0
-        self.pump_state: str = "standby"
-        
-        # Pump 2 Control Data
-        self.pump2_target_rate: float = 0.0
-        self.pump2_flow_rate: float = 0.0
-        self.pump2_pump_state: str = "standby"
-        
-        # Solar Control Data
-        self.battery_voltage: float = 0.0
-        self.battery_percentage: float = 0.0
-        self.panel_power: float = 0.0
-        self.battery_ah: float = 0.0
-        
-        # Tank Control Data
-        self.tank_level_mm: float = 0.0
-        self.tank_level_percent: float = 0.0
-        
-        # Skid Control Data
-        self.skid_flow: float = 0.0
-        self.skid_pressure: float = 0.0
-        
-        # System Data
-        self.timestamp: datetime = datetime.now()
-        self.system_status: str = "running"
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for JSON serialization."""
-        return {
-            "pump": {
-                "target_rate": self.target_rate,
-                "flow_rate": self.flow_rate,
-                "pump_state": self.pump_state
-            },
-            "pump2": {
-                "target_rate": self.pump2_target_rate,
-                "flow_rate": self.pump2_flow_rate,
-                "pump_state": self.pump2_pump_state
-            },
-            "solar": {
-                "battery_voltage": self.battery_voltage,
-                "battery_percentage": self.battery_percentage,
-                "panel_power": self.panel_power,
-                "battery_ah": self.battery_ah
-            },
-            "tank": {
-                "tank_level_mm": self.tank_level_mm,
-                "tank_level_percent": self.tank_level_percent
-            },
-            "skid": {
-                "skid_flow": self.skid_flow,
-                "skid_pressure": self.skid_pressure
-            },
-            "system": {
-                "timestamp": self.timestamp.isoformat(),
-                "status": self.system_status
-            }
-        }
-    
-    def update_from_dict(self, data: Dict[str, Any]):
-        """Update from dictionary with validation."""
-        if "pump" in data:
-            pump = data["pump"]
-            self.target_rate = float(pump.get("target_rate", self.target_rate))
-            self.flow_rate = float(pump.get("flow_rate", self.flow_rate))
-            self.pump_state = str(pump.get("pump_state", self.pump_state))
-        
-        if "pump2" in data:
-            pump2 = data["pump2"]
-            self.pump2_target_rate = float(pump2.get("target_rate", self.pump2_target_rate))
-            self.pump2_flow_rate = float(pump2.get("flow_rate", self.pump2_flow_rate))
-            self.pump2_pump_state = str(pump2.get("pump_state", self.pump2_pump_state))
-        
-        if "solar" in data:
-            solar = data["solar"]
-            self.battery_voltage = float(solar.get("battery_voltage", self.battery_voltage))
-            self.battery_percentage = float(solar.get("battery_percentage", self.battery_percentage))
-            self.panel_power = float(solar.get("panel_power", self.panel_power))
-            self.battery_ah = float(solar.get("battery_ah", self.battery_ah))
-        
-        if "tank" in data:
-            tank = data["tank"]
-            self.tank_level_mm = float(tank.get("tank_level_mm", self.tank_level_mm))
-            self.tank_level_percent = float(tank.get("tank_level_percent", self.tank_level_percent))
-        
-        if "skid" in data:
-            skid = data["skid"]
-            self.skid_flow = float(skid.get("skid_flow", self.skid_flow))
-            self.skid_pressure = float(skid.get("skid_pressure", self.skid_pressure))
-        
-        if "system" in data:
-            system = data["system"]
-            self.system_status = str(system.get("status", self.system_status))
-        
-        self.timestamp = datetime.now()
+# frame render times taken from one client report, about 15 s of frames at 60 Hz
+MAX_RENDER_SAMPLES = 1000
 
 
 class SiaDashboard:
-    """Flask dashboard with WebSocket support for SIA Local Control UI."""
+    """Flask dashboard with WebSocket support for SIA Local Control UI.
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 8091, debug: bool = False):
+    Routes and Socket.IO events are handled by the framework-neutral methods
+    below, so both serving modes behave the same. The web stack is only imported
+    and built when the dashboard starts (or :attr:`app` is first used), so creating
+    a dashboard doesn't hold up the control loop.
+    """
+    
+    def __init__(self, host: str = "0.0.0.0", port: int = 8091, debug: bool = False, max_broadcast_rate: float = 5.0,
+                 serving_mode: str = "threading", enable_metrics: bool = False, client_queue_depth: int = 8,
+                 client_max_lag: float = 30.0, upstream: Optional[str] = None):
+        if serving_mode not in SERVING_MODES:
+            raise ValueError(f"Unknown serving mode: {serving_mode!r}, expected one of {SERVING_MODES}")
         self.host = host
         self.port = port
         self.debug = debug
+        self.serving_mode = serving_mode
+        
+        # AsyncDashboardServer while serving in async mode
+        self._server = None
+        
+        # Flask app and SocketIO server for the threading mode, built on first use
+        self._app = None
+        self._socketio = None
+        self._web_lock = threading.Lock()
+        
+        # Dashboard data, swapped atomically as immutable snapshots
+        self.store = SnapshotStore()
+        
+        # Versioned patch log used for delta broadcasts
+        self.patch_log = PatchLog()
+        self.patch_log.record(self.data.to_dict(), self.data.version)
+        self._published = self.data
+        self._publish_lock = threading.Lock()
         
-        # Create Flask app
-        self.app = Flask(__name__, 
-                        template_folder='templates',
-                        static_folder='static')
-        self.app.config['SECRET_KEY'] = 'sia_dashboard_secret_key'
+        # Bounded history of every numeric value, for trends
+        self.history = HistoryStore()
         
-        # Create SocketIO instance
-        self.socketio = SocketIO(self.app, cors_allowed_origins="*")
+        # Alarm rules, evaluated as the metrics they depend on change
+        self.alarms = AlarmEngine()
         
-        # Dashboard data container
-        self.data = DashboardData()
+        # Coalesces data changes into at most `max_broadcast_rate` broadcasts per second
+        self.publisher = CoalescingPublisher(self.broadcast_update, max_rate=max_broadcast_rate)
         
         # Connection tracking
         self.connected_clients = set()
         
-        # Setup routes and event handlers
-        self._setup_routes()
-        self._setup_socket_events()
+        # HTTP consumers of /api/stream, woken on each broadcast
+        self.streams = StreamHub(lambda: self._published)
+        
+        # Clients that asked for the binary wire format, instead of JSON
+        self.client_formats: Dict[str, str] = {}
+        self.codec = BinaryCodec()
+        
+        # Render stats reported by each client's browser, for /api/clients
+        self.client_render: Dict[str, Dict[str, Any]] = {}
+        
+        # Called with each validated UI Command; set by the application to dispatch
+        # them to the pump controllers. Without it, commands only change the dashboard.
+        self.command_handler = None
+        
+        # In relay mode, the data is mirrored from the primary dashboard at `upstream`
+        self.relay = None
+        if upstream:
+            from .relay import DashboardRelay
+            self.relay = DashboardRelay(self, upstream)
+        
+        # Per-client outbound queues; slow clients get the newest data, not the backlog
+        self.fanout = FanOut(self.emit_to, self._catch_up, max_queue=client_queue_depth, max_lag=client_max_lag)
+        # Clients subscribed to the same topics share a room; the last version each room was sent
+        self._room_versions: Dict[Tuple[str, ...], int] = {}
+        
+        # Hot-path instrumentation, served at /api/metrics when enabled
+        self.metrics = DashboardMetrics(enabled=enable_metrics)
+        self.metrics.add_gauges(self)
         
         # Background thread for data updates
         self._update_thread = None
         self._running = False
     
-    def _setup_routes(self):
+    @property
+    def published(self) -> DashboardData:
+        """The snapshot most recently broadcast to clients."""
+        return self._published
+    
+    @property
+    def data(self) -> DashboardData:
+        """The current data snapshot. Safe to read from any thread."""
+        return self.store.current
+    
+    @property
+    def app(self):
+        """The Flask app, built on first use."""
+        if self._app is None:
+            self._init_web()
+        return self._app
+    
+    @property
+    def socketio(self):
+        """The Flask-SocketIO server, built on first use."""
+        if self._socketio is None:
+            self._init_web()
+        return self._socketio
+    
+    def _init_web(self):
+        """Import Flask and Flask-SocketIO and build the app, its routes and event handlers."""
+        with self._web_lock:
+            if self._app is not None:
+                return
+            with STARTUP.phase('web stack import'):
+                from flask import Flask
+                from flask_socketio import SocketIO
+            
+            with STARTUP.phase('web app setup'):
+                # static files are served by our own route, with fingerprinted URLs
+                app = Flask(__name__, template_folder=TEMPLATE_DIR, static_folder=None)
+                app.config['SECRET_KEY'] = 'sia_dashboard_secret_key'
+                
+                # Payloads are pre-encoded once and spliced into packets
+                self._socketio = SocketIO(app, cors_allowed_origins="*", json=PacketJSON)
+                self._setup_routes(app)
+                self._setup_socket_events(self._socketio)
+                self._app = app
+    
+    def _setup_routes(self, app):
         """Setup Flask routes."""
+        from flask import Response, abort, request
+        
+        def asset_response(result):
+            if result is None:
+                abort(404)
+            status, headers, body = result
+            return Response(body, status=status, headers=headers)
         
-        @self.app.route('/')
+        @app.route('/')
         def index():
-            return render_template('dashboard.html')
+            return asset_response(index_asset().respond(request.headers.get('Accept-Encoding'),
+                                                        request.headers.get('If-None-Match')))
         
-        @self.app.route('/api/data')
-        def get_data():
-            """REST API endpoint to get current data."""
-            return self.data.to_dict()
+        @app.route('/static/<path:filename>')
+        def static_file(filename):
+            return asset_response(static_assets().respond(filename, request.headers.get('Accept-Encoding'),
+                                                          request.headers.get('If-None-Match')))
         
-        @self.app.route('/api/health')
+        @app.route('/api/data')
+        def get_data():
+            """REST API endpoint to get current data.
+            
+            The body is the snapshot's cached encoding; clients sending a matching
+            ``If-None-Match`` get a ``304 Not Modified`` without a body.
+            """
+            snapshot = self.data
+            response = Response(snapshot.encoded().data, mimetype='application/json')
+            response.set_etag(snapshot.etag)
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        
+        @app.route('/api/stream')
+        def get_stream():
+            """Stream each published version as NDJSON or Server-Sent Events (see :class:`DataStream`)."""
+            try:
+                stream = DataStream.from_args(request.args, request.headers.get('Accept'))
+            except ValueError as e:
+                return {"error": str(e)}, 400
+            return Response(self.streams.frames(stream), content_type=stream.content_type, headers=STREAM_HEADERS)
+        
+        @app.route('/api/fleet/<kind>')
+        def get_fleet(kind):
+            fleet = self.fleet_response(kind)
+            if fleet is None:
+                abort(404)
+            return fleet
+        
+        @app.route('/api/fleet/<kind>/units/<name>')
+        def get_fleet_unit(kind, name):
+            unit = self.fleet_unit_response(kind, name)
+            if unit is None:
+                abort(404)
+            return unit
+        
+        @app.route('/api/history')
+        def get_history():
+            body, status = self.history_response(request.args)
+            return Response(RawJSON.encode(body).data, status=status, mimetype='application/json')
+        
+        @app.route('/api/alarms')
+        def get_alarms():
+            return self.alarms_response()
+        
+        @app.route('/api/health')
         def health():
-            """Health check endpoint."""
-            return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+            return self.health_response()
+        
+        @app.route('/api/clients')
+        def get_clients():
+            return self.clients_response()
+        
+        @app.route('/api/metrics')
+        def get_metrics():
+            body, content_type, status = self.metrics_response(request.args.get('format'))
+            return Response(body, status=status, content_type=content_type)
+    
+    def fleet_response(self, kind: str) -> Optional[Dict[str, Any]]:
+        """Per-unit readings and fleet aggregates for ``pumps`` or ``solar_units``, or None if unknown."""
+        if kind not in FLEETS:
+            return None
+        return self.data.fleets[kind].to_dict()
+    
+    def fleet_unit_response(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        """Readings for a single pump or solar controller, or None if unknown."""
+        return self.data.fleets[kind].unit(name) if kind in FLEETS else None
+    
+    def history_response(self, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+        """Downsampled history of one metric, as ``(body, status)``.
+        
+        Query parameters: ``metric`` (e.g. ``tank.tank_level_percent``), ``from`` and
+        ``to`` as epoch seconds (default: the last hour) and ``max_points`` (default 500).
+        Without ``metric``, lists the recorded metrics.
+        """
+        metric = args.get('metric')
+        if not metric:
+            return {"metrics": self.history.metrics()}, 200
+        try:
+            end = float(args.get('to', time.time()))
+            start = float(args.get('from', end - 3600))
+            max_points = min(max(int(args.get('max_points', 500)), 2), 5000)
+        except ValueError as e:
+            return {"error": f"Invalid query parameter: {e}"}, 400
+        
+        result = self.history.query(metric, start, end, max_points)
+        if result is None:
+            return {"error": f"Unknown metric: {metric}"}, 404
+        return result, 200
+    
+    def alarms_response(self) -> Dict[str, Any]:
+        """The active alarms, with rule and evaluation counts."""
+        return {**self.alarms.stats(), "active": list(self.alarms.active.values())}
+    
+    def publish_alarms(self, events):
+        """Send alarm events (one per alarm raised or cleared) to every client."""
+        for event in events:
+            if event['active']:
+                log.warning(f"Alarm {event['name']} ({event['severity']}): {event['message']}")
+            else:
+                log.info(f"Alarm {event['name']} cleared")
+            self.metrics.alarm_changes.labels(event['severity'], 'raised' if event['active'] else 'cleared').inc()
+            self.emit('alarm', event)
+    
+    def health_response(self) -> Dict[str, Any]:
+        """Health check endpoint."""
+        health = {"status": "healthy", "timestamp": datetime.now().isoformat(), "startup": STARTUP.to_dict()}
+        if self.relay is not None:
+            health["relay"] = self.relay.stats()
+        return health
+    
+    def clients_response(self) -> Dict[str, Any]:
+        """Outbound queue state of every connected client (lag, queue depth and drop counts) and its render stats."""
+        clients = self.fanout.stats()
+        for sid, stats in clients.items():
+            stats["render"] = self.client_render.get(sid)
+        return {"count": len(self.fanout), "clients": clients, "streams": self.streams.stats()}
     
-    def _setup_socket_events(self):
+    def metrics_response(self, fmt: Optional[str] = None) -> Tuple[bytes, str, int]:
+        """Instrumentation as ``(body, content type, status)``.
+        
+        Prometheus text by default, or compact JSON with ``fmt="json"``.
+        """
+        if not self.metrics.enabled:
+            return RawJSON.encode({"error": "Metrics are disabled"}).data, 'application/json', 404
+        if fmt == 'json':
+            return RawJSON.encode(self.metrics.to_dict()).data, 'application/json', 200
+        return self.metrics.prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8', 200
+    
+    def _setup_socket_events(self, socketio):
         """Setup WebSocket event handlers."""
+        from flask import request
+        from flask_socketio import emit
         
-        @self.socketio.on('connect')
-        def handle_connect():
-            """Handle client connection."""
-            self.connected_clients.add(request.sid)
-            log.info(f"Client connected: {request.sid}")
-            log.info(f"Total connected clients: {len(self.connected_clients)}")
-            
-            # Send current data to newly connected client
-            emit('data_update', self.data.to_dict())
+        @socketio.on('connect')
+        def handle_connect(auth=None):
+            emit(*self.client_connected(request.sid, auth))
         
-        @self.socketio.on('disconnect')
+        @socketio.on('disconnect')
         def handle_disconnect():
-            """Handle client disconnection."""
-            self.connected_clients.discard(request.sid)
-            log.info(f"Client disconnected: {request.sid}")
-            log.info(f"Total connected clients: {len(self.connected_clients)}")
-        
-        @self.socketio.on('request_data')
-        def handle_data_request():
-            """Handle explicit data request from client."""
-            emit('data_update', self.data.to_dict())
-        
-        @self.socketio.on('set_pump_state')
-        def handle_pump_state_change(data):
-            """Handle pump state change from client."""
-            try:
-                if 'state' in data:
-                    self.data.pump_state = str(data['state'])
-                    self.data.timestamp = datetime.now()
-                    log.info(f"Pump state changed to: {self.data.pump_state}")
-                    
-                    # Broadcast update to all clients
-                    self.broadcast_update()
-            except Exception as e:
-                log.error(f"Error handling pump state change: {e}")
-                emit('error', {'message': str(e)})
+            self.client_disconnected(request.sid)
+        
+        @socketio.on('request_data')
+        def handle_data_request(data=None):
+            emit(*self.data_request(data, request.sid))
+        
+        @socketio.on('subscribe')
+        def handle_subscribe(data=None):
+            emit(*self.subscribe_request(data, request.sid))
+        
+        @socketio.on('set_format')
+        def handle_format_request(data=None):
+            return self.format_request(data, request.sid)
+        
+        @socketio.on('relay_ping')
+        def handle_relay_ping(data=None):
+            return self.ping_request()
+        
+        @socketio.on('request_alarms')
+        def handle_alarms_request(data=None):
+            emit('alarms', self.alarms_response())
+        
+        @socketio.on('request_fleet')
+        def handle_fleet_request(data=None):
+            emit(*self.fleet_request(data))
+        
+        @socketio.on('render_stats')
+        def handle_render_stats(data=None):
+            reply = self.render_stats_request(data, request.sid)
+            if reply:
+                emit(*reply)
+        
+        @socketio.on('set_pump_state')
+        def handle_pump_state_change(data=None):
+            reply = self.pump_state_request(data, request.sid)
+            if reply:
+                emit(*reply)
+        
+        @socketio.on('send_command')
+        def handle_command(data=None):
+            reply = self.command_request(data, request.sid)
+            if reply:
+                emit(*reply)
+    
+    def client_connected(self, sid: str, auth: Any = None) -> Tuple[str, Any]:
+        """Handle client connection, returning the current data to send it.
+        
+        A client that connects with ``{"ack": true}`` as its auth acknowledges each
+        update and is paced by its acks; any other gets best-effort delivery.
+        """
+        published = self._published
+        paced = isinstance(auth, dict) and auth.get('ack') is True
+        self.connected_clients.add(sid)
+        self.fanout.add(sid, published.version, paced)
+        log.info(f"Client connected: {sid}")
+        log.info(f"Total connected clients: {len(self.connected_clients)}")
+        return 'data_update', published.encoded()
+    
+    def client_disconnected(self, sid: str):
+        """Handle client disconnection."""
+        self.connected_clients.discard(sid)
+        self.client_formats.pop(sid, None)
+        self.client_render.pop(sid, None)
+        self.fanout.remove(sid)
+        log.info(f"Client disconnected: {sid}")
+        log.info(f"Total connected clients: {len(self.connected_clients)}")
+    
+    def data_request(self, data=None, sid: Optional[str] = None) -> Tuple[str, Any]:
+        """Handle explicit data request from client.
+        
+        If the client sends the last version it applied (``{"since": version}``),
+        it is caught up with a single merged ``data_patch`` where possible,
+        otherwise a full ``data_update`` resync is sent.
+        """
+        since = data.get('since') if isinstance(data, dict) else None
+        room = self.fanout.room(sid) if sid is not None else None
+        event, payload, version = self._catch_up(since if isinstance(since, int) else None, room)
+        if sid is not None:
+            self.fanout.resynced(sid, version)
+        return event, payload.encoded(self.client_formats.get(sid, 'json'))
+    
+    def _catch_up(self, since: Optional[int], room: Optional[Tuple[str, ...]] = None) -> Tuple[str, WirePayload, int]:
+        """``(event, payload, version)`` bringing a client from version ``since`` to the latest.
+        
+        Clients in a ``room`` only get the topics they subscribed to.
+        """
+        if since is not None:
+            catch_up = self.patch_log.since(since)
+            if catch_up is not None:
+                if room is not None:
+                    catch_up = {**catch_up, 'patch': select_topics(catch_up['patch'], room)}
+                return 'data_patch', WirePayload(catch_up, self.codec), catch_up['version']
+        published = self._published
+        if room is not None:
+            message = {**select_topics(published.to_dict(), room), 'version': published.version}
+            return 'data_update', WirePayload(message, self.codec), published.version
+        message = {**published.to_dict(), 'version': published.version}
+        return 'data_update', WirePayload(message, self.codec, published.encoded()), published.version
+    
+    def ping_request(self) -> Dict[str, Any]:
+        """Reply to a relay's ``relay_ping``: this host's clock and the latest published version."""
+        return {'time': datetime.now().isoformat(), 'version': self._published.version}
+    
+    def subscribe_request(self, data=None, sid: Optional[str] = None) -> Tuple[str, Any]:
+        """Subscribe a client to some topics (``{"topics": [...]}``), or to everything (no topics).
+        
+        A topic is a section (``"tank"``) or one unit of a fleet (``"pumps/pump-1"``).
+        The client is sent those parts of the current data straight away, then only
+        patches that change them; clients subscribed to the same topics share a room.
+        """
+        topics = data.get('topics') if isinstance(data, dict) else None
+        try:
+            room = self._room(topics)
+        except ValueError as e:
+            return 'error', {'message': str(e)}
+        with self._publish_lock:
+            event, payload, version = self._catch_up(None, room)
+            if room is not None:
+                self._room_versions.setdefault(room, version)
+            if sid is not None:
+                self.fanout.join(sid, room, version)
+        return event, payload.encoded(self.client_formats.get(sid, 'json'))
+    
+    @staticmethod
+    def _room(topics) -> Optional[Tuple[str, ...]]:
+        """The room for a list of topics: sorted, without units of fleets subscribed to in full."""
+        if not topics:
+            return None
+        if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+            raise ValueError("Expected {'topics': [section or fleet/unit, ...]}")
+        whole = {topic for topic in topics if '/' not in topic}
+        room = set()
+        for topic in topics:
+            section, _, unit = topic.partition('/')
+            if section not in FIELD_INDEX and section not in FLEETS or unit and section not in FLEETS:
+                raise ValueError(f"Unknown topic: {topic}")
+            if not unit or section not in whole:
+                room.add(topic)
+        return tuple(sorted(room))
+    
+    def format_request(self, data=None, sid: Optional[str] = None) -> Dict[str, Any]:
+        """Switch a client to a wire format (``{"format": "json" | "binary"}``), acknowledged with the binary schema.
+        
+        Binary clients get ``data_update`` and ``data_patch`` payloads encoded by
+        :class:`~sia_local_control_ui.wire.BinaryCodec`; everything else stays JSON.
+        Clients ask again, for the grown schema, when a payload needs a newer one.
+        """
+        wire_format = data.get('format') if isinstance(data, dict) else None
+        if wire_format not in FORMATS:
+            return {'error': f"Unknown format: {wire_format}, expected one of {FORMATS}"}
+        if sid is not None:
+            self.client_formats[sid] = wire_format
+        reply = {'format': wire_format}
+        if wire_format == 'binary':
+            # cover the paths of full updates and patches of the current data
+            published = self._published
+            self.codec.register({**published.to_dict(), 'version': published.version})
+            self.codec.register({'version': published.version, 'base': published.version, 'patch': published.to_dict()})
+            reply['schema'] = self.codec.schema()
+        return reply
+    
+    def render_stats_request(self, data=None, sid: Optional[str] = None) -> Optional[Tuple[str, Any]]:
+        """Record a client's ``render_stats``, sent every few seconds by the dashboard page.
+        
+        A report has the frames rendered, updates received and DOM writes since the
+        client's last report, and each frame's render time in ``render_ms``. Render times
+        go into the server's metrics; the totals and the latest report's render times
+        are shown by ``/api/clients``.
+        """
+        samples = data.get('render_ms') if isinstance(data, dict) else None
+        counts = {key: data.get(key, 0) for key in ('frames', 'updates', 'writes')} if isinstance(data, dict) else {}
+        if (not isinstance(samples, list) or not all(self._is_count(value) for value in counts.values())
+                or not all(self._is_count(sample) for sample in samples)):
+            return 'error', {'message': "Expected {'frames': n, 'updates': n, 'writes': n, 'render_ms': [ms, ...]}"}
+        
+        samples = sorted(samples[:MAX_RENDER_SAMPLES])
+        for sample in samples:
+            self.metrics.client_render.observe(sample / 1000)
+        self.metrics.client_updates.inc(counts['updates'])
+        self.metrics.client_writes.inc(counts['writes'])
+        if sid is None or sid not in self.connected_clients:
+            return None
+        totals = self.client_render.setdefault(sid, {'frames': 0, 'updates': 0, 'writes': 0})
+        for key, value in counts.items():
+            totals[key] += int(value)
+        if samples:
+            totals['render_avg_ms'] = round(sum(samples) / len(samples), 3)
+            totals['render_p95_ms'] = round(samples[int(len(samples) * 0.95)], 3)
+            totals['render_max_ms'] = round(samples[-1], 3)
+        return None
+    
+    @staticmethod
+    def _is_count(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 <= value < float('inf')
+    
+    def fleet_request(self, data=None) -> Tuple[str, Any]:
+        """Reply with one fleet (``{"kind": ...}``) or one of its units (``{"kind": ..., "unit": ...}``)."""
+        kind = data.get('kind') if isinstance(data, dict) else None
+        if kind not in FLEETS:
+            return 'error', {'message': f"Unknown fleet: {kind}"}
+        fleet = self.data.fleets[kind]
+        name = data.get('unit')
+        if name is None:
+            return 'fleet_data', {'kind': kind, **fleet.to_dict()}
+        unit = fleet.unit(name)
+        if unit is None:
+            return 'error', {'message': f"Unknown unit: {name}"}
+        return 'fleet_data', {'kind': kind, 'unit': name, 'data': unit}
+    
+    def pump_state_request(self, data=None, sid: Optional[str] = None) -> Optional[Tuple[str, Any]]:
+        """Handle pump state change from client (``{"state": ...}``), as a command for the first pump."""
+        if not isinstance(data, dict) or 'state' not in data:
+            return 'error', {'message': "Expected {'state': ...}"}
+        return self.command_request({'id': data.get('id'), 'pump': 'pump', 'field': 'pump_state',
+                                     'value': data['state']}, sid)
+    
+    def command_request(self, data=None, sid: Optional[str] = None) -> Optional[Tuple[str, Any]]:
+        """Handle a ``send_command`` from a client.
+        
+        Valid commands are passed to :attr:`command_handler` and acknowledged with
+        ``command_ack`` once dispatched. Invalid ones are rejected straight away.
+        """
+        try:
+            command = Command.from_message(data, sid)
+        except ValueError as e:
+            self.metrics.commands.labels('rejected').inc()
+            return 'command_ack', {'id': data.get('id') if isinstance(data, dict) else None,
+                                   'status': 'rejected', 'error': str(e)}
+        
+        log.info(f"Command from {sid}: {command.field}={command.value!r} for {command.pump}")
+        if self.command_handler is not None:
+            self.command_handler(command)
+            return None
+        
+        # Nothing to dispatch to; just show the change on the dashboard
+        if command.pump in ('pump', 'pump2'):
+            self.store.update({command.pump: {command.field: command.value}})
+            self.publisher.request()
+        self.metrics.commands.labels('local').inc()
+        return 'command_ack', command.ack('local')
+    
+    def command_done(self, command: Command, status: str, error: Optional[str], queued: float, total: float):
+        """Acknowledge a dispatched command to the client that sent it."""
+        self.metrics.commands.labels(status).inc()
+        if status == 'ok':
+            self.metrics.command_duration.observe(total)
+        if command.sid is not None:
+            self.emit_to(command.sid, 'command_ack', command.ack(status, error, queued_ms=queued, total_ms=total))
+    
+    def emit_to(self, sid: str, event: str, data: Any, callback=None):
+        """Send an event to one client, from any thread; ``callback`` runs when the client acknowledges it."""
+        if isinstance(data, WirePayload):
+            data = data.encoded(self.client_formats.get(sid, 'json'))
+        if self._server is not None:
+            self._server.emit_to(sid, event, data, callback)
+        elif self._socketio is not None:
+            self._socketio.emit(event, data, to=sid, callback=callback)
+    
+    def disconnect_client(self, sid: str):
+        """Disconnect one client, from any thread."""
+        if self._server is not None:
+            self._server.disconnect(sid)
+        elif self._socketio is not None:
+            self._socketio.server.disconnect(sid)
+    
+    def emit(self, event: str, data: Any):
+        """Send an event to every connected client, from any thread."""
+        if self._server is not None:
+            self._server.emit(event, data)
+        elif self._socketio is None:
+            return  # not serving yet, so there is nobody to send to
+        elif self.metrics.enabled:
+            start = time.perf_counter()
+            self._socketio.emit(event, data)
+            self.metrics.observe_emit(time.perf_counter() - start, len(self.connected_clients))
+        else:
+            self._socketio.emit(event, data)
+    
+    def full_payload(self) -> RawJSON:
+        """Get the latest published data with its version, for full resyncs."""
+        return self._published.encoded()
     
     def broadcast_update(self):
-        """Broadcast data update to all connected clients."""
-        if self.connected_clients:
-            self.socketio.emit('data_update', self.data.to_dict())
+        """Broadcast the fields changed since the last version to all connected clients."""
+        metrics = self.metrics
+        with self._publish_lock:
+            snapshot = self.data
+            with metrics.to_dict_duration.time():
+                payload = snapshot.to_dict()
+            with metrics.encode_duration.time():
+                message = self.patch_log.record(payload, snapshot.version)
+                encoded = WirePayload(message, self.codec) if message is not None else None
+            if message is None:
+                return
+            rooms = self._room_payloads(message)
+            self._published = snapshot
+        
+        metrics.broadcasts.inc()
+        if metrics.enabled:
+            start = time.perf_counter()
+            self.fanout.publish('data_patch', encoded, snapshot.version, rooms)
+            metrics.observe_emit(time.perf_counter() - start, len(self.fanout))
+        else:
+            self.fanout.publish('data_patch', encoded, snapshot.version, rooms)
+        self.streams.published(snapshot.version)
+    
+    def _room_payloads(self, message: Dict[str, Any]) -> Dict[Tuple[str, ...], Optional[WirePayload]]:
+        """The part of a ``data_patch`` for each room clients are in, or None where none of its topics changed.
+        
+        A room's patch is based on the last version the room was sent, so clients can
+        tell they missed nothing in between.
+        """
+        rooms = {}
+        for room in self.fanout.rooms():
+            patch = select_topics(message['patch'], room)
+            if patch:
+                base = self._room_versions.get(room, message['base'])
+                rooms[room] = WirePayload({'version': message['version'], 'base': base, 'patch': patch}, self.codec)
+                self._room_versions[room] = message['version']
+            else:
+                rooms[room] = None
+        # forget rooms nobody is in any more
+        for room in self._room_versions.keys() - rooms.keys():
+            del self._room_versions[room]
+        return rooms
     
     def update_data(self, **kwargs):
-        """Update dashboard data and broadcast to clients."""
-        try:
-            # Update data container
-            if kwargs:
-                self.data.update_from_dict(kwargs)
-                self.broadcast_update()
-                log.debug(f"Dashboard data updated: {kwargs}")
-        except Exception as e:
-            log.error(f"Error updating dashboard data: {e}")
+        """Update dashboard data and schedule a broadcast to clients."""
+        # Validate each section on its own, so a bad value in one section of a
+        # batched update doesn't discard the others
+        changes = {}
+        fleets = {}
+        for section, values in kwargs.items():
+            try:
+                if section in FLEETS:
+                    fleets[section] = DashboardData.coerce_fleet(values)
+                else:
+                    changes.update(DashboardData.coerce_section(section, values))
+            except Exception as e:
+                log.error(f"Error updating dashboard data: {e}")
+        
+        if changes or fleets:
+            # All valid sections are swapped in as one snapshot
+            snapshot = self.store.apply(changes, fleets=fleets)
+            readings = iter_metrics(changes, fleets)
+            if self.alarms.rules:
+                readings = list(readings)
+                with self.metrics.alarm_evaluation.time():
+                    alarms = self.alarms.update(readings, snapshot.timestamp.timestamp())
+                self.publish_alarms(alarms)
+            self.history.record(readings, snapshot.timestamp.timestamp())
+            self.metrics.updates.inc()
+            self.publisher.request()
+            log.debug(f"Dashboard data updated: {kwargs}")
     
     def start(self):
         """Start the dashboard server."""
         log.info(f"Starting SIA Dashboard on {self.host}:{self.port}")
         self._running = True
+        self.publisher.start()
+        if self.history.archive is not None:
+            self.history.archive.start()
+        if self.relay is not None:
+            self.relay.start()
         
         # Start background update thread
         self._update_thread = threading.Thread(target=self._background_updates, daemon=True)
         self._update_thread.start()
         
-        # Start Flask-SocketIO server (disable debug mode for threading compatibility)
-        self.socketio.run(self.app, host=self.host, port=self.port, debug=False, allow_unsafe_werkzeug=True)
+        if self.serving_mode == "async":
+            # Serve from an asyncio event loop in this thread until stop() is called
+            with STARTUP.phase('web stack import'):
+                from .serving import AsyncDashboardServer
+            with STARTUP.phase('web app setup'):
+                self._server = AsyncDashboardServer(self)
+                index_asset()
+            try:
+                self._server.run(self.host, self.port)
+            finally:
+                self._server = None
+        else:
+            # Start Flask-SocketIO server (disable debug mode for threading compatibility)
+            self._init_web()
+            index_asset()
+            STARTUP.mark('dashboard serving')
+            self._socketio.run(self._app, host=self.host, port=self.port, debug=False, allow_unsafe_werkzeug=True)
     
     def _background_updates(self):
         """Background thread for periodic updates and health monitoring."""
         while self._running:
             try:
-                # Update system timestamp
-                self.data.timestamp = datetime.now()
+                # Raise or clear alarms whose on/off delay has passed
+                self.publish_alarms(self.alarms.tick())
                 
-                # Send periodic heartbeat to clients
+                # Send periodic heartbeat to clients. It isn't part of the snapshot, whose
+                # version (and ETag) only changes when its data does.
                 if self.connected_clients:
-                    self.socketio.emit('heartbeat', {'timestamp': self.data.timestamp.isoformat()})
+                    self.emit('heartbeat', {'timestamp': datetime.now().isoformat()})
+                
+                # Drop clients that have been unable to keep up for too long
+                for sid in self.fanout.lagging():
+                    log.warning(f"Disconnecting lagging client {sid}: {self.fanout.stats().get(sid)}")
+                    self.fanout.remove(sid)
+                    self.disconnect_client(sid)
                 
                 time.sleep(1)  # Update every second
             except Exception as e:
@@ -252,6 +731,14 @@ class SiaDashboard:
         """Stop the dashboard server."""
         log.info("Stopping SIA Dashboard")
         self._running = False
+        self.streams.close()
+        if self._server is not None:
+            self._server.stop()
+        self.publisher.stop()
+        if self.relay is not None:
+            self.relay.stop()
+        if self.history.archive is not None:
+            self.history.archive.stop()
         if self._update_thread and self._update_thread.is_alive():
             self._update_thread.join(timeout=5)
 
@@ -262,6 +749,53 @@ class DashboardInterface:
     def __init__(self, dashboard: SiaDashboard):
         self.dashboard = dashboard
         self._server_thread = None
+        self._batch = threading.local()
+    
+    @contextmanager
+    def batch(self):
+        """Group several ``update_*`` calls into a single dashboard update.
+        
+        Section updates made inside the block are collected and applied together
+        when it exits, so clients never see a half-updated tick::
+        
+            with dashboard_interface.batch():
+                dashboard_interface.update_pump_data(...)
+                dashboard_interface.update_tank_data(...)
+        
+        Batches are per thread and may be nested; only the outermost block commits.
+        If the block raises, the collected updates are discarded.
+        """
+        depth = getattr(self._batch, 'depth', 0)
+        if depth == 0:
+            self._batch.pending = {}
+        self._batch.depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            if depth == 0:
+                self._batch.pending = None
+            raise
+        finally:
+            self._batch.depth = depth
+        if depth == 0:
+            self.commit()
+    
+    def commit(self):
+        """Apply the section updates collected by the current batch, if any."""
+        pending = getattr(self._batch, 'pending', None)
+        self._batch.pending = {} if getattr(self._batch, 'depth', 0) else None
+        if pending:
+            self.dashboard.update_data(**pending)
+    
+    def _submit(self, section: str, values: Dict[str, Any]):
+        """Apply a section update now, or defer it to the enclosing batch."""
+        pending = getattr(self._batch, 'pending', None)
+        if pending is None:
+            self.dashboard.update_data(**{section: values})
+        elif isinstance(values, dict):
+            pending.setdefault(section, {}).update(values)
+        else:
+            pending[section] = values
     
     def start_dashboard(self):
         """Start dashboard in a separate thread."""
@@ -284,7 +818,9 @@ class DashboardInterface:
     def stop_dashboard(self):
         """Stop the dashboard."""
         self.dashboard.stop()
-        if self._server_thread and self._server_thread.is_alive():
+        # Werkzeug can't be stopped from outside a request, so in threading mode the
+        # server's daemon thread is left to end with the process
+        if self.dashboard.serving_mode == 'async' and self._server_thread and self._server_thread.is_alive():
             self._server_thread.join(timeout=5)
         log.info("Dashboard stopped")
     
@@ -299,7 +835,7 @@ class DashboardInterface:
             pump_data['pump_state'] = pump_state
         
         if pump_data:
-            self.dashboard.update_data(pump=pump_data)
+            self._submit('pump', pump_data)
     
     def update_pump2_data(self, target_rate: float = None, flow_rate: float = None, pump_state: str = None):
         """Update pump 2 control data."""
@@ -312,7 +848,7 @@ class DashboardInterface:
             pump2_data['pump_state'] = pump_state
         
         if pump2_data:
-            self.dashboard.update_data(pump2=pump2_data)
+            self._submit('pump2', pump2_data)
     
     def update_solar_data(self, battery_voltage: float = None, battery_percentage: float = None, array_voltage: float = None, battery_ah: float = None):
         """Update solar control data."""
@@ -327,7 +863,7 @@ class DashboardInterface:
             solar_data['battery_ah'] = battery_ah
         
         if solar_data:
-            self.dashboard.update_data(solar=solar_data)
+            self._submit('solar', solar_data)
     
     def update_tank_data(self, tank_level_mm: float = None, tank_level_percent: float = None):
         """Update tank control data."""
@@ -338,7 +874,7 @@ class DashboardInterface:
             tank_data['tank_level_percent'] = tank_level_percent
         
         if tank_data:
-            self.dashboard.update_data(tank=tank_data)
+            self._submit('tank', tank_data)
     
     def update_skid_data(self, skid_flow: float = None, skid_pressure: float = None):
         """Update skid control data."""
@@ -349,8 +885,21 @@ class DashboardInterface:
             skid_data['skid_pressure'] = skid_pressure
         
         if skid_data:
-            self.dashboard.update_data(skid=skid_data)
+            self._submit('skid', skid_data)
+    
+    def update_stale_sections(self, stale_since: Dict[str, Optional[float]]):
+        """Mark sections stale, with the epoch time of their oldest good reading (0 if none), or fresh (None)."""
+        for section, since in stale_since.items():
+            self._submit(section, {'stale_since': since})
+    
+    def update_pump_fleet(self, pumps: Fleet):
+        """Update the per-unit data for all pump controllers."""
+        self._submit('pumps', pumps)
+    
+    def update_solar_fleet(self, solar_units: Fleet):
+        """Update the per-unit data for all solar controllers."""
+        self._submit('solar_units', solar_units)
     
     def update_system_status(self, status: str):
         """Update system status."""
-        self.dashboard.update_data(system={'status': status})
+        self._submit('system', {'status': status})
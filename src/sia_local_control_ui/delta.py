@@ -0,0 +1,116 @@
+import copy
+import threading
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+
+def diff_sections(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a patch holding only the fields of ``new`` that differ from ``old``.
+
+    Both arguments use the nested ``{section: {field: value}}`` layout produced by
+    ``DashboardData.to_dict()``. Nested dicts are compared recursively; any other
+    value (including lists) is replaced wholesale when it differs.
+    """
+    patch = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changed = diff_sections(previous, value)
+            if changed:
+                patch[key] = changed
+        elif key not in old or previous != value:
+            patch[key] = value
+    return patch
+
+
+def merge_patch(target: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply ``patch`` to ``target`` in place and return ``target``."""
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_patch(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def select_topics(data: Dict[str, Any], topics: Tuple[str, ...]) -> Dict[str, Any]:
+    """The parts of a payload or patch that clients subscribed to ``topics`` receive.
+
+    A topic is a section (``"tank"``), or one unit of a fleet section (``"pumps/pump-1"``),
+    in which case only that unit's entry under ``units`` is kept. Topics should not
+    name both a fleet and one of its units. The result shares its values with ``data``.
+    """
+    result = {}
+    for topic in topics:
+        section, _, unit = topic.partition("/")
+        value = data.get(section)
+        if value is None:
+            continue
+        if not unit:
+            result[section] = value
+            continue
+        units = value.get("units") if isinstance(value, dict) else None
+        if units and unit in units:
+            result.setdefault(section, {}).setdefault("units", {})[unit] = units[unit]
+    return result
+
+
+class PatchLog:
+    """Versioned record of the data published to clients.
+
+    Every call to :meth:`record` compares the new payload with the previously
+    recorded one and, if anything changed, keeps the patch between the two
+    versions. The last ``max_patches`` patches are retained so that a client which
+    missed a few versions can be caught up with a single merged patch instead of a
+    full resync.
+
+    Recorded payloads are kept by reference and must not be modified afterwards.
+    """
+
+    def __init__(self, max_patches: int = 50):
+        self.version = 0
+        self._current: Dict[str, Any] = {}
+        self._patches = deque(maxlen=max_patches)
+        self._lock = threading.Lock()
+
+    def record(
+        self, data: Dict[str, Any], version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Record a new payload, as ``version`` if given, otherwise the next version.
+
+        Returns the ``data_patch`` message to broadcast, or ``None`` if nothing
+        changed since the last recorded version.
+        """
+        with self._lock:
+            if version is not None and version < self.version:
+                # a newer version was recorded concurrently; nothing to send
+                return None
+            patch = diff_sections(self._current, data)
+            if not patch:
+                return None
+            base = self.version
+            self.version = version if version is not None else base + 1
+            self._current = data
+            self._patches.append((base, self.version, patch))
+            return {"version": self.version, "base": base, "patch": patch}
+
+    def since(self, version: int) -> Optional[Dict[str, Any]]:
+        """Build a single patch that brings a client at ``version`` up to date.
+
+        Returns ``None`` if ``version`` is unknown or too old to be served from the
+        retained patches, in which case the caller should send a full resync.
+        """
+        with self._lock:
+            if version == self.version:
+                return {"version": self.version, "base": version, "patch": {}}
+            if (
+                not self._patches
+                or version > self.version
+                or version < self._patches[0][0]
+            ):
+                return None
+            merged = {}
+            for _base, patch_version, patch in self._patches:
+                if patch_version > version:
+                    merge_patch(merged, patch)
+            return {"version": self.version, "base": version, "patch": merged}
@@ -0,0 +1,96 @@
+import json
+import math
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def is_nan(value: Any) -> bool:
+    """Whether ``value`` is a NaN float; False for None and anything else that isn't a float."""
+    return isinstance(value, float) and math.isnan(value)
+
+
+def _finite(obj: Any) -> Any:
+    """``obj`` with NaN and infinite floats replaced by None, as ``orjson`` writes them."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(item) for item in obj]
+    return obj
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Encode ``obj`` as compact JSON bytes, using ``orjson`` when it is installed.
+
+    Non-finite floats are written as null either way, so browsers can parse the result.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. non-string dict keys; let the standard library deal with it
+            pass
+    try:
+        return json.dumps(obj, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    except ValueError:
+        return json.dumps(_finite(obj), separators=(",", ":"), allow_nan=False).encode(
+            "utf-8"
+        )
+
+
+class RawJSON:
+    """A value that has already been encoded to JSON.
+
+    The text and UTF-8 forms are computed once and reused by every consumer.
+    """
+
+    __slots__ = ("data", "_text")
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._text = None
+
+    @classmethod
+    def encode(cls, obj: Any) -> "RawJSON":
+        return cls(dumps_bytes(obj))
+
+    @property
+    def text(self) -> str:
+        text = self._text
+        if text is None:
+            text = self._text = self.data.decode("utf-8")
+        return text
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"RawJSON({self.text[:60]!r})"
+
+
+class PacketJSON:
+    """JSON module for python-socketio that understands :class:`RawJSON` arguments.
+
+    Socket.IO event packets are encoded as ``[event, *args]``; any argument that is
+    a :class:`RawJSON` is inserted as-is instead of being encoded again. Pass the
+    class itself as the ``json`` option of the SocketIO server.
+    """
+
+    @staticmethod
+    def dumps(obj: Any, **_kwargs) -> str:
+        if isinstance(obj, RawJSON):
+            return obj.text
+        if isinstance(obj, list) and any(isinstance(item, RawJSON) for item in obj):
+            return "[" + ",".join(PacketJSON.dumps(item) for item in obj) + "]"
+        return dumps_bytes(obj).decode("utf-8")
+
+    @staticmethod
+    def loads(s, **_kwargs) -> Any:
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s)
@@ -0,0 +1,310 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class ClientChannel:
+    """Outbound state for one connected client."""
+
+    __slots__ = (
+        "sid",
+        "paced",
+        "room",
+        "version",
+        "in_flight",
+        "queue",
+        "conflated",
+        "behind_since",
+        "outbox",
+        "emitting",
+        "sent",
+        "dropped",
+        "conflations",
+    )
+
+    def __init__(self, sid: str, version: int, max_queue: int, paced: bool):
+        self.sid = sid
+        self.paced = (
+            paced  # the client acknowledges each message, and is sent more as it does
+        )
+        self.room: Optional[Hashable] = (
+            None  # None: the client gets every broadcast in full
+        )
+        self.version = version  # last version sent to the client
+        self.in_flight = 0  # messages sent but not yet acknowledged
+        self.queue = deque(maxlen=max_queue)
+        self.conflated = False  # the queue overflowed; send one catch-up instead
+        self.behind_since: Optional[float] = None
+        self.outbox: Deque[Tuple[str, Any, Optional[Callable]]] = (
+            deque()
+        )  # to emit, in order, outside the lock
+        self.emitting = False  # a thread is emitting the outbox
+        self.sent = 0
+        self.dropped = 0
+        self.conflations = 0
+
+
+class FanOut:
+    """Per-client outbound queues for broadcast patches, with latest-value-wins conflation.
+
+    A client that asks for ack pacing when it connects may have up to
+    ``max_in_flight`` unacknowledged messages; further broadcasts wait in its queue.
+    When a client's queue holds ``max_queue`` messages, the backlog is dropped, and
+    once the client acknowledges it is sent a single catch-up to the newest version
+    instead. A paced client that has been behind for more than ``max_lag`` seconds is
+    reported by :meth:`lagging` for disconnection.
+
+    Any other client is sent each broadcast without waiting for acknowledgements.
+    Delivery to it is best effort: broadcasts published while a send to it is still
+    being written are conflated into one catch-up, sent once that write returns.
+
+    Clients may join a room (any hashable key, e.g. the sections they display), and
+    broadcasts may carry a payload per room, so each client is only sent what it
+    subscribed to, and nothing when that didn't change.
+
+    ``send(sid, event, payload, callback)`` emits to one client, calling ``callback``
+    when the client acknowledges; ``callback`` is None for clients that aren't paced.
+    It is called without holding the fan-out's lock, one message at a time per client,
+    so a slow write to one client doesn't hold up publishing to the others.
+    ``catch_up(version)`` returns ``(event, payload, version)`` bringing a client from
+    ``version`` to the latest; for a client in a room it is called as
+    ``catch_up(version, room)``.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str, Any, Optional[Callable]], None],
+        catch_up: Callable[[int], Tuple[str, Any, int]],
+        max_queue: int = 8,
+        max_in_flight: int = 2,
+        max_lag: float = 30.0,
+    ):
+        self._send = send
+        self._catch_up = catch_up
+        self.max_queue = max_queue
+        self.max_in_flight = max_in_flight
+        self.max_lag = max_lag
+        self.latest: Optional[int] = None
+        self._channels: Dict[str, ClientChannel] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._channels)
+
+    def add(self, sid: str, version: int, paced: bool = False):
+        """Track a client that has just been sent ``version`` in full.
+
+        With ``paced``, the client acknowledges each message and is sent more only as it does.
+        """
+        with self._lock:
+            self._channels[sid] = ClientChannel(
+                sid, version, max(self.max_queue, 1), paced
+            )
+
+    def remove(self, sid: str):
+        with self._lock:
+            channel = self._channels.pop(sid, None)
+            if channel is not None:
+                channel.outbox.clear()
+
+    def join(self, sid: str, room: Optional[Hashable], version: int):
+        """Move a client to ``room`` (None for everything), having just sent it ``version`` for that room."""
+        with self._lock:
+            channel = self._channels.get(sid)
+            if channel is not None:
+                channel.room = room
+                channel.version = version
+                channel.queue.clear()
+                channel.conflated = False
+
+    def room(self, sid: str) -> Optional[Hashable]:
+        """The room a client is in, or None."""
+        with self._lock:
+            channel = self._channels.get(sid)
+            return channel.room if channel is not None else None
+
+    def rooms(self) -> Set[Hashable]:
+        """The rooms clients are in."""
+        with self._lock:
+            return {
+                channel.room
+                for channel in self._channels.values()
+                if channel.room is not None
+            }
+
+    def resynced(self, sid: str, version: int):
+        """Note that a client was brought up to ``version`` outside the queue, e.g. by ``request_data``."""
+        with self._lock:
+            channel = self._channels.get(sid)
+            if channel is not None and version >= channel.version:
+                channel.version = version
+                channel.queue.clear()
+                channel.conflated = False
+
+    def publish(
+        self,
+        event: str,
+        payload: Any,
+        version: int,
+        rooms: Optional[Dict[Hashable, Any]] = None,
+    ):
+        """Queue a broadcast for every client, sending straight away where the client is keeping up.
+
+        ``rooms`` maps rooms to their own payload, or to None when nothing changed for
+        them, in which case their clients are sent nothing.
+        """
+        now = time.monotonic()
+        emit = []
+        with self._lock:
+            self.latest = version
+            for channel in self._channels.values():
+                if channel.room is not None and rooms is not None:
+                    room_payload = rooms.get(channel.room)
+                    if room_payload is None:
+                        continue
+                else:
+                    room_payload = payload
+                if not channel.paced:
+                    if channel.emitting:
+                        # still writing the last one: send the latest once that returns
+                        channel.dropped += 1
+                        if not channel.conflated:
+                            channel.conflated = True
+                            channel.conflations += 1
+                    elif self._send_to(channel, event, room_payload, version):
+                        emit.append(channel)
+                    continue
+                if channel.conflated:
+                    channel.dropped += 1
+                elif channel.in_flight < self.max_in_flight and not channel.queue:
+                    if self._send_to(channel, event, room_payload, version):
+                        emit.append(channel)
+                    continue
+                elif len(channel.queue) >= self.max_queue:
+                    # latest value wins: drop the backlog, catch up in one go later
+                    channel.dropped += len(channel.queue) + 1
+                    channel.queue.clear()
+                    channel.conflated = True
+                    channel.conflations += 1
+                else:
+                    channel.queue.append((event, room_payload, version))
+                if channel.behind_since is None:
+                    channel.behind_since = now
+        for channel in emit:
+            self._emit(channel)
+
+    def acknowledged(self, sid: str):
+        """A paced client acknowledged a message; send it what it is owed."""
+        with self._lock:
+            channel = self._channels.get(sid)
+            if channel is None:
+                return
+            channel.in_flight = max(channel.in_flight - 1, 0)
+            emit = False
+            while channel.in_flight < self.max_in_flight:
+                if channel.conflated:
+                    channel.conflated = False
+                    emit |= self._send_to(channel, *self._catch_up_channel(channel))
+                elif channel.queue:
+                    emit |= self._send_to(channel, *channel.queue.popleft())
+                else:
+                    break
+            if not channel.queue and not channel.conflated:
+                channel.behind_since = None
+        if emit:
+            self._emit(channel)
+
+    def _catch_up_channel(self, channel: ClientChannel) -> Tuple[str, Any, int]:
+        if channel.room is None:
+            return self._catch_up(channel.version)
+        return self._catch_up(channel.version, channel.room)
+
+    def _send_to(
+        self, channel: ClientChannel, event: str, payload: Any, version: int
+    ) -> bool:
+        """Add a message to the channel's outbox, with the lock held.
+
+        Returns True when the caller is to :meth:`_emit` it after releasing the lock,
+        i.e. no other thread is already emitting to this client.
+        """
+        sid = channel.sid
+        if channel.paced:
+            channel.in_flight += 1
+        callback = (lambda *_args: self.acknowledged(sid)) if channel.paced else None
+        channel.version = version
+        channel.sent += 1
+        channel.outbox.append((event, payload, callback))
+        if channel.emitting:
+            return False
+        channel.emitting = True
+        return True
+
+    def _emit(self, channel: ClientChannel):
+        """Emit the channel's outbox in order, without holding the lock."""
+        while True:
+            with self._lock:
+                if (
+                    not channel.outbox
+                    and channel.conflated
+                    and not channel.paced
+                    and self._channels.get(channel.sid) is channel
+                ):
+                    channel.conflated = False
+                    event, payload, version = self._catch_up_channel(channel)
+                    channel.version = version
+                    channel.sent += 1
+                    channel.outbox.append((event, payload, None))
+                if not channel.outbox:
+                    channel.emitting = False
+                    return
+                event, payload, callback = channel.outbox.popleft()
+            try:
+                self._send(channel.sid, event, payload, callback)
+            except Exception:
+                with self._lock:
+                    channel.outbox.clear()
+                    channel.emitting = False
+                raise
+
+    def lagging(self, now: Optional[float] = None) -> List[str]:
+        """Clients that have been behind for longer than ``max_lag`` seconds."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return [
+                channel.sid
+                for channel in self._channels.values()
+                if channel.paced
+                and channel.behind_since is not None
+                and now - channel.behind_since > self.max_lag
+            ]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-client lag and drop counts."""
+        now = time.monotonic()
+        with self._lock:
+            latest = self.latest
+            return {
+                channel.sid: {
+                    "version": channel.version,
+                    "paced": channel.paced,
+                    "room": list(channel.room)
+                    if isinstance(channel.room, tuple)
+                    else channel.room,
+                    "lag_versions": max(latest - channel.version, 0)
+                    if latest is not None
+                    else 0,
+                    "lag_seconds": round(now - channel.behind_since, 3)
+                    if channel.behind_since is not None
+                    else 0.0,
+                    "queued": len(channel.queue),
+                    "in_flight": channel.in_flight,
+                    "sent": channel.sent,
+                    "dropped": channel.dropped,
+                    "conflations": channel.conflations,
+                }
+                for channel in self._channels.values()
+            }
@@ -0,0 +1,168 @@
+import math
+from array import array
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .encoding import is_nan
+
+NAN = float("nan")
+
+# numeric and text metrics held for each kind of unit
+PUMP_METRICS = ("target_rate", "flow_rate")
+PUMP_LABELS = ("pump_state",)
+SOLAR_METRICS = ("battery_voltage", "battery_percentage", "panel_power", "battery_ah")
+SOLAR_LABELS = ()
+
+# payload section for each fleet, with its metrics
+FLEETS = {
+    "pumps": (PUMP_METRICS, PUMP_LABELS),
+    "solar_units": (SOLAR_METRICS, SOLAR_LABELS),
+}
+
+
+def _to_float(value: Any) -> float:
+    """Convert a reading to float, using NaN for missing or invalid values."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def summarize(column: array) -> Dict[str, Optional[float]]:
+    """Mean, min, max and total of the valid (non-NaN) values in a column.
+
+    Uses numpy on the column's buffer (no copy) when it is installed, otherwise
+    the C-implemented builtins over the array.
+    """
+    if numpy is not None and len(column):
+        values = numpy.frombuffer(column, dtype=numpy.float64)
+        values = values[~numpy.isnan(values)]
+        if len(values):
+            return {
+                "mean": float(values.mean()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "total": float(values.sum()),
+                "count": len(values),
+            }
+    else:
+        values = [value for value in column if not is_nan(value)]
+        if values:
+            total = math.fsum(values)
+            return {
+                "mean": total / len(values),
+                "min": min(values),
+                "max": max(values),
+                "total": total,
+                "count": len(values),
+            }
+    return {"mean": None, "min": None, "max": None, "total": None, "count": 0}
+
+
+class Fleet:
+    """Readings from a group of identical units, e.g. every configured pump controller.
+
+    Data is held column-wise: one ``array('d')`` per numeric metric, with NaN where a
+    unit has no valid reading, and one tuple per text metric. Fleets are treated as
+    immutable once built; the summary and dict forms are computed once and cached.
+    """
+
+    __slots__ = ("names", "columns", "labels", "_summary", "_dict")
+
+    def __init__(
+        self,
+        names: Sequence[str] = (),
+        columns: Optional[Dict[str, array]] = None,
+        labels: Optional[Dict[str, tuple]] = None,
+    ):
+        self.names = tuple(names)
+        self.columns = columns or {}
+        self.labels = labels or {}
+        self._summary = None
+        self._dict = None
+
+    @classmethod
+    def from_rows(
+        cls, kind: str, names: Sequence[str], rows: Iterable[Dict[str, Any]]
+    ) -> "Fleet":
+        """Build a fleet of ``kind`` (a key of ``FLEETS``) from one ``{metric: value}`` dict per unit."""
+        metrics, text_metrics = FLEETS[kind]
+        rows = list(rows)
+        columns = {
+            metric: array("d", [_to_float(row.get(metric)) for row in rows])
+            for metric in metrics
+        }
+        labels = {
+            metric: tuple(
+                None if row.get(metric) is None else str(row.get(metric))
+                for row in rows
+            )
+            for metric in text_metrics
+        }
+        return cls(names, columns, labels)
+
+    def __len__(self):
+        return len(self.names)
+
+    def stale_count(self) -> int:
+        """Number of units missing at least one numeric reading."""
+        if not self.names or not self.columns:
+            return 0
+        if numpy is not None:
+            stacked = numpy.vstack(
+                [
+                    numpy.frombuffer(column, dtype=numpy.float64)
+                    for column in self.columns.values()
+                ]
+            )
+            return int(numpy.isnan(stacked).any(axis=0).sum())
+        return sum(
+            1
+            for values in zip(*self.columns.values())
+            if any(is_nan(value) for value in values)
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        """Fleet-wide aggregates for every numeric metric, plus the stale unit count."""
+        result = self._summary
+        if result is None:
+            result = {
+                metric: summarize(column) for metric, column in self.columns.items()
+            }
+            result["stale"] = self.stale_count()
+            self._summary = result
+        return result
+
+    def unit(self, name: str) -> Optional[Dict[str, Any]]:
+        """Readings for one unit, or None if there's no unit called ``name``."""
+        try:
+            index = self.names.index(name)
+        except ValueError:
+            return None
+        return self._unit_at(index)
+
+    def _unit_at(self, index: int) -> Dict[str, Any]:
+        result = {}
+        for metric, column in self.columns.items():
+            value = column[index]
+            result[metric] = None if is_nan(value) else value
+        for metric, values in self.labels.items():
+            result[metric] = values[index]
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization. The result is cached and shared."""
+        result = self._dict
+        if result is None:
+            result = self._dict = {
+                "count": len(self.names),
+                "units": {
+                    name: self._unit_at(index) for index, name in enumerate(self.names)
+                },
+                "summary": self.summary(),
+            }
+        return result
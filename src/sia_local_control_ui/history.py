@@ -0,0 +1,343 @@
+import math
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .encoding import is_nan
+
+# rollup bucket size in seconds -> number of buckets kept
+DEFAULT_ROLLUPS = {
+    10: 1080,  # 3 hours
+    60: 1440,  # 24 hours
+    900: 1344,  # 14 days
+}
+DEFAULT_RAW_CAPACITY = 1500  # 5 minutes at 5 updates per second
+
+
+def _round(value: float) -> float:
+    """Trim the float32 storage noise off a value (24.100000381 -> 24.1)."""
+    return float(f"{value:.7g}")
+
+
+class RingBuffer:
+    """Fixed-capacity, array-backed buffer of time-ordered rows.
+
+    Each column is a preallocated ``array``; once full, the oldest row is
+    overwritten. Rows must be appended in time order (the first column).
+    Values are typically stored as float32 to halve memory use.
+    """
+
+    def __init__(self, capacity: int, typecodes: Sequence[str]):
+        self.capacity = capacity
+        self.columns = [
+            array(code, bytes(array(code).itemsize * capacity)) for code in typecodes
+        ]
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, *row):
+        index = (self._start + self._count) % self.capacity
+        for column, value in zip(self.columns, row):
+            column[index] = value
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def _time_at(self, position: int) -> float:
+        return self.columns[0][(self._start + position) % self.capacity]
+
+    def _bisect(self, t: float) -> int:
+        """First logical position whose time is >= ``t``."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._time_at(middle) < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def oldest(self) -> Optional[float]:
+        return self._time_at(0) if self._count else None
+
+    def rows(self, start: float, end: float) -> List[tuple]:
+        """All rows with ``start <= time <= end``, oldest first."""
+        first, last = self._bisect(start), self._bisect(math.nextafter(end, math.inf))
+        capacity, offset = self.capacity, self._start
+        return [
+            tuple(column[(offset + position) % capacity] for column in self.columns)
+            for position in range(first, last)
+        ]
+
+
+class Rollup:
+    """Min/max/avg aggregates of a metric over fixed-size time buckets."""
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        # bucket start, min, max, avg, sample count
+        self.buffer = RingBuffer(capacity, ("d", "f", "f", "f", "I"))
+        self._bucket = None
+
+    def add(self, t: float, value: float):
+        bucket_start = t - t % self.resolution
+        current = self._bucket
+        if current is None or current[0] != bucket_start:
+            self._flush()
+            self._bucket = [bucket_start, value, value, value, 1]
+        else:
+            current[1] = min(current[1], value)
+            current[2] = max(current[2], value)
+            current[3] += value
+            current[4] += 1
+
+    def _flush(self):
+        if self._bucket is not None:
+            start, low, high, total, count = self._bucket
+            self.buffer.append(start, low, high, total / count, count)
+
+    def oldest(self) -> Optional[float]:
+        if len(self.buffer):
+            return self.buffer.oldest()
+        return self._bucket[0] if self._bucket else None
+
+    def rows(self, start: float, end: float) -> List[tuple]:
+        """Buckets overlapping ``start``..``end`` as ``(start, min, max, avg, count)``, including the open one."""
+        rows = self.buffer.rows(start - self.resolution, end)
+        if (
+            self._bucket is not None
+            and start - self.resolution <= self._bucket[0] <= end
+        ):
+            bucket_start, low, high, total, count = self._bucket
+            rows.append((bucket_start, low, high, total / count, count))
+        return rows
+
+
+class MetricHistory:
+    """Raw samples of one metric plus its multi-resolution rollups, in constant memory."""
+
+    def __init__(
+        self,
+        raw_capacity: int = DEFAULT_RAW_CAPACITY,
+        rollups: Optional[Dict[int, int]] = None,
+    ):
+        self.raw = RingBuffer(raw_capacity, ("d", "f"))
+        self.rollups = [
+            Rollup(resolution, capacity)
+            for resolution, capacity in sorted((rollups or DEFAULT_ROLLUPS).items())
+        ]
+
+        self.first: Optional[float] = None
+
+    def add(self, t: float, value: float):
+        if self.first is None:
+            self.first = t
+        self.raw.append(t, value)
+        for rollup in self.rollups:
+            rollup.add(t, value)
+
+    def oldest(self) -> Optional[float]:
+        """Time from which this history is complete."""
+        if self.first is None:
+            return None
+        return (
+            max(self.first, self.rollups[-1].oldest())
+            if self.rollups
+            else self.raw.oldest()
+        )
+
+    def query(self, start: float, end: float, max_points: int) -> Dict:
+        """Samples between ``start`` and ``end``, downsampled to at most ``max_points``.
+
+        Raw samples are used while they still cover ``start`` and are downsampled
+        with LTTB. Otherwise the finest rollup covering ``start`` is used, merging
+        neighbouring buckets' min/max/avg until the result fits.
+        """
+        oldest = self.raw.oldest()
+        if oldest is not None and oldest <= start:
+            points = [[t, _round(value)] for t, value in self.raw.rows(start, end)]
+            return {"resolution": 0, "points": lttb(points, max_points)}
+
+        resolution, rows = self.buckets(start, end)
+        return {
+            "resolution": resolution,
+            "points": bucket_points(merge_buckets(rows, max_points)),
+        }
+
+    def buckets(self, start: float, end: float) -> Tuple[int, List[tuple]]:
+        """``(resolution, rows)`` from the finest rollup that best covers ``start``..``end``."""
+        candidates = [rollup for rollup in self.rollups if rollup.oldest() is not None]
+        if not candidates:
+            return 0, []
+        # the finest rollup reaching back to `start`; failing that, the finest that
+        # hasn't dropped any buckets yet, as it still holds everything recorded
+        rollup = next(
+            (r for r in candidates if r.oldest() <= start),
+            next(
+                (r for r in candidates if len(r.buffer) < r.buffer.capacity),
+                candidates[-1],
+            ),
+        )
+        return rollup.resolution, rollup.rows(start, end)
+
+
+def bucket_points(rows: List[tuple]) -> List[List[float]]:
+    """``(start, min, max, avg, count)`` bucket rows as ``[start, avg, min, max]`` points."""
+    return [
+        [t, _round(avg), _round(low), _round(high)]
+        for t, low, high, avg, _count in rows
+    ]
+
+
+def lttb(points: List[List[float]], threshold: int) -> List[List[float]]:
+    """Largest-Triangle-Three-Buckets downsampling of ``[t, value]`` points."""
+    if threshold >= len(points) or threshold <= 0:
+        return points
+    if threshold < 3:
+        return [points[0], points[-1]][:threshold]
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for i in range(threshold - 2):
+        bucket_start = int(i * bucket_size) + 1
+        bucket_end = int((i + 1) * bucket_size) + 1
+
+        # average of the next bucket is the third point of the triangle
+        next_start, next_end = (
+            bucket_end,
+            min(int((i + 2) * bucket_size) + 1, len(points)),
+        )
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_t = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_v = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        prev_t, prev_v = points[previous]
+        best_area, best = -1.0, bucket_start
+        for j in range(bucket_start, bucket_end):
+            t, v = points[j]
+            area = abs(
+                (prev_t - avg_t) * (v - prev_v) - (prev_t - t) * (avg_v - prev_v)
+            )
+            if area > best_area:
+                best_area, best = area, j
+        sampled.append(points[best])
+        previous = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def merge_buckets(rows: List[tuple], max_points: int) -> List[tuple]:
+    """Merge runs of ``(start, min, max, avg, count)`` buckets so at most ``max_points`` remain."""
+    if len(rows) <= max_points or max_points < 1:
+        return rows
+    group = math.ceil(len(rows) / max_points)
+    merged = []
+    for i in range(0, len(rows), group):
+        chunk = rows[i : i + group]
+        count = sum(row[4] for row in chunk)
+        merged.append(
+            (
+                chunk[0][0],
+                min(row[1] for row in chunk),
+                max(row[2] for row in chunk),
+                sum(row[3] * row[4] for row in chunk) / count,
+                count,
+            )
+        )
+    return merged
+
+
+class HistoryStore:
+    """Bounded in-memory history of every numeric dashboard metric.
+
+    Metrics are named ``section.key`` (e.g. ``tank.tank_level_percent``) or
+    ``fleet.unit.metric`` for per-unit readings (e.g. ``pumps.pump-1.flow_rate``),
+    and are created the first time a value is recorded.
+
+    With an ``archive`` (a :class:`~sia_local_control_ui.segments.SegmentStore`),
+    values are also kept on disk, and queries reaching back before the in-memory
+    history (e.g. just after a restart) are served from the archive.
+    """
+
+    def __init__(
+        self,
+        raw_capacity: int = DEFAULT_RAW_CAPACITY,
+        rollups: Optional[Dict[int, int]] = None,
+        archive=None,
+    ):
+        self.raw_capacity = raw_capacity
+        self.rollups = rollups or DEFAULT_ROLLUPS
+        self.archive = archive
+        self._metrics: Dict[str, MetricHistory] = {}
+        self._lock = threading.Lock()
+
+    def metrics(self) -> List[str]:
+        if self.archive is not None:
+            return sorted(set(self._metrics).union(self.archive.metrics()))
+        return sorted(self._metrics)
+
+    def record(self, values: Iterable[Tuple[str, float]], t: Optional[float] = None):
+        """Record ``(metric, value)`` pairs at time ``t`` (now by default). NaN values are skipped."""
+        t = time.time() if t is None else t
+        values = [(metric, value) for metric, value in values if not is_nan(value)]
+        with self._lock:
+            for metric, value in values:
+                history = self._metrics.get(metric)
+                if history is None:
+                    history = self._metrics[metric] = MetricHistory(
+                        self.raw_capacity, self.rollups
+                    )
+                history.add(t, value)
+        if self.archive is not None:
+            self.archive.record(values, t)
+
+    def query(
+        self, metric: str, start: float, end: float, max_points: int = 500
+    ) -> Optional[Dict]:
+        """Downsampled history for ``metric``, or None if it has never been recorded."""
+        with self._lock:
+            history = self._metrics.get(metric)
+            oldest = history.oldest() if history is not None else None
+            if self.archive is None or (oldest is not None and oldest <= start):
+                if history is None:
+                    return None
+                return {
+                    "metric": metric,
+                    "from": start,
+                    "to": end,
+                    **history.query(start, end, max_points),
+                }
+            recent = history.buckets(oldest, end)[1] if history is not None else []
+
+        # older data comes from disk, followed by what is held in memory
+        archived = self.archive.query(
+            metric, start, oldest if oldest is not None else end, max_points
+        )
+        if archived is None:
+            if history is None:
+                return None
+            with self._lock:
+                return {
+                    "metric": metric,
+                    "from": start,
+                    "to": end,
+                    **history.query(start, end, max_points),
+                }
+        resolution, rows = archived
+        rows = merge_buckets(
+            sorted([row for row in rows if oldest is None or row[0] < oldest] + recent),
+            max_points,
+        )
+        return {
+            "metric": metric,
+            "from": start,
+            "to": end,
+            "resolution": resolution,
+            "points": bucket_points(rows),
+        }
@@ -0,0 +1,426 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .encoding import is_nan
+
+# seconds, from in-memory tag reads up to the loop period and beyond
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.000025,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if is_nan(value):
+        return "NaN"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Timer:
+    """Observes the time spent in a ``with`` block."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        labels: Tuple[Tuple[str, str], ...] = (),
+    ):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.label_values = labels
+        self._children: Dict[tuple, "Metric"] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values) -> "Metric":
+        """The child metric for one set of label values."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._child(
+                        tuple(zip(self.labelnames, map(str, values)))
+                    )
+        return child
+
+    def _child(self, labels):
+        return type(self)(self.registry, self.name, self.help, labels=labels)
+
+    def series(self) -> List["Metric"]:
+        return list(self._children.values()) if self.labelnames else [self]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if self.registry.enabled:
+            with self._lock:
+                self.value += amount
+
+    def samples(self):
+        yield self.name + "_total", self.label_values, self.value
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(Metric):
+    """A value read from a callback when the metrics are collected."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        registry,
+        name,
+        help,
+        function: Optional[Callable[[], float]] = None,
+        **kwargs,
+    ):
+        super().__init__(registry, name, help, **kwargs)
+        self.function = function
+
+    def samples(self):
+        yield self.name, self.label_values, self.snapshot()
+
+    def snapshot(self):
+        try:
+            return float(self.function())
+        except Exception:
+            return math.nan
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, registry, name, help, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs
+    ):
+        super().__init__(registry, name, help, **kwargs)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self, labels):
+        return Histogram(
+            self.registry, self.name, self.help, self.buckets, labels=labels
+        )
+
+    def observe(self, value: float):
+        if self.registry.enabled:
+            index = bisect.bisect_left(self.buckets, value)
+            with self._lock:
+                self.counts[index] += 1
+                self.sum += value
+                self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block; free when metrics are disabled."""
+        return _Timer(self) if self.registry.enabled else _NULL_TIMER
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            yield (
+                self.name + "_bucket",
+                self.label_values + (("le", _format_value(bound)),),
+                cumulative,
+            )
+        yield self.name + "_sum", self.label_values, self.sum
+        yield self.name + "_count", self.label_values, self.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+        target, cumulative = q * self.count, 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound if bound != math.inf else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Registry:
+    """A set of metrics that can be switched on and off as a whole.
+
+    While disabled, counters and histograms ignore updates and :meth:`Histogram.time`
+    returns a shared no-op context manager, so instrumented code costs next to nothing.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, Metric] = {}
+
+    def _add(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labelnames))
+
+    def gauge(self, name: str, help: str, function: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(self, name, help, function))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(self, name, help, buckets, labelnames=labelnames))
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for series in metric.series():
+                for name, labels, value in series.samples():
+                    lines.append(
+                        f"{name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict:
+        """Compact JSON form: plain values, with histograms as count/avg/p50/p99."""
+        result = {}
+        for name, metric in self._metrics.items():
+            if metric.labelnames:
+                result[name] = {
+                    ",".join(
+                        value for _label, value in series.label_values
+                    ): series.snapshot()
+                    for series in metric.series()
+                }
+            else:
+                result[name] = metric.snapshot()
+        return result
+
+
+class DashboardMetrics(Registry):
+    """The dashboard's hot-path instrumentation, exposed at ``/api/metrics``."""
+
+    def __init__(self, enabled: bool = False):
+        super().__init__(enabled)
+        self.loop_duration = self.histogram(
+            "sia_main_loop_seconds", "Application main_loop tick duration"
+        )
+        self.loop_overruns = self.counter(
+            "sia_main_loop_overruns", "Ticks that took longer than loop_target_period"
+        )
+        self.tag_read = self.histogram(
+            "sia_tag_read_seconds", "get_tag latency per tag", labelnames=("tag",)
+        )
+        self.tag_errors = self.counter(
+            "sia_tag_read_errors",
+            "get_tag calls that raised, per tag",
+            labelnames=("tag",),
+        )
+        self.polls = self.counter(
+            "sia_source_polls", "Reads of each data source", labelnames=("source",)
+        )
+        self.unchanged_polls = self.counter(
+            "sia_unchanged_polls",
+            "Ticks whose reads changed nothing, so nothing was published",
+        )
+        self.updates = self.counter("sia_dashboard_updates", "Snapshot updates applied")
+        self.update_duration = self.histogram(
+            "sia_update_dashboard_data_seconds", "update_dashboard_data duration"
+        )
+        self.to_dict_duration = self.histogram(
+            "sia_snapshot_to_dict_seconds", "Building a snapshot's payload dict"
+        )
+        self.encode_duration = self.histogram(
+            "sia_broadcast_encode_seconds", "Diffing and encoding a broadcast"
+        )
+        self.broadcasts = self.counter(
+            "sia_broadcasts", "Data patches broadcast to clients"
+        )
+        self.commands = self.counter(
+            "sia_commands", "UI commands by outcome", labelnames=("status",)
+        )
+        self.command_duration = self.histogram(
+            "sia_command_seconds", "UI command receipt to tag write completion"
+        )
+        self.emit_duration = self.histogram(
+            "sia_emit_seconds", "Emitting one event to every client"
+        )
+        self.emit_per_client = self.histogram(
+            "sia_emit_per_client_seconds", "Emit fan-out time divided by client count"
+        )
+        self.alarm_changes = self.counter(
+            "sia_alarm_changes",
+            "Alarms raised or cleared, per severity",
+            labelnames=("severity", "state"),
+        )
+        self.alarm_evaluation = self.histogram(
+            "sia_alarm_evaluation_seconds", "Evaluating the alarm rules of one update"
+        )
+        self.client_render = self.histogram(
+            "sia_client_render_seconds",
+            "Frame render time in the browser, as reported by clients",
+        )
+        self.client_updates = self.counter(
+            "sia_client_updates",
+            "Data updates and heartbeats received by clients, as reported by them",
+        )
+        self.client_writes = self.counter(
+            "sia_client_dom_writes", "DOM writes by clients, as reported by them"
+        )
+
+    def add_gauges(self, dashboard):
+        """Gauges read from ``dashboard`` (a SiaDashboard) at collection time."""
+        self.gauge(
+            "sia_connected_clients",
+            "Connected Socket.IO clients",
+            lambda: len(dashboard.connected_clients),
+        )
+        self.gauge(
+            "sia_snapshot_version",
+            "Current snapshot version",
+            lambda: dashboard.data.version,
+        )
+        self.gauge(
+            "sia_publisher_pending",
+            "Broadcasts waiting for the next publish window",
+            lambda: int(dashboard.publisher.pending),
+        )
+        self.gauge(
+            "sia_client_queued",
+            "Broadcasts queued for slow clients",
+            lambda: sum(
+                client["queued"] for client in dashboard.fanout.stats().values()
+            ),
+        )
+        self.gauge(
+            "sia_client_dropped",
+            "Broadcasts dropped for slow clients by conflation",
+            lambda: sum(
+                client["dropped"] for client in dashboard.fanout.stats().values()
+            ),
+        )
+        self.gauge(
+            "sia_client_max_lag_seconds",
+            "Longest time any client has been behind",
+            lambda: max(
+                (client["lag_seconds"] for client in dashboard.fanout.stats().values()),
+                default=0,
+            ),
+        )
+        self.gauge(
+            "sia_active_alarms",
+            "Alarms currently raised",
+            lambda: len(dashboard.alarms.active),
+        )
+        self.gauge(
+            "sia_history_pending_rows",
+            "History rows waiting to be written to disk",
+            lambda: (
+                dashboard.history.archive.pending_rows
+                if dashboard.history.archive
+                else 0
+            ),
+        )
+        if dashboard.relay is not None:
+            relay = dashboard.relay
+            self.gauge(
+                "sia_relay_connected",
+                "Whether the relay is connected to its primary dashboard",
+                lambda: int(relay.connected),
+            )
+            self.gauge(
+                "sia_relay_lag_seconds",
+                "Age of the newest relayed data when it arrived",
+                lambda: relay.lag or 0.0,
+            )
+            self.gauge(
+                "sia_relay_versions_behind",
+                "Versions the relay is behind its primary dashboard",
+                lambda: relay.stats()["versions_behind"] or 0,
+            )
+
+    def observe_emit(self, duration: float, clients: int):
+        self.emit_duration.observe(duration)
+        if clients:
+            self.emit_per_client.observe(duration / clients)
@@ -0,0 +1,137 @@
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .tagcache import TagCache
+
+# how far a stable source may back off while a client is watching, as a multiple of its interval
+ACTIVE_BACKOFF = 2.0
+
+
+class PollSource:
+    """A group of tags polled together, e.g. every pump controller's tags.
+
+    The source is read every ``interval`` seconds while its values are changing. Each
+    read that finds nothing changed doubles the interval, up to ``max_interval``, or
+    up to ``ACTIVE_BACKOFF`` times ``interval`` while a client is connected.
+    """
+
+    __slots__ = (
+        "name",
+        "reads",
+        "interval",
+        "max_interval",
+        "current",
+        "next_due",
+        "polls",
+        "changes",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        reads: Sequence[Tuple[str, str]],
+        interval: float,
+        max_interval: float,
+    ):
+        self.name = name
+        self.reads = tuple(reads)
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.current = interval
+        self.next_due = 0.0
+        self.polls = 0
+        self.changes = 0
+
+    def ceiling(self, active: bool) -> float:
+        if active:
+            return min(self.max_interval, self.interval * ACTIVE_BACKOFF)
+        return self.max_interval
+
+    def polled(self, changed: bool, now: float, active: bool):
+        """Work out when to poll next, after a read at ``now``."""
+        self.polls += 1
+        if changed:
+            self.changes += 1
+            self.current = self.interval
+        else:
+            self.current = min(self.current * 2, self.ceiling(active))
+        self.next_due = now + self.current
+
+
+class PollScheduler:
+    """Polls each :class:`PollSource` when it is due and keeps the latest value of every tag.
+
+    The main loop calls :meth:`poll` every tick. Only the tags of sources that are due
+    are read, and the result says whether any value to show, or any tag's quality, has
+    changed, so an unchanged tick can skip publishing to the dashboard altogether. Reads
+    go through a :class:`~sia_local_control_ui.tagcache.TagCache`, so a failed read keeps
+    the last good value and doesn't count as a change. Connecting a client pulls every
+    backed-off source forward to its tighter ceiling.
+    """
+
+    def __init__(self, sources: Iterable[PollSource], cache: Optional[TagCache] = None):
+        self.sources: List[PollSource] = [source for source in sources if source.reads]
+        self.cache = cache if cache is not None else TagCache()
+        self.values: Dict[Tuple[str, str], Any] = self.cache.values
+        self.active = False
+
+    @property
+    def tick(self) -> float:
+        """The shortest interval of any source: how often the main loop needs to run."""
+        return min((source.interval for source in self.sources), default=1.0)
+
+    def due(self, now: float) -> List[PollSource]:
+        return [source for source in self.sources if source.next_due <= now]
+
+    def set_active(self, active: bool, now: Optional[float] = None):
+        """Note whether any client is connected, tightening backed-off sources when one is."""
+        if active and not self.active:
+            now = time.monotonic() if now is None else now
+            for source in self.sources:
+                ceiling = source.ceiling(True)
+                if source.current > ceiling:
+                    source.current = ceiling
+                    source.next_due = min(source.next_due, now)
+        self.active = active
+
+    def wake(self, name: str):
+        """Poll a source on the next tick at its fastest rate, e.g. after a command was written to it."""
+        for source in self.sources:
+            if source.name == name:
+                source.current = source.interval
+                source.next_due = 0.0
+
+    def poll(
+        self,
+        read: Callable[[Sequence[Tuple[str, str]]], Dict[Tuple[str, str], Any]],
+        now: Optional[float] = None,
+    ) -> Tuple[List[str], bool]:
+        """Read the due sources with ``read(reads)``; returns their names and whether anything changed.
+
+        Tags going stale or recovering count as changes, whether or not a source was due.
+        """
+        now = time.monotonic() if now is None else now
+        due = self.due(now)
+        if not due:
+            return [], self.cache.expire(now)
+
+        values = read(tuple(pair for source in due for pair in source.reads))
+        changed_pairs = self.cache.update(values, now)
+        changed_any = False
+        for source in due:
+            changed = not changed_pairs.isdisjoint(source.reads)
+            source.polled(changed, now, self.active)
+            changed_any |= changed
+        changed_any |= self.cache.expire(now)
+        return [source.name for source in due], changed_any
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Current interval and read counts per source."""
+        return {
+            source.name: {
+                "interval": source.current,
+                "polls": source.polls,
+                "changes": source.changes,
+            }
+            for source in self.sources
+        }
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class CoalescingPublisher:
+    """Rate-limited publisher that coalesces many update requests into one flush.
+
+    Callers invoke :meth:`request` whenever the published data changes. The first
+    request after an idle period is flushed straight away; further requests inside
+    the same ``1 / max_rate`` window are merged into a single trailing flush. The
+    number of broadcasts therefore scales with ``max_rate`` rather than with the
+    number of update calls.
+
+    Until :meth:`start` is called (or if ``max_rate`` is falsy) requests are
+    flushed synchronously, which keeps the dashboard usable without its server
+    running, e.g. with the Flask-SocketIO test client.
+    """
+
+    def __init__(self, flush: Callable[[], None], max_rate: Optional[float] = 5.0):
+        self._flush = flush
+        self.max_rate = max_rate
+
+        self._condition = threading.Condition()
+        self._pending = False
+        self._running = False
+        self._last_flush = 0.0
+        self._thread = None
+
+    @property
+    def pending(self) -> bool:
+        """Whether a flush has been requested but not yet made."""
+        return self._pending
+
+    @property
+    def min_interval(self) -> float:
+        """Minimum time between two flushes, in seconds."""
+        return 1.0 / self.max_rate if self.max_rate else 0.0
+
+    def request(self):
+        """Mark the data as changed so it is published in the current window."""
+        if not self._running or not self.max_rate:
+            self._do_flush()
+            return
+
+        with self._condition:
+            self._pending = True
+            self._condition.notify()
+
+    def start(self):
+        """Start the background flush thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, flushing any pending request first."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Let the rest of the window accumulate further requests.
+                remaining = self._last_flush + self.min_interval - time.monotonic()
+                while remaining > 0 and self._running:
+                    self._condition.wait(remaining)
+                    remaining = self._last_flush + self.min_interval - time.monotonic()
+                self._pending = False
+            self._do_flush()
+
+    def _do_flush(self):
+        self._last_flush = time.monotonic()
+        try:
+            self._flush()
+        except Exception as e:
+            log.error(f"Error publishing dashboard update: {e}")
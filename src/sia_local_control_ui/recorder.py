@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .tagcache import Pair, TagCache
+
+log = logging.getLogger(__name__)
+
+FORMAT = "sia-tag-recording"
+FORMAT_VERSION = 1
+SUFFIX = ".jsonl.gz"
+
+# a recording stops growing at this size, so one left running can't fill the disk
+MAX_RECORDING_BYTES = 256 * 1024 * 1024
+FLUSH_INTERVAL = 1.0
+
+Read = Callable[[Sequence[Pair]], Dict[Pair, Any]]
+
+_UNSET = object()
+
+
+class TagRecorder:
+    """Records every batch of tag reads, with when it was read, to a gzip-compressed file.
+
+    The file holds one JSON document per line. The first is a header with the
+    deployment config the tags were read with. Each tag, and each set of tags read
+    together (one per combination of due poll sources), is given an id once by a
+    ``{"tags": [...]}`` or ``{"reads": [...]}`` line. A batch of reads is then
+    ``[seconds since the start, read set id, tag id, value, tag id, value, ...]``,
+    listing only the values that differ from the tag's previous read; a failed read
+    is null.
+
+    The file is flushed every ``flush_interval`` seconds, so a recording cut short by a
+    restart or power cut can still be replayed up to its last flush. Recording stops
+    once the file reaches ``max_bytes``. Used as a context manager, the recording is
+    closed, and its gzip trailer written, on leaving the block.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        config: Dict[str, Any],
+        max_bytes: int = MAX_RECORDING_BYTES,
+        flush_interval: float = FLUSH_INTERVAL,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.batches = 0
+        self.reads = 0
+        self.written = 0  # values written, i.e. reads that changed
+        self.recording = True
+        self._tag_ids: Dict[Pair, int] = {}
+        self._read_ids: Dict[Tuple[Pair, ...], int] = {}
+        self._last: Dict[int, Any] = {}
+        self._file = gzip.GzipFile(path, mode="xb")
+        self._flushed = self.started
+        self._write(
+            {
+                "format": FORMAT,
+                "version": FORMAT_VERSION,
+                "started": time.time(),
+                "config": config,
+            }
+        )
+        self._file.flush()
+
+    @classmethod
+    def create(cls, directory: str, config: Dict[str, Any], **kwargs) -> "TagRecorder":
+        """Start a new recording in ``directory``, named after when it started.
+
+        A recording started in the same second as an earlier one gets a ``-1``, ``-2``, ...
+        suffix, so a quick restart doesn't lose its recording.
+        """
+        os.makedirs(directory, exist_ok=True)
+        stem = datetime.now().strftime("tags-%Y%m%d-%H%M%S")
+        for attempt in itertools.count():
+            name = (f"{stem}-{attempt}" if attempt else stem) + SUFFIX
+            try:
+                return cls(os.path.join(directory, name), config, **kwargs)
+            except FileExistsError:
+                continue
+
+    def wrap(self, read: Read) -> Read:
+        """``read``, recording every batch it returns."""
+
+        def recorded(reads: Sequence[Pair]) -> Dict[Pair, Any]:
+            values = read(reads)
+            self.record(values)
+            return values
+
+        return recorded
+
+    def record(self, values: Dict[Pair, Any], now: Optional[float] = None):
+        """Append one batch of reads, ``{(app key, tag): value}``, read at ``now`` (monotonic)."""
+        if not self.recording:
+            return
+        now = time.monotonic() if now is None else now
+        try:
+            read_set = tuple(values)
+            read_id = self._read_ids.get(read_set)
+            if read_id is None:
+                new = [pair for pair in read_set if pair not in self._tag_ids]
+                if new:
+                    for pair in new:
+                        self._tag_ids[pair] = len(self._tag_ids)
+                    self._write({"tags": [list(pair) for pair in new]})
+                read_id = self._read_ids[read_set] = len(self._read_ids)
+                self._write({"reads": [self._tag_ids[pair] for pair in read_set]})
+
+            record = [round(now - self.started, 3), read_id]
+            last = self._last
+            for pair, value in values.items():
+                tag_id = self._tag_ids[pair]
+                previous = last.get(tag_id, _UNSET)
+                # strict, so a replayed 1.0 isn't a 1 or a True
+                if type(previous) is not type(value) or previous != value:
+                    last[tag_id] = value
+                    record += (tag_id, value)
+            self._write(record)
+            self.batches += 1
+            self.reads += len(values)
+            self.written += (len(record) - 2) // 2
+
+            if now - self._flushed >= self.flush_interval:
+                self._flushed = now
+                self._file.flush()
+                if self._file.fileobj.tell() >= self.max_bytes:
+                    log.warning(
+                        f"Tag recording {self.path} reached {self.max_bytes} bytes, stopping"
+                    )
+                    self.close()
+        except OSError as e:
+            log.warning(f"Stopped recording tags to {self.path}: {e}")
+            self.close()
+
+    def _write(self, item: Any):
+        self._file.write(
+            json.dumps(item, separators=(",", ":"), default=repr).encode("utf-8")
+            + b"\n"
+        )
+
+    def close(self):
+        if not self.recording:
+            return
+        self.recording = False
+        try:
+            self._file.close()
+        except OSError as e:
+            log.warning(f"Couldn't finish tag recording {self.path}: {e}")
+
+    def __enter__(self) -> "TagRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "recording": self.recording,
+            "seconds": round(time.monotonic() - self.started, 3),
+            "batches": self.batches,
+            "reads": self.reads,
+            "values_written": self.written,
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+class TagRecording:
+    """A recording made by :class:`TagRecorder`, read back one batch at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with gzip.open(path, "rb") as f:
+                header = json.loads(f.readline())
+        except (OSError, EOFError, zlib.error, ValueError) as e:
+            raise ValueError(f"{path} is not a tag recording: {e}")
+        if (
+            not isinstance(header, dict)
+            or header.get("format") != FORMAT
+            or header.get("version") != FORMAT_VERSION
+        ):
+            raise ValueError(f"{path} is not a tag recording")
+        self.header = header
+        self.config: Dict[str, Any] = header.get("config") or {}
+        self.started: Optional[float] = header.get("started")
+
+    def batches(self) -> Iterator[Tuple[float, Dict[Pair, Any]]]:
+        """Each batch of reads as ``(seconds since the start, {(app key, tag): value})``, in order.
+
+        A recording that was cut short ends at its last complete batch.
+        """
+        tags: List[Pair] = []
+        read_sets: List[List[int]] = []
+        values: Dict[int, Any] = {}
+        with gzip.open(self.path, "rb") as f:
+            f.readline()
+            try:
+                for line in f:
+                    item = json.loads(line)
+                    if isinstance(item, dict):
+                        tags.extend(tuple(pair) for pair in item.get("tags", ()))
+                        if "reads" in item:
+                            read_sets.append(item["reads"])
+                        continue
+                    for i in range(2, len(item), 2):
+                        values[item[i]] = item[i + 1]
+                    yield (
+                        item[0],
+                        {tags[tag_id]: values[tag_id] for tag_id in read_sets[item[1]]},
+                    )
+            except (EOFError, zlib.error, ValueError) as e:
+                log.warning(f"{self.path} ends early, replaying up to there: {e}")
+
+
+async def feed(
+    recording: TagRecording,
+    cache: TagCache,
+    publish: Callable[[], Awaitable[Any]],
+    speed: float = 1.0,
+) -> Dict[str, Any]:
+    """Feed a recording's batches into ``cache``, calling ``publish()`` after each that changes what is shown.
+
+    ``speed`` is recorded seconds per second: 1 for real time, N for N times faster, or 0
+    for as fast as possible. The cache's clock follows the recording, so tags go stale
+    after the same recorded time whatever the speed.
+    """
+    recorded = 0.0
+    cache.clock = lambda: recorded
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    batches = 0
+    durations = []
+    try:
+        for recorded, values in recording.batches():
+            if speed > 0:
+                delay = start + recorded / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            changed = bool(cache.update(values, recorded))
+            changed |= cache.expire(recorded)
+            batches += 1
+            if changed or not durations:
+                begin = time.perf_counter()
+                await publish()
+                durations.append(time.perf_counter() - begin)
+            if speed <= 0:
+                await asyncio.sleep(
+                    0
+                )  # let anything else on the loop run between batches
+    finally:
+        cache.clock = time.monotonic
+
+    durations.sort()
+    return {
+        "batches": batches,
+        "updates": len(durations),
+        "recorded_seconds": recorded,
+        "replay_seconds": round(loop.time() - start, 3),
+        "update_avg_ms": sum(durations) / len(durations) * 1000 if durations else 0.0,
+        "update_p99_ms": durations[int(len(durations) * 0.99)] * 1000
+        if durations
+        else 0.0,
+        "update_max_ms": durations[-1] * 1000 if durations else 0.0,
+    }
+
+
+async def replay(
+    recording: TagRecording,
+    speed: float = 1.0,
+    port: int = 8091,
+    serving_mode: str = "threading",
+    dashboard: bool = True,
+    config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Replay a recording through the real application's dashboard update path.
+
+    The application is set up with the recording's deployment config, overlaid with
+    ``config`` (e.g. alarm rules), and its tags come from the recording instead of the
+    device agent. Commands sent from the dashboard are not written anywhere.
+    Returns the update timings from :func:`feed`.
+    """
+    from .app_config import SiaLocalControlUiConfig
+    from .application import SiaLocalControlUiApplication
+
+    app = SiaLocalControlUiApplication(
+        config=SiaLocalControlUiConfig(), app_key="sia_local_control_ui", test_mode=True
+    )
+    app.config._inject_deployment_config(
+        {
+            **recording.config,
+            **(config or {}),
+            "serving_mode": serving_mode,
+            "history_directory": "",
+            "record_tags_directory": "",
+        }
+    )
+
+    async def ignore_command(
+        tag_key: str,
+        value: Any,
+        app_key: Optional[str] = None,
+        only_if_changed: bool = True,
+    ):
+        log.info(f"Replaying, not writing {tag_key}={value!r} to {app_key}")
+
+    app.get_tag = lambda tag_key, app_key=None, default=None: default
+    app.set_tag_async = ignore_command
+    app.dashboard.port = port
+    if not dashboard:
+        app.start_dashboard = lambda: None
+
+    await app.setup()
+    metrics = app.dashboard.metrics
+
+    async def publish():
+        with metrics.update_duration.time():
+            await app.update_dashboard_data()
+
+    try:
+        stats = await feed(recording, app.poll_scheduler.cache, publish, speed)
+    finally:
+        await app.command_queue.stop()
+        app.dashboard.stop()
+    return {
+        **stats,
+        "active_alarms": len(app.dashboard.alarms.active),
+        "clients": len(app.dashboard.connected_clients),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Replay a tag recording through the dashboard"
+    )
+    parser.add_argument("recording", help="a recording from the Record Tags Directory")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="recorded seconds per second: 1 for real time, 0 for as fast as possible",
+    )
+    parser.add_argument(
+        "--config", help="a JSON file of deployment config to replay with, e.g. alarms"
+    )
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument(
+        "--serving-mode", choices=["threading", "async"], default="threading"
+    )
+    parser.add_argument(
+        "--no-dashboard", action="store_true", help="don't start the web server"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    stats = asyncio.run(
+        replay(
+            TagRecording(args.recording),
+            args.speed,
+            args.port,
+            args.serving_mode,
+            not args.no_dashboard,
+            config,
+        )
+    )
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
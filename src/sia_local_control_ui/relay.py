@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import socketio
+
+from .commands import Command
+from .delta import merge_patch
+from .fleet import FLEETS, Fleet
+from .snapshot import FIELD_INDEX
+
+log = logging.getLogger(__name__)
+
+# system status shown on the relay's panels while the primary is unreachable
+DISCONNECTED_STATUS = "upstream disconnected"
+
+
+def _clock(value: str) -> float:
+    """Epoch seconds for one of the primary's ISO timestamps, read as local time like the primary wrote it."""
+    return datetime.fromisoformat(value).timestamp()
+
+
+class DashboardRelay:
+    """Mirrors a primary dashboard into a local :class:`~sia_local_control_ui.dashboard.SiaDashboard`.
+
+    The relay holds one Socket.IO connection to the primary (``upstream``, e.g.
+    ``http://gateway:8091``) and is paced by it like any other client. Every update
+    it receives is applied to its own dashboard, which re-serves the same UI and API
+    to its own clients, so the primary's fan-out cost is one client per relay.
+    Commands sent to the relay are forwarded to the primary, and the primary's
+    acknowledgements are passed back to the panel that sent them.
+
+    Every ``ping_interval`` seconds the relay asks the primary for its clock and
+    latest version, which gives the round trip, the clock offset between the two
+    hosts, and how many versions the relay is behind. ``lag`` is the age of the
+    newest data on arrival: when it was updated on the primary to when the relay
+    applied it.
+    """
+
+    def __init__(self, dashboard, upstream: str, ping_interval: float = 5.0):
+        self.dashboard = dashboard
+        self.upstream = upstream.rstrip("/")
+        self.ping_interval = ping_interval
+
+        # the primary's payload as last received, merged with every patch since
+        self.data: Dict[str, Any] = {}
+        self.version: Optional[int] = None
+        self.upstream_version: Optional[int] = None
+        self.connected = False
+        self.connects = 0
+        self.resyncs = 0
+        self.received = 0
+        self.lag: Optional[float] = None
+        self.max_lag = 0.0
+        self.round_trip: Optional[float] = None
+        self.clock_offset = (
+            0.0  # primary clock minus ours, including any time zone difference
+        )
+        self.last_received: Optional[float] = None
+
+        # forwarded commands awaiting the primary's ack, by the id sent upstream
+        self._commands: Dict[int, Command] = {}
+        self._command_seq = 0
+        self._lock = threading.Lock()
+
+        self._sio: Optional[socketio.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+        dashboard.command_handler = self.forward_command
+
+    def start(self):
+        """Connect to the primary from a background thread, retrying until it is up."""
+        self._thread = threading.Thread(
+            target=self._run_loop, name="dashboard-relay", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+            # e.g. a reconnection attempt in progress when stopped
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(
+                    asyncio.gather(*pending, return_exceptions=True)
+                )
+        finally:
+            loop.close()
+            self._loop = None
+
+    async def _run(self):
+        """Relay until stopped, on the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        sio = self._sio = socketio.AsyncClient(
+            reconnection_delay=1, reconnection_delay_max=10
+        )
+        sio.on("connect", self._on_connect)
+        sio.on("disconnect", self._on_disconnect)
+        sio.on("data_update", self._on_update)
+        sio.on("data_patch", self._on_patch)
+        sio.on("command_ack", self._on_command_ack)
+        sio.on("alarm", self._on_alarm)
+        sio.on("alarms", self._on_alarms)
+
+        log.info(f"Relaying dashboard from {self.upstream}")
+        while not self._stopping.is_set() and not sio.connected:
+            try:
+                await sio.connect(self.upstream, auth={"ack": True})
+            except socketio.exceptions.ConnectionError as e:
+                log.warning(f"Can't reach upstream dashboard {self.upstream}: {e}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=2)
+                except TimeoutError:
+                    pass
+        try:
+            while not self._stopping.is_set():
+                if self.connected:
+                    await self.ping()
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(), timeout=self.ping_interval
+                    )
+                except TimeoutError:
+                    pass
+        finally:
+            await sio.disconnect()
+
+    async def ping(self):
+        """Measure the round trip and clock offset to the primary, and its latest version."""
+        start = time.time()
+        try:
+            reply = await self._sio.call("relay_ping", timeout=5)
+        except (
+            socketio.exceptions.TimeoutError,
+            socketio.exceptions.BadNamespaceError,
+        ):
+            log.warning("Upstream dashboard didn't answer a ping")
+            return
+        end = time.time()
+        self.round_trip = end - start
+        self.clock_offset = _clock(reply["time"]) - (start + end) / 2
+        self.upstream_version = reply["version"]
+
+    async def _on_connect(self):
+        self.connected = True
+        self.connects += 1
+        log.info(f"Connected to upstream dashboard {self.upstream}")
+        await self._sio.emit("request_alarms")
+
+    async def _on_disconnect(self, *_args):
+        self.connected = False
+        log.warning(f"Lost upstream dashboard {self.upstream}")
+        self.dashboard.update_data(system={"status": DISCONNECTED_STATUS})
+        with self._lock:
+            commands, self._commands = list(self._commands.values()), {}
+        for command in commands:
+            self.dashboard.command_done(
+                command,
+                "failed",
+                "Upstream dashboard disconnected",
+                0.0,
+                time.perf_counter() - command.received,
+            )
+
+    async def _on_update(self, data: Dict[str, Any]):
+        """A full payload: replaces everything the relay has."""
+        self.version = data.pop("version", None)
+        self.data = data
+        self._apply(data, measure=False)
+
+    async def _on_patch(self, message: Dict[str, Any]):
+        if self.version is not None and message["version"] <= self.version:
+            return
+        if self.version is None or message["base"] > self.version:
+            await self._resync(self.version)
+            return
+        merge_patch(self.data, message["patch"])
+        self.version = message["version"]
+        self._apply(message["patch"])
+
+    async def _resync(self, since: Optional[int] = None):
+        self.resyncs += 1
+        await self._sio.emit(
+            "request_data", {"since": since} if since is not None else {}
+        )
+
+    def _apply(self, patch: Dict[str, Any], measure: bool = True):
+        """Apply the sections in ``patch``, as now merged into :attr:`data`, to the relay's dashboard.
+
+        With ``measure``, the lag is updated from the patch's timestamp; a full update
+        after (re)connecting carries whatever the primary last published, however old.
+        """
+        sections = {}
+        for section, changes in patch.items():
+            merged = self.data.get(section)
+            if section in FLEETS:
+                units = merged.get("units") or {}
+                if merged.get("count", len(units)) != len(units):
+                    # units were removed; patches only carry additions and changes
+                    self._loop.create_task(self._resync())
+                    continue
+                sections[section] = Fleet.from_rows(
+                    section, list(units), units.values()
+                )
+            elif section in FIELD_INDEX:
+                sections[section] = changes
+        self.dashboard.update_data(**sections)
+
+        now = time.time()
+        self.received += 1
+        self.last_received = now
+        timestamp = patch.get("system", {}).get("timestamp")
+        if measure and timestamp:
+            self.lag = max(now + self.clock_offset - _clock(timestamp), 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    async def _on_alarm(self, event: Dict[str, Any]):
+        """Alarms are evaluated on the primary; pass its events on."""
+        self.dashboard.alarms.record(event)
+        self.dashboard.emit("alarm", event)
+
+    async def _on_alarms(self, alarms: Dict[str, Any]):
+        self.dashboard.alarms.replace_active(alarms.get("active", ()))
+        self.dashboard.emit("alarms", self.dashboard.alarms_response())
+
+    def forward_command(self, command: Command):
+        """The relay dashboard's command handler: send the command to the primary."""
+        loop = self._loop
+        if not self.connected or loop is None:
+            self.dashboard.command_done(
+                command, "failed", "Upstream dashboard is not connected", 0.0, 0.0
+            )
+            return
+        with self._lock:
+            self._command_seq += 1
+            command_id = self._command_seq
+            self._commands[command_id] = command
+        message = {
+            "id": command_id,
+            "pump": command.pump,
+            "field": command.field,
+            "value": command.value,
+        }
+        asyncio.run_coroutine_threadsafe(self._sio.emit("send_command", message), loop)
+
+    async def _on_command_ack(self, ack: Dict[str, Any]):
+        with self._lock:
+            command = self._commands.pop(ack.get("id"), None)
+        if command is None:
+            return
+        queued = (ack.get("queued_ms") or 0.0) / 1000
+        self.dashboard.command_done(
+            command,
+            ack.get("status", "failed"),
+            ack.get("error"),
+            queued,
+            time.perf_counter() - command.received,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        behind = None
+        if self.upstream_version is not None and self.version is not None:
+            behind = max(self.upstream_version - self.version, 0)
+        return {
+            "upstream": self.upstream,
+            "connected": self.connected,
+            "connects": self.connects,
+            "version": self.version,
+            "upstream_version": self.upstream_version,
+            "versions_behind": behind,
+            "lag_ms": round(self.lag * 1000, 3) if self.lag is not None else None,
+            "max_lag_ms": round(self.max_lag * 1000, 3),
+            "round_trip_ms": round(self.round_trip * 1000, 3)
+            if self.round_trip is not None
+            else None,
+            "clock_offset_ms": round(self.clock_offset * 1000, 3),
+            "last_received_age": round(time.time() - self.last_received, 3)
+            if self.last_received
+            else None,
+            "received": self.received,
+            "resyncs": self.resyncs,
+            "pending_commands": len(self._commands),
+        }
+
+
+def main(argv: Optional[List[str]] = None):
+    from .dashboard import SERVING_MODES, SiaDashboard
+
+    parser = argparse.ArgumentParser(
+        description="Re-serve a primary dashboard to panels on another process or node"
+    )
+    parser.add_argument(
+        "upstream", help="the primary dashboard, e.g. http://gateway:8091"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8092)
+    parser.add_argument("--serving-mode", choices=SERVING_MODES, default="async")
+    parser.add_argument("--max-broadcast-rate", type=float, default=5.0)
+    parser.add_argument("--enable-metrics", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    dashboard = SiaDashboard(
+        host=args.host,
+        port=args.port,
+        max_broadcast_rate=args.max_broadcast_rate,
+        serving_mode=args.serving_mode,
+        enable_metrics=args.enable_metrics,
+        upstream=args.upstream,
+    )
+    try:
+        dashboard.start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dashboard.stop()
+
+
+if __name__ == "__main__":
+    main()
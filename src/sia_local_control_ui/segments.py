@@ -0,0 +1,440 @@
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .encoding import is_nan
+
+log = logging.getLogger(__name__)
+
+# magic, format version, column count, row resolution in seconds (0 = raw samples), header length
+HEADER = struct.Struct("<4sHHII")
+MAGIC = b"SIAH"
+FORMAT_VERSION = 1
+SUFFIX = ".seg"
+NAN = float("nan")
+
+
+def _fsync_directory(directory: str):
+    """Make file creations, renames and deletions in ``directory`` durable."""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Segment:
+    """One append-only segment file of fixed-size rows.
+
+    The header lists the metric held in each column. Every row is a float64
+    timestamp followed by one float32 per column (NaN when a metric has no value),
+    padded to a multiple of 8 bytes, so rows can be read in place from a memory map.
+    A partly written last row, e.g. after a power cut, is ignored.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        resolution: int = 0,
+        rows: int = 0,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ):
+        self.path = path
+        self.columns = columns
+        self.column_index = {name: i for i, name in enumerate(columns)}
+        self.resolution = resolution
+        names = json.dumps(columns).encode("utf-8")
+        self.header_length = HEADER.size + len(names) + -(HEADER.size + len(names)) % 8
+        self.row_struct = struct.Struct(f"<d{len(columns) + len(columns) % 2}f")
+        self.rows = rows
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def create(cls, path: str, columns: List[str], resolution: int = 0) -> "Segment":
+        segment = cls(path, columns, resolution)
+        names = json.dumps(columns).encode("utf-8")
+        header = (
+            HEADER.pack(
+                MAGIC, FORMAT_VERSION, len(columns), resolution, segment.header_length
+            )
+            + names
+        )
+        with open(path, "wb") as f:
+            f.write(header.ljust(segment.header_length, b"\0"))
+            f.flush()
+            os.fsync(f.fileno())
+        return segment
+
+    @classmethod
+    def load(cls, path: str) -> "Segment":
+        """Read a segment's header and the times of its first and last rows."""
+        with open(path, "rb") as f:
+            magic, version, count, resolution, header_length = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a history segment")
+            columns = json.loads(f.read(header_length - HEADER.size).rstrip(b"\0"))
+            segment = cls(path, columns, resolution)
+            if len(columns) != count or segment.header_length != header_length:
+                raise ValueError(f"{path} has a corrupt header")
+            segment.rows = (
+                os.fstat(f.fileno()).st_size - header_length
+            ) // segment.row_struct.size
+            if segment.rows:
+                segment.start = segment._read_time(f, 0)
+                segment.end = segment._read_time(f, segment.rows - 1)
+        return segment
+
+    def _read_time(self, f, row: int) -> float:
+        f.seek(self.header_length + row * self.row_struct.size)
+        return struct.unpack("<d", f.read(8))[0]
+
+    def pack(self, t: float, values: Dict[str, float]) -> bytes:
+        row = [values.get(name, NAN) for name in self.columns]
+        if len(row) % 2:
+            row.append(NAN)
+        return self.row_struct.pack(t, *row)
+
+    @contextmanager
+    def column(self, metric: str, start: float, end: float):
+        """Memory-map the segment and yield ``(times, values)`` views of one column between ``start`` and ``end``.
+
+        The views are strided slices of the mapped file, so nothing is copied
+        until they are read. They are only valid inside the ``with`` block.
+        """
+        rows = self.rows
+        index = self.column_index[metric]
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(
+                f.fileno(),
+                self.header_length + rows * self.row_struct.size,
+                access=mmap.ACCESS_READ,
+            )
+        views = []
+        try:
+            raw = memoryview(mapped)[self.header_length :]
+            doubles, floats = raw.cast("d"), raw.cast("f")
+            views = [raw, doubles, floats]
+            stride = self.row_struct.size // 8
+            first, last = (
+                self._bisect(doubles, stride, rows, start),
+                self._bisect(doubles, stride, rows, math.nextafter(end, math.inf)),
+            )
+            times = doubles[first * stride : last * stride : stride]
+            values = floats[
+                first * stride * 2 + 2 + index : last * stride * 2 : stride * 2
+            ]
+            views += [times, values]
+            yield times, values
+        finally:
+            for view in reversed(views):
+                view.release()
+            mapped.close()
+
+    @staticmethod
+    def _bisect(doubles: memoryview, stride: int, rows: int, t: float) -> int:
+        """First row whose time is >= ``t``."""
+        low, high = 0, rows
+        while low < high:
+            middle = (low + high) // 2
+            if doubles[middle * stride] < t:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+class SegmentStore:
+    """Durable history of the dashboard metrics, kept in segment files on disk.
+
+    :meth:`record` only keeps the latest value of each metric in memory, so it never
+    blocks the caller on disk. A writer thread samples those values into one row every
+    ``sample_interval`` seconds and appends the rows in batches, with an fsync every
+    ``fsync_interval`` seconds to limit flash wear. A new segment is started every
+    ``segment_seconds`` or whenever a new metric appears. Segments older than
+    ``compact_after`` seconds are rewritten as ``compact_resolution`` averages, and
+    segments older than ``retention`` seconds are deleted.
+
+    The segment index (columns and time range of each file) is built from the file
+    headers at startup, so queries can be served straight away.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_interval: float = 1.0,
+        fsync_interval: float = 15.0,
+        segment_seconds: int = 3600,
+        retention: float = 7 * 86400,
+        compact_after: float = 86400,
+        compact_resolution: int = 60,
+    ):
+        self.directory = directory
+        self.sample_interval = sample_interval
+        self.fsync_interval = fsync_interval
+        self.segment_seconds = segment_seconds
+        self.retention = retention
+        self.compact_after = compact_after
+        self.compact_resolution = compact_resolution
+
+        self._latest: Dict[str, float] = {}
+        self._latest_time: Optional[float] = None
+        self._sampled_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+        self._current: Optional[Segment] = None
+        self._fd: Optional[int] = None
+        self._pending = bytearray()
+        self._pending_rows = 0
+        self._pending_end: Optional[float] = None
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._index_lock = threading.Lock()
+        self.segments: List[Segment] = self._load_index()
+
+    def _load_index(self) -> List[Segment]:
+        segments = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(SUFFIX):
+                if name.endswith(SUFFIX + ".tmp"):
+                    os.remove(path)  # interrupted compaction
+                continue
+            try:
+                segment = Segment.load(path)
+            except (OSError, ValueError, struct.error) as e:
+                log.warning(f"Skipping unreadable history segment {name}: {e}")
+                continue
+            if segment.rows:
+                segments.append(segment)
+        log.info(f"Loaded {len(segments)} history segments from {self.directory}")
+        return segments
+
+    @property
+    def pending_rows(self) -> int:
+        """Rows sampled but not yet written to disk."""
+        return self._pending_rows
+
+    def metrics(self) -> List[str]:
+        with self._index_lock:
+            segments = list(self.segments)
+        return sorted({name for segment in segments for name in segment.columns})
+
+    def record(self, values: Iterable[Tuple[str, float]], t: Optional[float] = None):
+        """Note the latest ``(metric, value)`` pairs at time ``t`` for the next row."""
+        t = time.time() if t is None else t
+        with self._lock:
+            self._latest.update(values)
+            self._latest_time = t
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="history-writer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread, writing out and syncing everything recorded so far."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._sample()
+        self._flush()
+        self._close_current()
+
+    def _run(self):
+        last_sync = last_maintenance = time.monotonic()
+        self._maintain()
+        while not self._stop.wait(self.sample_interval):
+            try:
+                self._sample()
+                now = time.monotonic()
+                if now - last_sync >= self.fsync_interval:
+                    self._flush()
+                    last_sync = now
+                if now - last_maintenance >= 600:
+                    self._maintain()
+                    last_maintenance = now
+            except OSError as e:
+                log.error(f"Error writing history segment: {e}")
+
+    def _sample(self):
+        """Add a row with the latest value of every metric, if anything was recorded since the last row."""
+        with self._lock:
+            t = self._latest_time
+            if t is None or t == self._sampled_time:
+                return
+            values = dict(self._latest)
+            self._sampled_time = t
+
+        current = self._current
+        if (
+            current is None
+            or len(values) != len(current.columns)
+            or not values.keys() <= current.column_index.keys()
+            or t - current.start >= self.segment_seconds
+        ):
+            current = self._roll(t, sorted(values))
+        self._pending += current.pack(t, values)
+        self._pending_rows += 1
+        self._pending_end = t
+
+    def _roll(self, t: float, columns: List[str]) -> Segment:
+        self._flush()
+        self._close_current()
+        path = os.path.join(self.directory, f"{int(t * 1000):013d}{SUFFIX}")
+        segment = Segment.create(path, columns)
+        segment.start = t
+        _fsync_directory(self.directory)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        self._current = segment
+        return segment
+
+    def _flush(self):
+        """Append the pending rows to the current segment and fsync it."""
+        if not self._pending or self._fd is None:
+            return
+        os.write(self._fd, self._pending)
+        os.fsync(self._fd)
+        segment = self._current
+        segment.rows += self._pending_rows
+        segment.end = self._pending_end
+        if segment.rows == self._pending_rows:
+            with self._index_lock:
+                self.segments.append(segment)
+        self._pending.clear()
+        self._pending_rows = 0
+
+    def _close_current(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._current = None
+
+    def _maintain(self, now: Optional[float] = None):
+        """Delete segments past the retention period and compact old raw ones."""
+        now = time.time() if now is None else now
+        with self._index_lock:
+            segments = [
+                segment for segment in self.segments if segment is not self._current
+            ]
+        for segment in segments:
+            try:
+                if segment.end < now - self.retention:
+                    with self._index_lock:
+                        self.segments.remove(segment)
+                    os.remove(segment.path)
+                    log.info(
+                        f"Deleted expired history segment {os.path.basename(segment.path)}"
+                    )
+                elif (
+                    segment.end < now - self.compact_after
+                    and segment.resolution < self.compact_resolution
+                ):
+                    self._compact(segment)
+            except OSError as e:
+                log.error(f"Error maintaining history segment {segment.path}: {e}")
+
+    def _compact(self, segment: Segment):
+        """Rewrite a segment as per-``compact_resolution`` averages of each column."""
+        resolution = self.compact_resolution
+        buckets: Dict[float, List[List[float]]] = {}
+        for name in segment.columns:
+            with segment.column(name, segment.start, segment.end) as (times, values):
+                for t, value in zip(times, values):
+                    if not is_nan(value):
+                        sums = buckets.setdefault(
+                            t - t % resolution, [[0.0, 0] for _ in segment.columns]
+                        )
+                        column = sums[segment.column_index[name]]
+                        column[0] += value
+                        column[1] += 1
+
+        tmp_path = segment.path + ".tmp"
+        compacted = Segment.create(tmp_path, segment.columns, resolution)
+        with open(tmp_path, "ab") as f:
+            for t, sums in sorted(buckets.items()):
+                f.write(
+                    compacted.pack(
+                        t,
+                        {
+                            name: total / count
+                            for name, (total, count) in zip(segment.columns, sums)
+                            if count
+                        },
+                    )
+                )
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, segment.path)
+        _fsync_directory(self.directory)
+
+        compacted.path, compacted.rows = segment.path, len(buckets)
+        compacted.start, compacted.end = (
+            (min(buckets), max(buckets)) if buckets else (segment.start, segment.end)
+        )
+        with self._index_lock:
+            self.segments[self.segments.index(segment)] = compacted
+        log.info(
+            f"Compacted history segment {os.path.basename(segment.path)}: {segment.rows} -> {compacted.rows} rows"
+        )
+
+    def query(
+        self, metric: str, start: float, end: float, max_points: int = 500
+    ) -> Optional[Tuple[int, List[tuple]]]:
+        """``(bucket size, [(start, min, max, avg, count)])`` for ``metric`` between ``start`` and ``end``.
+
+        Buckets are sized so there are at most ``max_points`` of them. Returns None
+        if no segment in the range holds the metric.
+        """
+        with self._index_lock:
+            segments = [
+                s
+                for s in self.segments
+                if metric in s.column_index and s.start <= end and s.end >= start
+            ]
+        if not segments:
+            return None
+
+        width = max(1, math.ceil((end - start) / max(max_points, 1)))
+        buckets: Dict[float, List[float]] = {}
+        for segment in segments:
+            try:
+                with segment.column(metric, start, end) as (times, values):
+                    for t, value in zip(times, values):
+                        if is_nan(value):
+                            continue
+                        key = t - (t - start) % width
+                        bucket = buckets.get(key)
+                        if bucket is None:
+                            buckets[key] = [value, value, value, 1]
+                        else:
+                            bucket[0] = min(bucket[0], value)
+                            bucket[1] = max(bucket[1], value)
+                            bucket[2] += value
+                            bucket[3] += 1
+            except (OSError, ValueError) as e:
+                # e.g. the segment was deleted by retention after we picked it
+                log.debug(f"Skipping history segment {segment.path}: {e}")
+        rows = [
+            (t, low, high, total / count, count)
+            for t, (low, high, total, count) in sorted(buckets.items())
+        ]
+        return width, rows
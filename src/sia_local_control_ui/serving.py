@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+
+import socketio
+from aiohttp import web
+
+from .assets import index_asset, static_assets
+from .encoding import PacketJSON, RawJSON
+from .startup import STARTUP
+from .stream import STREAM_HEADERS, DataStream
+
+log = logging.getLogger(__name__)
+
+
+class AsyncDashboardServer:
+    """Serves a :class:`~sia_local_control_ui.dashboard.SiaDashboard` from an asyncio event loop.
+
+    The Socket.IO server is python-socketio's ``AsyncServer`` on aiohttp, so each
+    client costs a few coroutines and buffers rather than a thread. It exposes the
+    same routes and events as the Flask server, using the dashboard's handlers.
+    Call :meth:`run` from the thread that should own the event loop; :meth:`stop`
+    may be called from any thread.
+    """
+
+    def __init__(
+        self,
+        dashboard,
+        max_clients: int = 500,
+        max_message_size: int = 64 * 1024,
+        shutdown_timeout: float = 1.0,
+    ):
+        self.dashboard = dashboard
+        self.max_clients = max_clients
+        self.shutdown_timeout = shutdown_timeout
+        self.sio = socketio.AsyncServer(
+            async_mode="aiohttp",
+            cors_allowed_origins="*",
+            json=PacketJSON,
+            max_http_buffer_size=max_message_size,
+        )
+        self.app = web.Application(client_max_size=max_message_size)
+        self.sio.attach(self.app)
+        self._setup_routes()
+        self._setup_socket_events()
+
+        self.loop = None
+        self._stopping = asyncio.Event()
+
+    def _setup_routes(self):
+        dashboard = self.dashboard
+        routes = web.RouteTableDef()
+
+        @routes.get("/")
+        async def index(request):
+            return _asset_response(
+                index_asset().respond(
+                    request.headers.get("Accept-Encoding"),
+                    request.headers.get("If-None-Match"),
+                )
+            )
+
+        @routes.get("/static/{filename:.+}")
+        async def static_file(request):
+            return _asset_response(
+                static_assets().respond(
+                    request.match_info["filename"],
+                    request.headers.get("Accept-Encoding"),
+                    request.headers.get("If-None-Match"),
+                )
+            )
+
+        @routes.get("/api/data")
+        async def get_data(request):
+            snapshot = dashboard.data
+            etag = f'"{snapshot.etag}"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag in (
+                tag.strip()
+                for tag in request.headers.get("If-None-Match", "").split(",")
+            ):
+                return web.Response(status=304, headers=headers)
+            return web.Response(
+                body=snapshot.encoded().data,
+                content_type="application/json",
+                headers=headers,
+            )
+
+        @routes.get("/api/stream")
+        async def get_stream(request):
+            try:
+                stream = DataStream.from_args(
+                    request.query, request.headers.get("Accept")
+                )
+            except ValueError as e:
+                return _json_response({"error": str(e)}, 400)
+            response = web.StreamResponse(
+                headers={"Content-Type": stream.content_type, **STREAM_HEADERS}
+            )
+            await response.prepare(request)
+            async with aclosing(dashboard.streams.aframes(stream)) as frames:
+                try:
+                    async for frame in frames:
+                        await response.write(frame)
+                except ConnectionResetError:
+                    pass  # the consumer went away
+            return response
+
+        @routes.get("/api/fleet/{kind}")
+        async def get_fleet(request):
+            fleet = dashboard.fleet_response(request.match_info["kind"])
+            if fleet is None:
+                raise web.HTTPNotFound()
+            return _json_response(fleet)
+
+        @routes.get("/api/fleet/{kind}/units/{name}")
+        async def get_fleet_unit(request):
+            unit = dashboard.fleet_unit_response(
+                request.match_info["kind"], request.match_info["name"]
+            )
+            if unit is None:
+                raise web.HTTPNotFound()
+            return _json_response(unit)
+
+        @routes.get("/api/history")
+        async def get_history(request):
+            # reading older history from disk can take a while; keep it off the loop
+            body, status = await asyncio.get_running_loop().run_in_executor(
+                None, dashboard.history_response, request.query
+            )
+            return _json_response(body, status)
+
+        @routes.get("/api/alarms")
+        async def get_alarms(request):
+            return _json_response(dashboard.alarms_response())
+
+        @routes.get("/api/health")
+        async def health(request):
+            return _json_response(dashboard.health_response())
+
+        @routes.get("/api/clients")
+        async def get_clients(request):
+            return _json_response(dashboard.clients_response())
+
+        @routes.get("/api/metrics")
+        async def get_metrics(request):
+            body, content_type, status = dashboard.metrics_response(
+                request.query.get("format")
+            )
+            return web.Response(
+                body=body, status=status, headers={"Content-Type": content_type}
+            )
+
+        self.app.add_routes(routes)
+
+    def _setup_socket_events(self):
+        dashboard = self.dashboard
+        sio = self.sio
+
+        @sio.event
+        async def connect(sid, environ, auth=None):
+            if len(dashboard.connected_clients) >= self.max_clients:
+                log.warning(
+                    f"Refusing client {sid}: already serving {self.max_clients} clients"
+                )
+                return False
+            await sio.emit(*dashboard.client_connected(sid, auth), to=sid)
+
+        @sio.event
+        async def disconnect(sid, *_args):
+            dashboard.client_disconnected(sid)
+
+        @sio.event
+        async def request_data(sid, data=None):
+            await sio.emit(*dashboard.data_request(data, sid), to=sid)
+
+        @sio.event
+        async def subscribe(sid, data=None):
+            await sio.emit(*dashboard.subscribe_request(data, sid), to=sid)
+
+        @sio.event
+        async def set_format(sid, data=None):
+            return dashboard.format_request(data, sid)
+
+        @sio.event
+        async def relay_ping(sid, data=None):
+            return dashboard.ping_request()
+
+        @sio.event
+        async def request_alarms(sid, data=None):
+            await sio.emit("alarms", dashboard.alarms_response(), to=sid)
+
+        @sio.event
+        async def request_fleet(sid, data=None):
+            await sio.emit(*dashboard.fleet_request(data), to=sid)
+
+        @sio.event
+        async def render_stats(sid, data=None):
+            reply = dashboard.render_stats_request(data, sid)
+            if reply:
+                await sio.emit(*reply, to=sid)
+
+        @sio.event
+        async def set_pump_state(sid, data=None):
+            reply = dashboard.pump_state_request(data, sid)
+            if reply:
+                await sio.emit(*reply, to=sid)
+
+        @sio.event
+        async def send_command(sid, data=None):
+            reply = dashboard.command_request(data, sid)
+            if reply:
+                await sio.emit(*reply, to=sid)
+
+    def emit(self, event: str, data):
+        """Send an event to every client. Safe to call from any thread; does not wait."""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._emit(event, data), loop)
+
+    def emit_to(self, sid: str, event: str, data, callback=None):
+        """Send an event to one client. Safe to call from any thread; does not wait."""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(
+                self.sio.emit(event, data, to=sid, callback=callback), loop
+            )
+
+    def disconnect(self, sid: str):
+        """Disconnect one client. Safe to call from any thread."""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.sio.disconnect(sid), loop)
+
+    async def _emit(self, event: str, data):
+        metrics = self.dashboard.metrics
+        if not metrics.enabled:
+            await self.sio.emit(event, data)
+            return
+        start = time.perf_counter()
+        await self.sio.emit(event, data)
+        metrics.observe_emit(
+            time.perf_counter() - start, len(self.dashboard.connected_clients)
+        )
+
+    def run(self, host: str, port: int):
+        """Serve until :meth:`stop` is called."""
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve(host, port))
+            # finish off connection tasks that outlived the shutdown timeout
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self.loop.run_until_complete(
+                    asyncio.gather(*pending, return_exceptions=True)
+                )
+        finally:
+            self.loop.close()
+            self.loop = None
+
+    async def _serve(self, host: str, port: int):
+        runner = web.AppRunner(
+            self.app, access_log=None, shutdown_timeout=self.shutdown_timeout
+        )
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+            log.info(f"Serving dashboard asynchronously on {host}:{port}")
+            STARTUP.mark("dashboard serving")
+            await self._stopping.wait()
+
+            log.info(
+                f"Disconnecting {len(self.dashboard.connected_clients)} dashboard clients"
+            )
+            clients = [
+                self.sio.disconnect(sid)
+                for sid in list(self.dashboard.connected_clients)
+            ]
+            if clients:
+                await asyncio.wait(
+                    [asyncio.ensure_future(c) for c in clients],
+                    timeout=self.shutdown_timeout,
+                )
+            await self.sio.shutdown()
+        finally:
+            await runner.cleanup()
+
+    def stop(self):
+        """Disconnect every client and stop serving."""
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(self._stopping.set)
+        else:
+            self._stopping.set()
+
+
+def _asset_response(result) -> web.Response:
+    if result is None:
+        raise web.HTTPNotFound()
+    status, headers, body = result
+    return web.Response(body=body, status=status, headers=headers)
+
+
+def _json_response(body, status: int = 200) -> web.Response:
+    return web.Response(
+        body=RawJSON.encode(body).data, status=status, content_type="application/json"
+    )
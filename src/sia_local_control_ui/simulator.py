@@ -0,0 +1,535 @@
+import abc
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from .commands import PUMP_STATES
+from .tags import PUMP_COMMAND_TAGS
+
+log = logging.getLogger(__name__)
+
+
+class TagStore:
+    """An in-memory stand-in for the device agent's tag values.
+
+    ``get_tag`` and ``set_tag_async`` have the signatures of the ``Application``
+    methods, so an application can read from and write to simulated controllers
+    without a device agent.
+    """
+
+    def __init__(self):
+        self.tags: Dict[str, Dict[str, Any]] = {}
+        self.reads = 0
+        self.writes = 0
+
+    def get_tag(
+        self, tag_key: str, app_key: Optional[str] = None, default: Any = None
+    ) -> Any:
+        self.reads += 1
+        return self.tags.get(app_key, {}).get(tag_key, default)
+
+    def set_tags(self, tags: Dict[str, Any], app_key: str):
+        self.writes += len(tags)
+        self.tags.setdefault(app_key, {}).update(tags)
+
+    async def set_tag_async(
+        self,
+        tag_key: str,
+        value: Any,
+        app_key: Optional[str] = None,
+        only_if_changed: bool = True,
+    ):
+        self.set_tags({tag_key: value}, app_key)
+
+    def drop(self, app_key: str):
+        """Forget every tag of an app, as if it had gone offline."""
+        self.tags.pop(app_key, None)
+
+
+class Faults:
+    """How often simulated controllers misbehave, as average events per unit per hour.
+
+    - stale: the controller stops publishing, so its tags keep their last values
+    - dropout: the controller goes offline, so its tags disappear
+    - burst: the controller publishes every step, with noisier readings
+    """
+
+    def __init__(
+        self,
+        stale_per_hour: float = 0.0,
+        stale_seconds: float = 60.0,
+        dropout_per_hour: float = 0.0,
+        dropout_seconds: float = 30.0,
+        burst_per_hour: float = 0.0,
+        burst_seconds: float = 10.0,
+    ):
+        self.stale_per_hour = stale_per_hour
+        self.stale_seconds = stale_seconds
+        self.dropout_per_hour = dropout_per_hour
+        self.dropout_seconds = dropout_seconds
+        self.burst_per_hour = burst_per_hour
+        self.burst_seconds = burst_seconds
+
+
+class SimulatedUnit(abc.ABC):
+    """A simulated controller app: its physics, how often it publishes, and its faults."""
+
+    kind = "unit"
+
+    def __init__(self, app_key: str, rate: float, rng: random.Random):
+        self.app_key = app_key
+        self.interval = 1.0 / rate
+        self.rng = rng
+        self.next_publish = 0.0
+        self.fault: Optional[str] = None
+        self.fault_until = 0.0
+
+    @abc.abstractmethod
+    def step(self, dt: float, now: float, store: TagStore):
+        """Advance the physics by ``dt`` simulated seconds."""
+
+    @abc.abstractmethod
+    def tags(self, noise: float = 1.0) -> Dict[str, Any]:
+        """The tag values the controller publishes."""
+
+    def _noise(self, sigma: float, noise: float) -> float:
+        return self.rng.gauss(0.0, sigma * noise)
+
+
+class SimulatedPump(SimulatedUnit):
+    """A chemical injection pump.
+
+    In ``auto`` the flow follows the target rate with a first-order lag, in ``standby``
+    it decays to zero, and ``calibration`` runs at the target rate without the lag.
+    State and target rate change when the dashboard writes the command tags.
+    """
+
+    kind = "pump"
+    time_constant = 3.0
+
+    def __init__(self, app_key: str, rate: float, rng: random.Random):
+        super().__init__(app_key, rate, rng)
+        self.target_rate = round(rng.uniform(10.0, 20.0), 1)
+        self.flow_rate = 0.0
+        self.state = "auto" if rng.random() < 0.8 else "standby"
+        self._commands: Dict[str, Any] = {}
+
+    def step(self, dt: float, now: float, store: TagStore):
+        # apply commands written to this controller since the last step
+        for field, tag in PUMP_COMMAND_TAGS.items():
+            value = store.tags.get(self.app_key, {}).get(tag)
+            if value is not None and value != self._commands.get(field):
+                self._commands[field] = value
+                if field == "pump_state" and value in PUMP_STATES:
+                    self.state = value
+                elif field == "target_rate":
+                    self.target_rate = float(value)
+
+        if self.state == "auto":
+            target = self.target_rate
+        elif self.state == "calibration":
+            self.flow_rate = self.target_rate
+            return
+        else:
+            target = 0.0
+        self.flow_rate += (target - self.flow_rate) * (
+            1.0 - math.exp(-dt / self.time_constant)
+        )
+
+    def tags(self, noise: float = 1.0) -> Dict[str, Any]:
+        flow = self.flow_rate + (
+            self._noise(0.05, noise) if self.flow_rate > 0.1 else 0.0
+        )
+        return {
+            "TargetRate": self.target_rate,
+            "FlowRate": round(max(flow, 0.0), 1),
+            "StateString": self.state,
+        }
+
+
+class SimulatedSolar(SimulatedUnit):
+    """A solar charge controller on a 24 V battery bank.
+
+    Panel power follows the sun from 06:00 to 18:00, scaled by drifting cloud cover;
+    the battery charges with the surplus over a constant load.
+    """
+
+    kind = "solar"
+    panel_watts = 300.0
+    load_watts = 40.0
+    capacity_ah = 200.0
+
+    def __init__(self, app_key: str, rate: float, rng: random.Random):
+        super().__init__(app_key, rate, rng)
+        self.remaining_ah = rng.uniform(0.5, 0.9) * self.capacity_ah
+        self.cloud = rng.uniform(0.7, 1.0)
+        self.panel_power = 0.0
+        self.current = 0.0
+
+    def step(self, dt: float, now: float, store: TagStore):
+        hour = (now / 3600.0) % 24.0
+        sun = max(0.0, math.sin(math.pi * (hour - 6.0) / 12.0))
+        self.cloud = min(
+            1.0, max(0.2, self.cloud + self.rng.gauss(0.0, 0.01) * math.sqrt(dt))
+        )
+        self.panel_power = self.panel_watts * sun * self.cloud
+        self.current = (self.panel_power - self.load_watts) / 24.0
+        self.remaining_ah = min(
+            self.capacity_ah, max(0.0, self.remaining_ah + self.current * dt / 3600.0)
+        )
+
+    def tags(self, noise: float = 1.0) -> Dict[str, Any]:
+        percent = 100.0 * self.remaining_ah / self.capacity_ah
+        voltage = 23.0 + 0.04 * percent + 0.02 * self.current + self._noise(0.01, noise)
+        return {
+            "b_voltage": round(voltage, 2),
+            "b_percent": round(percent, 1),
+            "panel_power": round(
+                max(self.panel_power + self._noise(0.5, noise), 0.0), 1
+            ),
+            "remaining_ah": round(self.remaining_ah, 1),
+        }
+
+
+class SimulatedTank(SimulatedUnit):
+    """A chemical tank drawn down by the pumps and refilled when it runs low."""
+
+    kind = "tank"
+    height_mm = 2000.0
+    area_m2 = 1.0  # so one litre is one millimetre
+    refill_litres_per_hour = 500.0
+
+    def __init__(
+        self, app_key: str, rate: float, rng: random.Random, pumps: List[SimulatedPump]
+    ):
+        super().__init__(app_key, rate, rng)
+        self.pumps = pumps
+        self.level_mm = rng.uniform(0.4, 0.9) * self.height_mm
+        self.refilling = False
+
+    def step(self, dt: float, now: float, store: TagStore):
+        outflow = sum(pump.flow_rate for pump in self.pumps)  # L/h
+        if self.level_mm < 0.1 * self.height_mm:
+            self.refilling = True
+        elif self.level_mm > 0.95 * self.height_mm:
+            self.refilling = False
+        inflow = self.refill_litres_per_hour if self.refilling else 0.0
+        self.level_mm += (inflow - outflow) * dt / 3600.0 / self.area_m2
+        self.level_mm = min(self.height_mm, max(0.0, self.level_mm))
+
+    def tags(self, noise: float = 1.0) -> Dict[str, Any]:
+        level = max(self.level_mm + self._noise(0.5, noise), 0.0)
+        return {
+            "tank_level_mm": round(level, 1),
+            "tank_level_percent": round(100.0 * level / self.height_mm, 1),
+        }
+
+
+class SimulatedSkidSensors(SimulatedUnit):
+    """The skid's flow sensor (total pump flow) and pressure sensor, published as one unit."""
+
+    kind = "skid"
+
+    def __init__(
+        self,
+        flow_app: str,
+        pressure_app: str,
+        rate: float,
+        rng: random.Random,
+        pumps: List[SimulatedPump],
+    ):
+        super().__init__(flow_app, rate, rng)
+        self.pressure_app = pressure_app
+        self.pumps = pumps
+
+    def step(self, dt: float, now: float, store: TagStore):
+        pass
+
+    def tags(self, noise: float = 1.0) -> Dict[str, Any]:
+        flow = sum(pump.flow_rate for pump in self.pumps)
+        return {"flow_rate": round(max(flow + self._noise(0.1, noise), 0.0), 1)}
+
+    def pressure(self, noise: float = 1.0) -> float:
+        running = sum(pump.flow_rate > 0.1 for pump in self.pumps)
+        return round(3.5 + 0.1 * running + self._noise(0.02, noise), 2)
+
+
+class FleetSimulator:
+    """Simulated pump, solar and tank controllers publishing to a :class:`TagStore`.
+
+    Call :meth:`step` with the current time, as often as you like; each controller
+    advances its physics and publishes at its own rate (``pump_rate`` etc., in Hz).
+    ``time_scale`` speeds up the simulated clock, e.g. to run through a day's solar
+    cycle in minutes. :meth:`app_config` is the deployment config that points the
+    dashboard application at the simulated controllers.
+    """
+
+    def __init__(
+        self,
+        store: Optional[TagStore] = None,
+        pumps: int = 2,
+        solar: int = 2,
+        tanks: int = 1,
+        pump_rate: float = 5.0,
+        solar_rate: float = 1.0,
+        tank_rate: float = 0.5,
+        faults: Optional[Faults] = None,
+        time_scale: float = 1.0,
+        start_hour: float = 10.0,
+        seed: Optional[int] = None,
+    ):
+        self.store = store if store is not None else TagStore()
+        self.faults = faults or Faults()
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.clock = start_hour * 3600.0  # simulated seconds since midnight
+        self._last: Optional[float] = None
+        self.fault_counts = {"stale": 0, "dropout": 0, "burst": 0}
+
+        self.pumps = [
+            SimulatedPump(f"sim_pump_{i + 1}", pump_rate, self.rng)
+            for i in range(pumps)
+        ]
+        self.solar = [
+            SimulatedSolar(f"sim_solar_{i + 1}", solar_rate, self.rng)
+            for i in range(solar)
+        ]
+        # the pumps are shared out between the tanks they draw from
+        self.tanks = [
+            SimulatedTank(
+                f"sim_tank_{i + 1}", tank_rate, self.rng, self.pumps[i::tanks]
+            )
+            for i in range(tanks)
+        ]
+        self.skid = SimulatedSkidSensors(
+            "sim_flow_sensor", "sim_pressure_sensor", pump_rate, self.rng, self.pumps
+        )
+        self.units: List[SimulatedUnit] = [
+            *self.pumps,
+            *self.solar,
+            *self.tanks,
+            self.skid,
+        ]
+
+    def app_config(self) -> Dict[str, Any]:
+        """Deployment config for ``SiaLocalControlUiConfig`` reading from the simulated apps."""
+        return {
+            "pump_controllers": [pump.app_key for pump in self.pumps],
+            "solar_controllers": [solar.app_key for solar in self.solar],
+            "tank_level_app": self.tanks[0].app_key if self.tanks else None,
+            "flow_sensor_app": self.skid.app_key,
+            "pressure_sensor_app": self.skid.pressure_app,
+        }
+
+    def step(self, now: Optional[float] = None):
+        """Advance to ``now`` (seconds, monotonic by default) and publish what is due."""
+        now = time.monotonic() if now is None else now
+        if self._last is None:
+            self._last = now
+        elapsed = max(now - self._last, 0.0)
+        self._last = now
+        dt = elapsed * self.time_scale
+        self.clock += dt
+
+        for unit in self.units:
+            unit.step(dt, self.clock, self.store)
+            self._inject_faults(unit, now, elapsed)
+            if unit.fault == "dropout":
+                continue
+            bursting = unit.fault == "burst"
+            if unit.fault == "stale" or (now < unit.next_publish and not bursting):
+                continue
+            unit.next_publish = now + unit.interval
+            noise = 5.0 if bursting else 1.0
+            self.store.set_tags(unit.tags(noise), unit.app_key)
+            if unit is self.skid:
+                self.store.set_tags(
+                    {"pressure": self.skid.pressure(noise)}, self.skid.pressure_app
+                )
+
+    def _inject_faults(self, unit: SimulatedUnit, now: float, elapsed: float):
+        if unit.fault is not None:
+            if now < unit.fault_until:
+                return
+            unit.fault = None
+        faults = self.faults
+        for fault, per_hour, duration in (
+            ("dropout", faults.dropout_per_hour, faults.dropout_seconds),
+            ("stale", faults.stale_per_hour, faults.stale_seconds),
+            ("burst", faults.burst_per_hour, faults.burst_seconds),
+        ):
+            if per_hour and self.rng.random() < per_hour * elapsed / 3600.0:
+                unit.fault = fault
+                unit.fault_until = now + duration
+                self.fault_counts[fault] += 1
+                log.debug(f"Injecting {fault} into {unit.app_key} for {duration} s")
+                if fault == "dropout":
+                    self.store.drop(unit.app_key)
+                    if unit is self.skid:
+                        self.store.drop(self.skid.pressure_app)
+                return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "units": len(self.units),
+            "tag_reads": self.store.reads,
+            "tag_writes": self.store.writes,
+            "faults": dict(self.fault_counts),
+            "active_faults": sum(unit.fault is not None for unit in self.units),
+            "simulated_hour": round((self.clock / 3600.0) % 24.0, 2),
+        }
+
+
+def parse_faults(spec: str) -> Faults:
+    """Parse ``"stale=10,dropout=5,burst=20"`` (events per unit per hour) into :class:`Faults`."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in ("stale", "dropout", "burst"):
+            raise ValueError(
+                f"Unknown fault: {name!r}, expected stale, dropout or burst"
+            )
+        rates[f"{name}_per_hour"] = float(value)
+    return Faults(**rates)
+
+
+async def run(
+    simulator: FleetSimulator,
+    duration: float,
+    port: int = 8091,
+    serving_mode: str = "threading",
+    dashboard: bool = True,
+) -> Dict[str, Any]:
+    """Run the dashboard application against the simulated fleet for ``duration`` seconds.
+
+    The application is the real one, with its tag reads and command writes going to
+    the simulator's tag store instead of the device agent. Returns loop timings and
+    the simulator's stats.
+    """
+    from .app_config import SiaLocalControlUiConfig
+    from .application import SiaLocalControlUiApplication
+
+    app = SiaLocalControlUiApplication(
+        config=SiaLocalControlUiConfig(), app_key="sia_local_control_ui", test_mode=True
+    )
+    app.config._inject_deployment_config(
+        {
+            **simulator.app_config(),
+            "serving_mode": serving_mode,
+            "history_directory": "",
+        }
+    )
+    app.get_tag = simulator.store.get_tag
+    app.set_tag_async = simulator.store.set_tag_async
+    app.dashboard.port = port
+    if not dashboard:
+        app.start_dashboard = lambda: None
+
+    simulator.step()
+    await app.setup()
+    period = app.loop_target_period
+    durations = []
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            start = time.monotonic()
+            simulator.step(start)
+            await app.main_loop()
+            durations.append(time.monotonic() - start)
+            await asyncio.sleep(max(0.0, period - durations[-1]))
+    finally:
+        await app.command_queue.stop()
+        app.dashboard.stop()
+
+    durations.sort()
+    return {
+        "loops": len(durations),
+        "loop_period_ms": period * 1000,
+        "loop_avg_ms": sum(durations) / len(durations) * 1000 if durations else 0.0,
+        "loop_p99_ms": durations[int(len(durations) * 0.99)] * 1000
+        if durations
+        else 0.0,
+        "loop_max_ms": durations[-1] * 1000 if durations else 0.0,
+        "polls": app.poll_scheduler.stats(),
+        "clients": len(app.dashboard.connected_clients),
+        **simulator.stats(),
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Run the dashboard against a simulated fleet of controllers"
+    )
+    parser.add_argument("--pumps", type=int, default=2)
+    parser.add_argument("--solar", type=int, default=2)
+    parser.add_argument("--tanks", type=int, default=1)
+    parser.add_argument(
+        "--pump-rate",
+        type=float,
+        default=5.0,
+        help="pump controller updates per second",
+    )
+    parser.add_argument(
+        "--solar-rate",
+        type=float,
+        default=1.0,
+        help="solar controller updates per second",
+    )
+    parser.add_argument(
+        "--tank-rate", type=float, default=0.5, help="tank level updates per second"
+    )
+    parser.add_argument(
+        "--faults",
+        default="",
+        help="fault rates per unit per hour, e.g. stale=10,dropout=5,burst=20",
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="simulated seconds per real second",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=60.0, help="seconds to run for"
+    )
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument(
+        "--serving-mode", choices=["threading", "async"], default="threading"
+    )
+    parser.add_argument(
+        "--no-dashboard", action="store_true", help="don't start the web server"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    simulator = FleetSimulator(
+        pumps=args.pumps,
+        solar=args.solar,
+        tanks=max(args.tanks, 1),
+        pump_rate=args.pump_rate,
+        solar_rate=args.solar_rate,
+        tank_rate=args.tank_rate,
+        faults=parse_faults(args.faults),
+        time_scale=args.time_scale,
+        seed=args.seed,
+    )
+    stats = asyncio.run(
+        run(
+            simulator,
+            args.duration,
+            args.port,
+            args.serving_mode,
+            not args.no_dashboard,
+        )
+    )
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
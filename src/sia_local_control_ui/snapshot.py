@@ -0,0 +1,237 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .encoding import RawJSON
+from .fleet import FLEETS, Fleet
+
+
+def since(value: Any) -> Optional[float]:
+    """A ``stale_since`` value: epoch seconds of a section's oldest good reading, 0 if it never had one, or None if fresh."""
+    return None if value is None else float(value)
+
+
+# (attribute, section, key, type, default) for every value held by a snapshot, in storage order
+FIELDS = (
+    # Pump Control Data
+    ("target_rate", "pump", "target_rate", float, 0.0),
+    ("flow_rate", "pump", "flow_rate", float, 0.0),
+    ("pump_state", "pump", "pump_state", str, "standby"),
+    ("pump_stale_since", "pump", "stale_since", since, None),
+    # Pump 2 Control Data
+    ("pump2_target_rate", "pump2", "target_rate", float, 0.0),
+    ("pump2_flow_rate", "pump2", "flow_rate", float, 0.0),
+    ("pump2_pump_state", "pump2", "pump_state", str, "standby"),
+    ("pump2_stale_since", "pump2", "stale_since", since, None),
+    # Solar Control Data
+    ("battery_voltage", "solar", "battery_voltage", float, 0.0),
+    ("battery_percentage", "solar", "battery_percentage", float, 0.0),
+    ("panel_power", "solar", "panel_power", float, 0.0),
+    ("battery_ah", "solar", "battery_ah", float, 0.0),
+    ("solar_stale_since", "solar", "stale_since", since, None),
+    # Tank Control Data
+    ("tank_level_mm", "tank", "tank_level_mm", float, 0.0),
+    ("tank_level_percent", "tank", "tank_level_percent", float, 0.0),
+    ("tank_stale_since", "tank", "stale_since", since, None),
+    # Skid Control Data
+    ("skid_flow", "skid", "skid_flow", float, 0.0),
+    ("skid_pressure", "skid", "skid_pressure", float, 0.0),
+    ("skid_stale_since", "skid", "stale_since", since, None),
+    # System Data
+    ("system_status", "system", "status", str, "running"),
+)
+
+# Distinguishes versions (and so ETags) from those of a previous process
+EPOCH = format(int(time.time() * 1000), "x")
+
+# {section: {key: index into DashboardData.values}}
+FIELD_INDEX: Dict[str, Dict[str, int]] = {}
+for _index, (_attr, _section, _key, _type, _default) in enumerate(FIELDS):
+    FIELD_INDEX.setdefault(_section, {})[_key] = _index
+
+
+def iter_metrics(
+    changes: Dict[int, Any], fleets: Optional[Dict[str, Fleet]] = None
+) -> Iterator[Tuple[str, float]]:
+    """Yield ``(metric name, value)`` for the numeric values in a snapshot update.
+
+    Fields are named ``section.key``; fleet readings ``fleet.unit.metric``.
+    """
+    for index, value in changes.items():
+        _attr, section, key, field_type, _default = FIELDS[index]
+        if field_type is float:
+            yield f"{section}.{key}", value
+    for kind, fleet in (fleets or {}).items():
+        for metric, column in fleet.columns.items():
+            for name, value in zip(fleet.names, column):
+                yield f"{kind}.{name}.{metric}", value
+
+
+class DashboardData:
+    """Immutable snapshot of the dashboard data.
+
+    Values are stored in a flat tuple in ``FIELDS`` order and exposed as read-only
+    attributes (``snapshot.flow_rate``, ``snapshot.pump2_pump_state``, ...). Per-unit
+    data for any number of pumps and solar controllers is held in :class:`Fleet`
+    objects, keyed by their payload section (``snapshot.fleets["pumps"]``). Updates
+    never modify a snapshot; :meth:`with_updates` returns a new one with the next
+    version. The dict and encoded JSON forms are built lazily, once per snapshot, and
+    shared between all readers, so they must not be modified.
+    """
+
+    __slots__ = ("version", "timestamp", "values", "fleets", "_dict", "_encoded")
+
+    def __init__(
+        self,
+        values: Optional[tuple] = None,
+        timestamp: Optional[datetime] = None,
+        version: int = 0,
+        fleets: Optional[Dict[str, Fleet]] = None,
+    ):
+        self.version = version
+        self.timestamp = timestamp or datetime.now()
+        self.values = (
+            values if values is not None else tuple(field[4] for field in FIELDS)
+        )
+        self.fleets = (
+            fleets if fleets is not None else {kind: Fleet() for kind in FLEETS}
+        )
+        self._dict = None
+        self._encoded = None
+
+    @staticmethod
+    def coerce_section(section: str, data: Dict[str, Any]) -> Dict[int, Any]:
+        """Validate one section update, returning ``{field index: converted value}``.
+
+        Raises ``ValueError``/``TypeError`` if any value can't be converted, in which
+        case none of the section should be applied.
+        """
+        keys = FIELD_INDEX.get(section, {})
+        coerced = {}
+        for key, value in data.items():
+            index = keys.get(key)
+            if index is not None:
+                coerced[index] = FIELDS[index][3](value)
+        return coerced
+
+    def with_updates(self, data: Dict[str, Any]) -> "DashboardData":
+        """Return a new snapshot with ``{section: {key: value}}`` applied, with validation.
+
+        Fleet sections (``"pumps"``, ``"solar_units"``) take a :class:`Fleet` instead of a dict.
+        """
+        changes = {}
+        fleets = {}
+        for section, values in data.items():
+            if section in FLEETS:
+                fleets[section] = self.coerce_fleet(values)
+            else:
+                changes.update(self.coerce_section(section, values))
+        return self.with_values(changes, fleets=fleets)
+
+    @staticmethod
+    def coerce_fleet(fleet: Any) -> Fleet:
+        """Validate a fleet section update."""
+        if not isinstance(fleet, Fleet):
+            raise TypeError(f"Expected a Fleet, got {type(fleet).__name__}")
+        return fleet
+
+    def with_values(
+        self,
+        changes: Dict[int, Any],
+        timestamp: Optional[datetime] = None,
+        fleets: Optional[Dict[str, Fleet]] = None,
+    ) -> "DashboardData":
+        """Return a new snapshot with already-validated field and fleet changes applied.
+
+        ``changes`` maps field index to value; ``fleets`` maps fleet section to its new :class:`Fleet`.
+        """
+        values = self.values
+        if changes:
+            values = list(values)
+            for index, value in changes.items():
+                values[index] = value
+            values = tuple(values)
+        return DashboardData(
+            values,
+            timestamp or datetime.now(),
+            self.version + 1,
+            {**self.fleets, **fleets} if fleets else self.fleets,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization. The result is cached and shared."""
+        result = self._dict
+        if result is None:
+            result = {}
+            for (_attr, section, key, _type, _default), value in zip(
+                FIELDS, self.values
+            ):
+                if section not in result:
+                    result[section] = (
+                        {"timestamp": self.timestamp.isoformat()}
+                        if section == "system"
+                        else {}
+                    )
+                result[section][key] = value
+            for kind, fleet in self.fleets.items():
+                result[kind] = fleet.to_dict()
+            self._dict = result
+        return result
+
+    def encoded(self) -> RawJSON:
+        """The :meth:`to_dict` payload plus its ``version``, encoded once per snapshot."""
+        result = self._encoded
+        if result is None:
+            result = self._encoded = RawJSON.encode(
+                {**self.to_dict(), "version": self.version}
+            )
+        return result
+
+    @property
+    def etag(self) -> str:
+        """Entity tag identifying this snapshot's encoded form."""
+        return f"{EPOCH}-{self.version}"
+
+
+def _field_property(index: int, doc: str):
+    return property(lambda self: self.values[index], doc=doc)
+
+
+for _index, (_attr, _section, _key, _type, _default) in enumerate(FIELDS):
+    setattr(
+        DashboardData, _attr, _field_property(_index, f"``{_section}.{_key}`` value.")
+    )
+
+
+class SnapshotStore:
+    """Holds the current :class:`DashboardData` snapshot and swaps in new ones atomically.
+
+    Writers are serialised with a lock so concurrent updates are never lost; each
+    builds a new snapshot from the current one and replaces the reference in a
+    single assignment. Readers just take :attr:`current` and get a consistent view
+    without locking.
+    """
+
+    def __init__(self, initial: Optional[DashboardData] = None):
+        self._current = initial or DashboardData()
+        self._write_lock = threading.Lock()
+
+    @property
+    def current(self) -> DashboardData:
+        """The latest snapshot."""
+        return self._current
+
+    def update(self, data: Dict[str, Any]) -> DashboardData:
+        """Apply a ``{section: {key: value}}`` update and return the new snapshot."""
+        with self._write_lock:
+            self._current = self._current.with_updates(data)
+            return self._current
+
+    def apply(
+        self, changes: Dict[int, Any], fleets: Optional[Dict[str, Fleet]] = None
+    ) -> DashboardData:
+        """Apply already-validated field and fleet changes and return the new snapshot."""
+        with self._write_lock:
+            self._current = self._current.with_values(changes, fleets=fleets)
+            return self._current
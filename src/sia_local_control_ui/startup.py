@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+log = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Times the phases of a cold start, from the first import of the package.
+
+    :meth:`phase` times a block and :meth:`mark` records a milestone, such as the first
+    tag read. Each is logged as it completes, with the time since start, so boot time
+    can be followed in the device logs; :meth:`to_dict` is served by ``/api/health``.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._events: List[
+            Tuple[str, float, float]
+        ] = []  # (name, seconds since start, duration)
+        self._lock = threading.Lock()
+
+    def mark(self, name: str, duration: float = 0.0):
+        elapsed = time.perf_counter() - self.started
+        with self._lock:
+            self._events.append((name, elapsed, duration))
+        if duration:
+            log.info(
+                f"Startup: {name} took {duration * 1000:.1f} ms, {elapsed * 1000:.1f} ms since start"
+            )
+        else:
+            log.info(f"Startup: {name} at {elapsed * 1000:.1f} ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.mark(name, time.perf_counter() - start)
+
+    def reached(self, name: str) -> bool:
+        with self._lock:
+            return any(event[0] == name for event in self._events)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Each phase and milestone with its end time since start and its duration, in milliseconds."""
+        with self._lock:
+            return {
+                name: {
+                    "at_ms": round(elapsed * 1000, 1),
+                    "duration_ms": round(duration * 1000, 1),
+                }
+                for name, elapsed, duration in self._events
+            }
+
+
+# started when the package is first imported
+STARTUP = StartupTimer()
@@ -11,20 +11,65 @@ class Dashboard {
         this.maxReconnectAttempts = 10;
         this.reconnectDelay = 2000;
         this.data = {};
+        this.version = null;
+        
+        // Wire format for data payloads: 'json', or 'binary' (opt in with ?wire=binary)
+        const params = new URLSearchParams(window.location.search);
+        this.wireFormat = params.get('wire') === 'binary' ? 'binary' : 'json';
+        this.wireSchema = null;
+        // Only receive some sections or units, e.g. ?sections=tank,pumps/pump-1 (default: everything)
+        this.topics = params.get('sections') ? params.get('sections').split(',').filter(Boolean) : [];
+        
+        // Active alarms by name
+        this.alarms = {};
+        
+        // Commands sent but not yet acknowledged, by id
+        this.pendingCommands = {};
+        this.commandSeq = 0;
+        this.commandLatencies = [];
+        // How long an acknowledged command's value is shown before the pump reports it
+        this.optimisticHoldMs = 5000;
+        
+        // Updates are applied to the model (this.data) as they arrive. The DOM is written
+        // at most once per animation frame, with the parts of the model changed since the
+        // last frame, and not at all while the page is hidden.
+        this.dirtySections = new Set();
+        this.dirtyUnits = new Set();
+        this.rebuildPending = false;
+        this.lastUpdatePending = false;
+        this.lastUpdateAt = null;
+        this.alarmsPending = false;
+        this.stalePending = false;
+        this.frameRequested = false;
+        // The value last written to each element's properties, so unchanged values aren't written again
+        this.written = new WeakMap();
+        
+        // Render stats since the last report to the server
+        this.renderStats = { frames: 0, updates: 0, writes: 0, renderMs: [] };
+        this.maxRenderSamples = 600;
+        this.renderReportInterval = 10000;
         
         this.initializeElements();
         this.initializeSocket();
         this.setupEventListeners();
+        
+        // Keep the age of stale sections ticking between updates
+        setInterval(() => {
+            this.stalePending = true;
+            this.scheduleRender();
+        }, 1000);
+        setInterval(() => this.reportRenderStats(), this.renderReportInterval);
     }
     
     initializeElements() {
         // Connection status
         this.connectionStatus = document.getElementById('connection-status');
         
-        // Pump controls
-        this.targetRate = document.getElementById('target-rate').querySelector('.value');
-        this.flowRate = document.getElementById('flow-rate').querySelector('.value');
-        this.pumpState = document.getElementById('pump-state').querySelector('.state-value');
+        // Pump controls: one row per pump, keyed by unit name
+        this.pumpUnits = document.getElementById('pump-units');
+        this.pumpRowTemplate = document.getElementById('pump-row-template');
+        this.pumpRows = {};
+        this.pumpRowsFromFleet = false;
         
         // Solar controls
         this.batteryVoltage = document.getElementById('battery-voltage').querySelector('.value');
@@ -44,6 +89,11 @@ class Dashboard {
         
         this.systemStatus = document.getElementById('system-status')?.querySelector('.status-value');
         
+        // Sections that can be marked stale
+        this.solarSection = document.querySelector('.solar-section');
+        this.tankSection = document.querySelector('.tank-section');
+        this.skidSection = document.querySelector('.skid-section');
+        
         // Footer
         this.lastUpdate = document.getElementById('last-update');
         
@@ -53,7 +103,8 @@ class Dashboard {
     
     initializeSocket() {
         try {
-            this.socket = io();
+            // ask for ack pacing: we acknowledge every update, and are sent more as we do
+            this.socket = io({ auth: { ack: true } });
             this.setupSocketEvents();
         } catch (error) {
             console.error('Failed to initialize socket:', error);
@@ -69,6 +120,13 @@ class Dashboard {
             this.reconnectAttempts = 0;
             this.updateConnectionStatus(true);
             this.hideLoadingOverlay();
+            this.socket.emit('request_alarms');
+            if (this.topics.length) {
+                this.socket.emit('subscribe', { topics: this.topics });
+            }
+            if (this.wireFormat === 'binary') {
+                this.negotiateFormat();
+            }
         });
         
         this.socket.on('disconnect', () => {
@@ -85,18 +143,54 @@ class Dashboard {
         });
         
         // Data events
-        this.socket.on('data_update', (data) => {
-            console.log('Received data update:', data);
+        // Broadcasts are acknowledged so the server can pace them to this client
+        this.socket.on('data_update', (data, ack) => {
+            data = this.decodePayload(data);
+            if (data === null) {
+                if (typeof ack === 'function') ack();
+                return;
+            }
             this.data = data;
-            this.updateDashboard(data);
+            this.version = data.version !== undefined ? data.version : null;
+            // A full update rebuilds the pump rows, in case the set of pumps changed
+            this.rebuildPending = true;
             this.updateLastUpdateTime();
+            if (typeof ack === 'function') ack();
+        });
+        
+        this.socket.on('data_patch', (message, ack) => {
+            message = this.decodePayload(message);
+            if (message !== null) {
+                this.applyPatch(message);
+            }
+            if (typeof ack === 'function') ack();
         });
         
         this.socket.on('heartbeat', (data) => {
-            console.log('Received heartbeat:', data);
             this.updateLastUpdateTime(data.timestamp);
         });
         
+        this.socket.on('alarms', (reply) => {
+            this.alarms = {};
+            (reply.active || []).forEach(alarm => { this.alarms[alarm.name] = alarm; });
+            this.alarmsPending = true;
+            this.scheduleRender();
+        });
+        
+        this.socket.on('alarm', (alarm) => {
+            if (alarm.active) {
+                this.alarms[alarm.name] = alarm;
+            } else {
+                delete this.alarms[alarm.name];
+            }
+            this.alarmsPending = true;
+            this.scheduleRender();
+        });
+        
+        this.socket.on('command_ack', (ack) => {
+            this.handleCommandAck(ack);
+        });
+        
         this.socket.on('error', (error) => {
             console.error('Socket error:', error);
             this.showError(error.message || 'Unknown error occurred');
@@ -113,28 +207,207 @@ class Dashboard {
             });
         });
         
+        // Rendering stops while the page is hidden; catch up on what changed meanwhile
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) {
+                this.scheduleRender();
+            }
+        });
+        
         // Request initial data
         setTimeout(() => {
-            if (this.isConnected) {
-                this.socket.emit('request_data');
-            }
+            this.requestData();
         }, 1000);
     }
     
+    negotiateFormat() {
+        // Ask for binary payloads; the reply carries the schema to decode them with
+        this.socket.emit('set_format', { format: this.wireFormat }, (reply) => {
+            if (reply && reply.schema) {
+                this.wireSchema = reply.schema;
+                this.requestData();
+            } else {
+                console.error('Binary wire format refused:', reply);
+                this.wireFormat = 'json';
+            }
+        });
+    }
+    
+    decodePayload(payload) {
+        // Binary payloads are decoded to the same shape as JSON ones. A payload
+        // needing a newer schema is dropped: fetch the schema, then catch up.
+        if (!(payload instanceof ArrayBuffer)) {
+            return payload;
+        }
+        const decoded = this.wireSchema ? decodeWire(payload, this.wireSchema) : null;
+        if (decoded === null) {
+            this.negotiateFormat();
+        }
+        return decoded;
+    }
+    
+    applyPatch(message) {
+        // Already have this version or newer, e.g. after a resync
+        if (this.version !== null && message.version <= this.version) {
+            return;
+        }
+        
+        // A patch applies on top of the version it was computed from, or any later one:
+        // when subscribed to some sections, versions that didn't change them are skipped.
+        // On a gap, ask the server to catch us up from the last version we applied.
+        if (this.version === null || message.base > this.version) {
+            console.log(`Version gap (have ${this.version}, patch base ${message.base}), resyncing`);
+            this.requestData();
+            return;
+        }
+        
+        this.mergePatch(this.data, message.patch);
+        this.data.version = message.version;
+        this.version = message.version;
+        Object.keys(message.patch).forEach(section => {
+            this.dirtySections.add(section);
+            if (section === 'pumps' && message.patch.pumps && message.patch.pumps.units) {
+                Object.keys(message.patch.pumps.units).forEach(name => this.dirtyUnits.add(name));
+            }
+        });
+        this.updateLastUpdateTime();
+    }
+    
+    mergePatch(target, patch) {
+        Object.entries(patch).forEach(([key, value]) => {
+            if (value !== null && typeof value === 'object' && !Array.isArray(value)
+                    && target[key] !== null && typeof target[key] === 'object') {
+                this.mergePatch(target[key], value);
+            } else {
+                target[key] = value;
+            }
+        });
+        return target;
+    }
+    
     updateConnectionStatus(connected) {
+        const text = this.connectionStatus.querySelector('.status-text');
         if (connected) {
-            this.connectionStatus.innerHTML = '<i class="fas fa-circle"></i> Connected';
+            text.textContent = 'Connected';
             this.connectionStatus.className = 'status-connected';
         } else {
-            this.connectionStatus.innerHTML = '<i class="fas fa-circle"></i> Disconnected';
+            text.textContent = 'Disconnected';
             this.connectionStatus.className = 'status-disconnected';
         }
     }
     
+    scheduleRender() {
+        if (!this.frameRequested && !document.hidden) {
+            this.frameRequested = true;
+            requestAnimationFrame(() => this.render());
+        }
+    }
+    
+    render() {
+        // Write everything that changed since the last frame, in one go
+        this.frameRequested = false;
+        if (document.hidden) {
+            return;
+        }
+        const start = performance.now();
+        
+        const changes = this.takeChanges();
+        if (changes !== null) {
+            this.updateDashboard(changes);
+        } else if (this.stalePending) {
+            this.renderStale();
+        }
+        this.stalePending = false;
+        if (this.alarmsPending) {
+            this.alarmsPending = false;
+            this.renderAlarms();
+        }
+        if (this.lastUpdatePending) {
+            this.lastUpdatePending = false;
+            const time = this.lastUpdateAt ? new Date(this.lastUpdateAt) : new Date();
+            this.write(this.lastUpdate, 'textContent', time.toLocaleTimeString());
+        }
+        
+        this.renderStats.frames++;
+        if (this.renderStats.renderMs.length < this.maxRenderSamples) {
+            this.renderStats.renderMs.push(performance.now() - start);
+        }
+    }
+    
+    takeChanges() {
+        // The parts of the model changed since the last frame, shaped like a patch, or null
+        let changes = null;
+        if (this.rebuildPending) {
+            this.rebuildPending = false;
+            this.clearPumpRows();
+            this.pumpRowsFromFleet = false;
+            changes = this.data;
+        } else if (this.dirtySections.size) {
+            changes = {};
+            this.dirtySections.forEach(section => {
+                if (section !== 'pumps') {
+                    changes[section] = this.data[section];
+                }
+            });
+            const units = (this.data.pumps && this.data.pumps.units) || {};
+            const changedUnits = {};
+            this.dirtyUnits.forEach(name => {
+                if (units[name]) changedUnits[name] = units[name];
+            });
+            if (Object.keys(changedUnits).length) {
+                changes.pumps = { units: changedUnits };
+            }
+        }
+        this.dirtySections.clear();
+        this.dirtyUnits.clear();
+        return changes;
+    }
+    
+    write(element, property, value) {
+        // Set a property of an element, unless it already shows this value; returns whether it was written
+        let written = this.written.get(element);
+        if (!written) {
+            written = {};
+            this.written.set(element, written);
+        }
+        if (written[property] === value) {
+            return false;
+        }
+        written[property] = value;
+        if (property === 'width') {
+            element.style.width = value;
+        } else {
+            element[property] = value;
+        }
+        this.renderStats.writes++;
+        return true;
+    }
+    
+    reportRenderStats() {
+        // Send render times to the server, which adds them to its metrics
+        const stats = this.renderStats;
+        if (!this.isConnected || (!stats.frames && !stats.updates)) {
+            return;
+        }
+        this.socket.emit('render_stats', { frames: stats.frames, updates: stats.updates, writes: stats.writes,
+                                           render_ms: stats.renderMs });
+        this.renderStats = { frames: 0, updates: 0, writes: 0, renderMs: [] };
+    }
+    
     updateDashboard(data) {
-        // Update pump data
-        if (data.pump) {
-            this.updatePumpData(data.pump);
+        // Update pump data. Rows come from the pump fleet when pump controllers are
+        // configured, otherwise from the pump and pump 2 sections
+        if (this.data.pumps && this.data.pumps.count > 0) {
+            if (data.pumps && data.pumps.units) {
+                this.updatePumpFleet(data.pumps.units);
+            }
+        } else {
+            if (data.pump) {
+                this.updatePumpData('pump', 'Pump 1', data.pump);
+            }
+            if (data.pump2) {
+                this.updatePumpData('pump2', 'Pump 2', data.pump2);
+            }
         }
         
         // Update solar data
@@ -156,22 +429,186 @@ class Dashboard {
         if (data.system) {
             this.updateSystemData(data.system);
         }
+        
+        this.renderStale();
+    }
+    
+    renderStale() {
+        // A section whose source stopped reading keeps its last good values, marked with their age
+        const now = Date.now() / 1000;
+        const pumpKeys = this.pumpRowsFromFleet ? Object.keys(this.data.pumps.units) : ['pump', 'pump2'];
+        const sections = {
+            pump: this.pumpRows[pumpKeys[0]]?.element,
+            pump2: this.pumpRows[pumpKeys[1]]?.element,
+            solar: this.solarSection,
+            tank: this.tankSection,
+            skid: this.skidSection
+        };
+        Object.entries(sections).forEach(([section, element]) => {
+            if (!element) {
+                return;
+            }
+            const since = this.data[section] ? this.data[section].stale_since : null;
+            const stale = since !== null && since !== undefined;
+            let badge = element.querySelector('.stale-badge');
+            if (element.classList.contains('stale') !== stale) {
+                element.classList.toggle('stale', stale);
+                this.renderStats.writes++;
+            }
+            if (!stale) {
+                if (badge) badge.remove();
+                return;
+            }
+            if (!badge) {
+                badge = document.createElement('span');
+                badge.className = 'stale-badge';
+                element.querySelector('h2, h3').appendChild(badge);
+            }
+            this.write(badge, 'textContent', since ? `Stale ${this.formatAge(now - since)}` : 'No data');
+        });
+    }
+    
+    renderAlarms() {
+        const banner = document.getElementById('alarm-banner');
+        if (!banner) {
+            return;
+        }
+        const alarms = Object.values(this.alarms);
+        banner.hidden = alarms.length === 0;
+        banner.replaceChildren(...alarms.map(alarm => {
+            const row = document.createElement('div');
+            row.className = `alarm ${alarm.severity}`;
+            row.textContent = `${alarm.name}: ${alarm.message}`;
+            return row;
+        }));
+    }
+    
+    formatAge(seconds) {
+        seconds = Math.max(0, seconds);
+        if (seconds < 60) return `${Math.round(seconds)} s`;
+        if (seconds < 3600) return `${Math.floor(seconds / 60)} min`;
+        return `${Math.floor(seconds / 3600)} h`;
+    }
+    
+    updatePumpFleet(units) {
+        if (!this.pumpRowsFromFleet) {
+            this.clearPumpRows();
+            this.pumpRowsFromFleet = true;
+        }
+        
+        const names = Object.keys(this.data.pumps.units);
+        Object.entries(units).forEach(([name, unit]) => {
+            this.updatePumpData(name, `Pump ${names.indexOf(name) + 1}`, unit);
+        });
+    }
+    
+    clearPumpRows() {
+        this.pumpUnits.innerHTML = '';
+        this.pumpRows = {};
+    }
+    
+    getPumpRow(key, label) {
+        let row = this.pumpRows[key];
+        if (!row) {
+            const element = this.pumpRowTemplate.content.firstElementChild.cloneNode(true);
+            element.querySelector('.pump-label').textContent = label;
+            this.pumpUnits.appendChild(element);
+            row = {
+                element: element,
+                targetRate: element.querySelector('.pump-target-rate'),
+                flowRate: element.querySelector('.pump-flow-rate'),
+                pumpState: element.querySelector('.pump-state'),
+                optimistic: null
+            };
+            element.querySelectorAll('.state-btn[data-state]').forEach(button => {
+                button.addEventListener('click', () => {
+                    this.sendPumpCommand(key, 'pump_state', button.getAttribute('data-state'));
+                });
+            });
+            this.pumpRows[key] = row;
+        }
+        return row;
     }
     
-    updatePumpData(pumpData) {
+    updatePumpData(key, label, pumpData) {
+        const row = this.getPumpRow(key, label);
+        
         // Update target rate
-        if (pumpData.target_rate !== undefined) {
-            this.animateValueChange(this.targetRate, pumpData.target_rate.toFixed(1));
+        if (typeof pumpData.target_rate === 'number') {
+            this.animateValueChange(row.targetRate, pumpData.target_rate.toFixed(1));
         }
         
         // Update flow rate
-        if (pumpData.flow_rate !== undefined) {
-            this.animateValueChange(this.flowRate, pumpData.flow_rate.toFixed(1));
+        if (typeof pumpData.flow_rate === 'number') {
+            this.animateValueChange(row.flowRate, pumpData.flow_rate.toFixed(1));
+        }
+        
+        // Update pump state, unless a command for it is still settling
+        if (pumpData.pump_state) {
+            const optimistic = row.optimistic;
+            if (optimistic && optimistic.value !== pumpData.pump_state
+                    && (optimistic.until === null || performance.now() < optimistic.until)) {
+                return;
+            }
+            if (row.optimistic) {
+                row.optimistic = null;
+                row.pumpState.classList.remove('pending');
+            }
+            this.updatePumpState(row.pumpState, pumpData.pump_state);
+        }
+    }
+    
+    sendPumpCommand(pump, field, value) {
+        if (!this.isConnected) {
+            this.showError('Not connected to server');
+            return;
+        }
+        
+        const id = `${Date.now()}-${++this.commandSeq}`;
+        const row = this.pumpRows[pump];
+        this.pendingCommands[id] = { sent: performance.now(), pump: pump, field: field,
+                                     previous: row ? row.pumpState.textContent : null };
+        
+        // Show the new state straight away; it is confirmed or reverted by the ack
+        if (row && field === 'pump_state') {
+            row.optimistic = { value: value, until: null };
+            this.updatePumpState(row.pumpState, value);
+            row.pumpState.classList.add('pending');
+        }
+        this.socket.emit('send_command', { id: id, pump: pump, field: field, value: value });
+    }
+    
+    handleCommandAck(ack) {
+        const command = this.pendingCommands[ack.id];
+        if (!command) {
+            return;
         }
+        delete this.pendingCommands[ack.id];
         
-        // Update pump state
-        if (pumpData.pump_state !== undefined) {
-            this.updatePumpState(pumpData.pump_state);
+        const roundTrip = performance.now() - command.sent;
+        this.commandLatencies.push(roundTrip);
+        if (this.commandLatencies.length > 50) {
+            this.commandLatencies.shift();
+        }
+        console.log(`Command ${ack.field}=${ack.value} for ${ack.pump}: ${ack.status} in ${roundTrip.toFixed(1)} ms`
+                    + (ack.total_ms !== undefined ? ` (server ${ack.total_ms} ms)` : ''));
+        
+        const row = this.pumpRows[command.pump];
+        if (ack.status === 'superseded' || !row || command.field !== 'pump_state') {
+            return;
+        }
+        if (ack.status === 'ok' || ack.status === 'local') {
+            // Keep showing the commanded state until the pump reports it, for a while
+            if (row.optimistic && row.optimistic.value === ack.value) {
+                row.optimistic.until = performance.now() + this.optimisticHoldMs;
+            }
+        } else {
+            row.optimistic = null;
+            row.pumpState.classList.remove('pending');
+            if (command.previous) {
+                this.updatePumpState(row.pumpState, command.previous);
+            }
+            this.showError(`Command failed: ${ack.error || ack.status}`);
         }
     }
     
@@ -232,12 +669,15 @@ class Dashboard {
         }
     }
     
-    updatePumpState(state) {
-        this.pumpState.textContent = state;
-        this.pumpState.className = `state-value ${state}`;
+    updatePumpState(element, state) {
+        if (!this.write(element, 'textContent', state)) {
+            return;
+        }
+        element.className = `state-value pump-state ${state}`;
         
-        // Update active button
-        const buttons = document.querySelectorAll('.state-btn');
+        // Update the active button in this pump's row
+        const row = element.closest('.pump-row') || document;
+        const buttons = row.querySelectorAll('.state-btn');
         buttons.forEach(btn => {
             btn.classList.remove('active');
             if (btn.getAttribute('data-state') === state) {
@@ -247,28 +687,23 @@ class Dashboard {
     }
     
     updateProgressBar(progressBar, percentage) {
-        progressBar.style.width = `${Math.max(0, Math.min(100, percentage))}%`;
+        this.write(progressBar, 'width', `${Math.max(0, Math.min(100, percentage))}%`);
         
         // Update color based on percentage
-        progressBar.className = 'progress-fill';
-        if (percentage < 25) {
-            progressBar.classList.add('low');
-        } else if (percentage < 75) {
-            progressBar.classList.add('medium');
-        }
+        const level = percentage < 25 ? ' low' : percentage < 75 ? ' medium' : '';
+        this.write(progressBar, 'className', `progress-fill${level}`);
     }
     
     updateSystemStatus(status) {
         if (this.systemStatus) {
-            this.systemStatus.textContent = status;
-            this.systemStatus.className = `status-value ${status}`;
+            this.write(this.systemStatus, 'textContent', status);
+            this.write(this.systemStatus, 'className', `status-value ${status}`);
         }
     }
     
     animateValueChange(element, newValue) {
-        if (element.textContent !== newValue) {
+        if (this.write(element, 'textContent', newValue)) {
             element.classList.add('updating');
-            element.textContent = newValue;
             setTimeout(() => {
                 element.classList.remove('updating');
             }, 1000);
@@ -276,17 +711,16 @@ class Dashboard {
     }
     
     updateLastUpdateTime(timestamp) {
-        const time = timestamp ? new Date(timestamp) : new Date();
-        this.lastUpdate.textContent = time.toLocaleTimeString();
+        // Data and heartbeats arriving; shown on the next frame
+        this.renderStats.updates++;
+        this.lastUpdateAt = timestamp || null;
+        this.lastUpdatePending = true;
+        this.scheduleRender();
     }
     
     changePumpState(state) {
-        if (this.isConnected) {
-            this.socket.emit('set_pump_state', { state: state });
-            console.log(`Requesting pump state change to: ${state}`);
-        } else {
-            this.showError('Not connected to server');
-        }
+        // The first pump's state
+        this.sendPumpCommand(Object.keys(this.pumpRows)[0] || 'pump', 'pump_state', state);
     }
     
     attemptReconnect() {
@@ -349,7 +783,7 @@ class Dashboard {
     // Public API methods
     requestData() {
         if (this.isConnected) {
-            this.socket.emit('request_data');
+            this.socket.emit('request_data', this.version !== null ? { since: this.version } : {});
         }
     }
     
@@ -0,0 +1,76 @@
+// Decoder for the dashboard's binary wire format (see wire.py).
+//
+// A message is a list of (field id, value) pairs; the schema, sent by the server in
+// reply to `set_format`, maps each field id to its path in the JSON payload, so the
+// decoded message has the same shape as the JSON one. Timestamps are sent as epoch
+// milliseconds and decoded to ISO strings.
+(function (global) {
+    'use strict';
+
+    const WIRE_VERSION = 1;
+    const NULL = 0, FLOAT32 = 1, FLOAT64 = 2, STRING = 3, TRUE = 4, FALSE = 5, TIME = 6, JSON_TEXT = 7, EMPTY = 8;
+    const textDecoder = new TextDecoder();
+
+    // Decode a message with `schema` (an array of paths); returns null if the schema
+    // is too old for it, in which case fetch the schema again.
+    global.decodeWire = function (buffer, schema) {
+        const view = new DataView(buffer);
+        const bytes = new Uint8Array(buffer);
+        if (view.getUint8(0) !== WIRE_VERSION || view.getUint32(1, true) > schema.length) {
+            return null;
+        }
+        const count = view.getUint16(5, true);
+        const result = {};
+        let offset = 7;
+        for (let i = 0; i < count; i++) {
+            const id = view.getUint16(offset, true);
+            const type = view.getUint8(offset + 2);
+            offset += 3;
+            let value;
+            switch (type) {
+                case FLOAT32:
+                    value = view.getFloat32(offset, true);
+                    offset += 4;
+                    break;
+                case FLOAT64:
+                    value = view.getFloat64(offset, true);
+                    offset += 8;
+                    break;
+                case TIME:
+                    value = new Date(view.getFloat64(offset, true)).toISOString();
+                    offset += 8;
+                    break;
+                case STRING: {
+                    const length = view.getUint16(offset, true);
+                    value = textDecoder.decode(bytes.subarray(offset + 2, offset + 2 + length));
+                    offset += 2 + length;
+                    break;
+                }
+                case JSON_TEXT: {
+                    const length = view.getUint32(offset, true);
+                    value = JSON.parse(textDecoder.decode(bytes.subarray(offset + 4, offset + 4 + length)));
+                    offset += 4 + length;
+                    break;
+                }
+                case TRUE:
+                    value = true;
+                    break;
+                case FALSE:
+                    value = false;
+                    break;
+                case EMPTY:
+                    value = {};
+                    break;
+                default:
+                    value = null;
+            }
+            const path = schema[id];
+            let target = result;
+            for (let j = 0; j < path.length - 1; j++) {
+                target = target[path[j]] = target[path[j]] || {};
+            }
+            target[path[path.length - 1]] = value;
+        }
+        return result;
+    };
+})(typeof window !== 'undefined' ? window : globalThis);
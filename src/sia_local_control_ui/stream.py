@@ -0,0 +1,280 @@
+import asyncio
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from .delta import select_topics
+from .encoding import RawJSON
+from .fleet import FLEETS
+from .snapshot import FIELD_INDEX
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+# frames must reach the consumer as they are written, not when a proxy's buffer fills
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# sent after this many seconds without a frame, so consumers and proxies know the stream is alive
+KEEPALIVE_INTERVAL = 15.0
+MAX_INTERVAL = 3600.0
+
+# (topic, key): a section or fleet unit topic, and optionally one field of a section
+Field = Tuple[str, Optional[str]]
+
+
+def parse_fields(value: Optional[str]) -> Optional[Tuple[Field, ...]]:
+    """Parse a ``fields`` filter such as ``tank,pump.flow_rate,pumps/pump-1``; None selects everything.
+
+    Each field is a section, one field of a section (``section.key``), or one unit of
+    a fleet (``fleet/unit``).
+    """
+    if not value:
+        return None
+    fields = []
+    for field in value.split(","):
+        field = field.strip()
+        if not field:
+            continue
+        topic, _, key = field.partition(".")
+        section, _, unit = topic.partition("/")
+        if unit:
+            known = section in FLEETS and not key
+        elif key:
+            known = key in FIELD_INDEX.get(section, ())
+        else:
+            known = section in FIELD_INDEX or section in FLEETS
+        if not known:
+            raise ValueError(f"Unknown field: {field}")
+        fields.append((topic, key or None))
+    return tuple(fields) or None
+
+
+def select_fields(data: Dict[str, Any], fields: Tuple[Field, ...]) -> Dict[str, Any]:
+    """The parts of a payload selected by :func:`parse_fields`. The result shares its values with ``data``."""
+    topics = tuple(topic for topic, key in fields if key is None)
+    result = select_topics(data, topics)
+    for topic, key in fields:
+        if key is None or topic in topics:
+            continue
+        section = data.get(topic)
+        if section is not None and key in section:
+            result.setdefault(topic, {})[key] = section[key]
+    return result
+
+
+class DataStream:
+    """One consumer's stream of published data, as served by ``GET /api/stream``.
+
+    Each frame is the latest published data, or only the selected ``fields``, with its
+    ``version``. A frame is sent for every version that changes the selected data, but
+    at most once per ``interval`` seconds: a consumer asking for fewer frames gets the
+    newest values at that rate rather than falling behind.
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Tuple[Field, ...]] = None,
+        interval: float = 0.0,
+        fmt: str = "ndjson",
+    ):
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(
+                f"Unknown stream format: {fmt!r}, expected one of {tuple(STREAM_FORMATS)}"
+            )
+        self.fields = fields
+        self.interval = interval
+        self.format = fmt
+        self.version = -1  # newest version looked at
+        self.sent_at: Optional[float] = None
+        self.frames = 0
+        self.started = time.monotonic()
+        self._last: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_args(
+        cls, args: Mapping[str, str], accept: Optional[str] = None
+    ) -> "DataStream":
+        """A stream for the query parameters ``fields``, ``interval`` (seconds) and ``format``.
+
+        The format defaults to ``sse`` for clients accepting ``text/event-stream``, else
+        ``ndjson``. Raises ValueError for invalid parameters.
+        """
+        default = "sse" if accept and STREAM_FORMATS["sse"] in accept else "ndjson"
+        try:
+            interval = float(args.get("interval", 0))
+        except ValueError:
+            raise ValueError(f"Invalid interval: {args.get('interval')}")
+        if not 0 <= interval <= MAX_INTERVAL:
+            raise ValueError(f"Interval must be between 0 and {MAX_INTERVAL:g} seconds")
+        return cls(
+            parse_fields(args.get("fields")), interval, args.get("format", default)
+        )
+
+    @property
+    def content_type(self) -> str:
+        return STREAM_FORMATS[self.format]
+
+    def frame(self, snapshot) -> Optional[bytes]:
+        """The frame for a published snapshot, or None if it has nothing new for this consumer."""
+        if snapshot.version <= self.version:
+            return None
+        self.version = snapshot.version
+        if self.fields is None:
+            data = snapshot.encoded().data
+        else:
+            selected = select_fields(snapshot.to_dict(), self.fields)
+            if selected == self._last:
+                return None
+            self._last = selected
+            data = RawJSON.encode({**selected, "version": snapshot.version}).data
+        self.sent_at = time.monotonic()
+        self.frames += 1
+        if self.format == "sse":
+            return b"id: %d\nevent: data\ndata: %s\n\n" % (snapshot.version, data)
+        return data + b"\n"
+
+    def keepalive(self) -> bytes:
+        return b": keepalive\n\n" if self.format == "sse" else b"\n"
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """Seconds until the next frame may be sent."""
+        if not self.interval or self.sent_at is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(self.sent_at + self.interval - now, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "fields": [topic + ("." + key if key else "") for topic, key in self.fields]
+            if self.fields
+            else None,
+            "interval": self.interval,
+            "version": self.version,
+            "frames": self.frames,
+            "seconds": round(time.monotonic() - self.started, 3),
+        }
+
+
+class StreamHub:
+    """Feeds :class:`DataStream` consumers each version as it is published.
+
+    ``latest()`` returns the most recently published snapshot. The publisher calls
+    :meth:`published` after each broadcast, from any thread; consumers are served
+    by :meth:`frames` in a thread per connection, or by :meth:`aframes` on an event
+    loop. :meth:`close` ends every stream, e.g. when the dashboard stops.
+    """
+
+    def __init__(self, latest: Callable[[], Any]):
+        self._latest = latest
+        self.version: Optional[int] = None
+        self.closed = False
+        self.streams: List[DataStream] = []
+        self._condition = threading.Condition()
+        self._futures: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def __len__(self):
+        return len(self.streams)
+
+    def published(self, version: int):
+        """Wake the streams for a newly published version."""
+        with self._condition:
+            self.version = version
+            self._wake()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._wake()
+
+    def _wake(self):
+        self._condition.notify_all()
+        futures, self._futures = self._futures, []
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # the loop has closed
+
+    def _ready(self, after: Optional[int]) -> bool:
+        return (
+            self.closed
+            or after is not None
+            and self.version is not None
+            and self.version > after
+        )
+
+    def wait(self, after: Optional[int], timeout: float) -> bool:
+        """Wait for a version newer than ``after`` (with None, only for :meth:`close`); False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._ready(after), timeout)
+
+    async def wait_async(self, after: Optional[int], timeout: float) -> bool:
+        """:meth:`wait`, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._condition:
+                if self._ready(after):
+                    return True
+                waiter = (loop, loop.create_future())
+                self._futures.append(waiter)
+            remaining = deadline - loop.time()
+            if remaining > 0:
+                await asyncio.wait((waiter[1],), timeout=remaining)
+            if not waiter[1].done():
+                with self._condition:
+                    if waiter in self._futures:
+                        self._futures.remove(waiter)
+                    return self._ready(after)
+
+    def frames(self, stream: DataStream) -> Iterator[bytes]:
+        """A stream's frames, blocking between versions."""
+        self.streams.append(stream)
+        try:
+            while True:
+                frame = stream.frame(self._latest())
+                if frame is not None:
+                    yield frame
+                if not self.wait(stream.version, KEEPALIVE_INTERVAL):
+                    yield stream.keepalive()
+                    continue
+                delay = stream.delay()
+                if self.closed or delay and self.wait(None, delay):
+                    return
+        finally:
+            self.streams.remove(stream)
+
+    async def aframes(self, stream: DataStream) -> AsyncIterator[bytes]:
+        """:meth:`frames`, for an event loop."""
+        self.streams.append(stream)
+        try:
+            while True:
+                frame = stream.frame(self._latest())
+                if frame is not None:
+                    yield frame
+                if not await self.wait_async(stream.version, KEEPALIVE_INTERVAL):
+                    yield stream.keepalive()
+                    continue
+                delay = stream.delay()
+                if self.closed or delay and await self.wait_async(None, delay):
+                    return
+        finally:
+            self.streams.remove(stream)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [stream.stats() for stream in list(self.streams)]
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,133 @@
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from .encoding import is_nan
+
+# tag qualities
+GOOD = "good"  # the last read succeeded, or the last good value is younger than its TTL
+STALE = "stale"  # reads have been failing for longer than the TTL; the last good value is still held
+MISSING = "missing"  # reads have been tried, but none has succeeded yet
+
+Pair = Tuple[str, str]
+
+
+def _same(old: Any, new: Any) -> bool:
+    return old == new or (
+        is_nan(old) and is_nan(new)
+    )  # NaN readings count as unchanged
+
+
+class CachedTag:
+    """The last good value of one tag, when it was read, and whether reads are failing."""
+
+    __slots__ = ("value", "updated", "read_at", "failing")
+
+    def __init__(self):
+        self.value: Any = None
+        self.updated: Optional[float] = None
+        self.read_at: Optional[float] = None  # wall clock time of the last good read
+        self.failing = False
+
+
+class TagCache:
+    """Last good value, timestamp and quality of every tag read.
+
+    A read that fails (returns ``None``) keeps the last good value. If reads keep
+    failing for longer than the tag's TTL the value is marked :data:`STALE`, and the
+    dashboard shows its section as stale with its age, rather than dropping it or
+    making something up. :attr:`values` holds the value to show for every tag.
+
+    Times are :attr:`clock` seconds, ``time.monotonic()`` unless replaying a recording;
+    :meth:`stale_since` converts to wall time.
+    """
+
+    def __init__(
+        self, ttls: Optional[Dict[Pair, float]] = None, default_ttl: float = 30.0
+    ):
+        self.ttls: Dict[Pair, float] = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.clock: Callable[[], float] = time.monotonic
+        self.tags: Dict[Pair, CachedTag] = {}
+        self.values: Dict[Pair, Any] = {}
+        self._stale: Set[Pair] = set()
+
+    def set_ttl(self, pairs: Iterable[Pair], ttl: float):
+        for pair in pairs:
+            self.ttls[pair] = ttl
+
+    def update(self, values: Dict[Pair, Any], now: Optional[float] = None) -> Set[Pair]:
+        """Record a batch of reads; returns the tags whose value to show changed."""
+        now = self.clock() if now is None else now
+        wall = time.time()
+        changed = set()
+        for pair, value in values.items():
+            tag = self.tags.get(pair)
+            if tag is None:
+                tag = self.tags[pair] = CachedTag()
+                self.values[pair] = None
+            if value is None:
+                tag.failing = True
+                continue
+            tag.failing = False
+            tag.updated = now
+            tag.read_at = wall
+            if tag.value is None or not _same(tag.value, value):
+                tag.value = value
+                self.values[pair] = value
+                changed.add(pair)
+        return changed
+
+    def quality(self, pair: Pair, now: Optional[float] = None) -> str:
+        tag = self.tags.get(pair)
+        if tag is None or tag.updated is None:
+            return MISSING
+        now = self.clock() if now is None else now
+        if tag.failing and now - tag.updated > self.ttls.get(pair, self.default_ttl):
+            return STALE
+        return GOOD
+
+    def age(self, pair: Pair, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since the tag was last read successfully, or None if it never was."""
+        tag = self.tags.get(pair)
+        if tag is None or tag.updated is None:
+            return None
+        return (self.clock() if now is None else now) - tag.updated
+
+    def expire(self, now: Optional[float] = None) -> bool:
+        """Re-check every tag's quality; returns whether any tag became stale, missing or recovered."""
+        now = self.clock() if now is None else now
+        stale = {
+            pair
+            for pair, tag in self.tags.items()
+            if (tag.failing or tag.updated is None) and self.quality(pair, now) != GOOD
+        }
+        changed = stale != self._stale
+        self._stale = stale
+        return changed
+
+    def stale_since(
+        self, pairs: Iterable[Pair], now: Optional[float] = None
+    ) -> Optional[float]:
+        """When the oldest good value among the stale ``pairs`` was read, in epoch seconds.
+
+        None if none of them are stale, and 0 if any has never been read successfully.
+        """
+        now = self.clock() if now is None else now
+        since = None
+        for pair in pairs:
+            quality = self.quality(pair, now)
+            if quality == MISSING and pair in self.tags:
+                return 0.0
+            if quality == STALE:
+                read_at = self.tags[pair].read_at
+                since = read_at if since is None else min(since, read_at)
+        # the same for as long as the tags stay stale, so it doesn't count as a change
+        return round(since, 1) if since is not None else None
+
+    def stats(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Number of tags of each quality."""
+        now = self.clock() if now is None else now
+        counts = {GOOD: 0, STALE: 0, MISSING: 0}
+        for pair in self.tags:
+            counts[self.quality(pair, now)] += 1
+        return counts
@@ -0,0 +1,220 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from .polling import PollSource
+
+log = logging.getLogger(__name__)
+
+# dashboard metric -> tag read from each controller app
+PUMP_TAGS = {
+    "target_rate": "TargetRate",
+    "flow_rate": "FlowRate",
+    "pump_state": "StateString",
+}
+SOLAR_TAGS = {
+    "battery_voltage": "b_voltage",
+    "battery_percentage": "b_percent",
+    "panel_power": "panel_power",
+    "battery_ah": "remaining_ah",
+}
+TANK_TAGS = ("tank_level_mm", "tank_level_percent")
+
+# command field -> tag written on a pump controller app to change it, unless configured otherwise
+PUMP_COMMAND_TAGS = {"pump_state": "StateCommand", "target_rate": "TargetRateCommand"}
+
+
+def _app_key(element) -> Optional[str]:
+    """Get the app key of a config Application element, or None if it isn't set."""
+    try:
+        return element.value
+    except ValueError:
+        return None
+
+
+class TagReadPlan:
+    """Every (app key, tag) pair the dashboard reads each tick.
+
+    The plan is worked out once from the application config, so the main loop
+    doesn't walk the config arrays on every tick.
+    """
+
+    def __init__(
+        self,
+        pump_apps: List[str],
+        solar_apps: List[str],
+        tank_app: Optional[str] = None,
+        flow_sensor_app: Optional[str] = None,
+        pressure_sensor_app: Optional[str] = None,
+    ):
+        self.pump_apps = list(pump_apps)
+        self.solar_apps = list(solar_apps)
+        self.tank_app = tank_app
+        self.flow_sensor_app = flow_sensor_app
+        self.pressure_sensor_app = pressure_sensor_app
+
+        # reads grouped by data source, so each source can be polled at its own rate
+        pump_reads = [
+            (app, tag) for app in self.pump_apps for tag in PUMP_TAGS.values()
+        ]
+        if flow_sensor_app:
+            pump_reads.append((flow_sensor_app, "flow_rate"))
+        if pressure_sensor_app:
+            pump_reads.append((pressure_sensor_app, "pressure"))
+        self.source_reads: Dict[str, Tuple[Tuple[str, str], ...]] = {
+            "pumps": tuple(pump_reads),
+            "solar": tuple(
+                (app, tag) for app in self.solar_apps for tag in SOLAR_TAGS.values()
+            ),
+            "tank": tuple((tank_app, tag) for tag in TANK_TAGS) if tank_app else (),
+        }
+        self.reads: Tuple[Tuple[str, str], ...] = sum(self.source_reads.values(), ())
+
+        # reads behind each dashboard section, so a failing source only marks its own sections stale
+        pump_panels = [
+            tuple((app, tag) for tag in PUMP_TAGS.values())
+            for app in self.pump_apps[:2]
+        ]
+        self.section_reads: Dict[str, Tuple[Tuple[str, str], ...]] = {
+            "pump": pump_panels[0] if pump_panels else (),
+            "pump2": pump_panels[1] if len(pump_panels) > 1 else (),
+            "solar": self.source_reads["solar"],
+            "tank": self.source_reads["tank"],
+            "skid": tuple(
+                pair
+                for pair in pump_reads
+                if pair[0] in (flow_sensor_app, pressure_sensor_app)
+            ),
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "TagReadPlan":
+        """Build the plan from a loaded ``SiaLocalControlUiConfig``."""
+        return cls(
+            pump_apps=[
+                key for key in map(_app_key, config.pump_controllers.elements) if key
+            ],
+            solar_apps=[
+                key for key in map(_app_key, config.solar_controllers.elements) if key
+            ],
+            tank_app=_app_key(config.tank_level_app),
+            flow_sensor_app=_app_key(config.flow_sensor_app),
+            pressure_sensor_app=_app_key(config.pressure_sensor_app),
+        )
+
+    def __len__(self):
+        return len(self.reads)
+
+    def poll_sources(
+        self, intervals: Dict[str, float], max_interval: float
+    ) -> List[PollSource]:
+        """A :class:`PollSource` per data source, polled every ``intervals[name]`` seconds while changing."""
+        return [
+            PollSource(name, reads, intervals[name], max_interval)
+            for name, reads in self.source_reads.items()
+        ]
+
+    def unit_rows(
+        self,
+        values: Dict[Tuple[str, str], Any],
+        apps: List[str],
+        tag_map: Dict[str, str],
+    ) -> List[Dict[str, Any]]:
+        """Regroup batch-read ``values`` into one ``{metric: value}`` dict per app."""
+        return [
+            {metric: values.get((app, tag)) for metric, tag in tag_map.items()}
+            for app in apps
+        ]
+
+
+class TagReader:
+    """Reads all the tags in a :class:`TagReadPlan` as one batch and tracks how long it takes.
+
+    ``get_tag`` has the signature of ``Application.get_tag(tag_key, app_key)``. A tag
+    whose read raises is returned as ``None``, like a tag with no value, so one failing
+    tag doesn't lose the rest of the batch. With ``metrics`` (a
+    :class:`~sia_local_control_ui.metrics.DashboardMetrics`) enabled, the latency of
+    every ``get_tag`` call is also recorded, per tag.
+    """
+
+    def __init__(
+        self,
+        plan: TagReadPlan,
+        get_tag: Callable[[str, str], Any],
+        window: int = 50,
+        metrics=None,
+    ):
+        self.plan = plan
+        self._get_tag = get_tag
+        self.metrics = metrics
+        self._durations = deque(maxlen=window)
+        self.last_duration: float = 0.0
+        self.errors = 0
+        self._failing = set()
+
+    def read(
+        self, reads: Optional[Sequence[Tuple[str, str]]] = None
+    ) -> Dict[Tuple[str, str], Any]:
+        """Read every planned tag, or just ``reads``, returning ``{(app key, tag): value}``."""
+        get_tag = self._get_tag
+        reads = self.plan.reads if reads is None else reads
+        start = time.perf_counter()
+        if self.metrics is not None and self.metrics.enabled:
+            values = self._read_timed(reads)
+        elif self._failing:
+            values = {pair: self._read_one(*pair) for pair in reads}
+        else:
+            try:
+                values = {(app, tag): get_tag(tag, app) for app, tag in reads}
+            except Exception:
+                # read them again one at a time, so only the failing tags are lost
+                values = {pair: self._read_one(*pair) for pair in reads}
+        self.last_duration = time.perf_counter() - start
+        self._durations.append(self.last_duration)
+        return values
+
+    def _read_one(self, app: str, tag: str) -> Any:
+        try:
+            value = self._get_tag(tag, app)
+        except Exception as e:
+            self.errors += 1
+            if self.metrics is not None:
+                self.metrics.tag_errors.labels(tag).inc()
+            if (app, tag) not in self._failing:
+                self._failing.add((app, tag))
+                log.warning(f"Reading {tag} from {app} failed: {e!r}")
+            return None
+        if self._failing and (app, tag) in self._failing:
+            self._failing.discard((app, tag))
+            log.info(f"Reading {tag} from {app} recovered")
+        return value
+
+    def _read_timed(
+        self, reads: Sequence[Tuple[str, str]]
+    ) -> Dict[Tuple[str, str], Any]:
+        read_one, tag_read = self._read_one, self.metrics.tag_read
+        values = {}
+        for app, tag in reads:
+            start = time.perf_counter()
+            values[(app, tag)] = read_one(app, tag)
+            tag_read.labels(tag).observe(time.perf_counter() - start)
+        return values
+
+    def stats(self) -> Dict[str, float]:
+        """Acquisition latency over the recent window, in milliseconds."""
+        if not self._durations:
+            return {
+                "tags": len(self.plan),
+                "errors": self.errors,
+                "last_ms": 0.0,
+                "avg_ms": 0.0,
+                "max_ms": 0.0,
+            }
+        return {
+            "tags": len(self.plan),
+            "errors": self.errors,
+            "last_ms": self.last_duration * 1000,
+            "avg_ms": sum(self._durations) / len(self._durations) * 1000,
+            "max_ms": max(self._durations) * 1000,
+        }
@@ -0,0 +1,186 @@
+import json
+import struct
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .encoding import RawJSON, is_nan
+
+FORMATS = ("json", "binary")
+
+# binary message layout, little-endian:
+#   u8 format version, u32 schema size needed to decode it, u16 value count,
+#   then per value: u16 field id, u8 type, the value
+WIRE_VERSION = 1
+_HEADER = struct.Struct("<BIH")
+_FIELD = struct.Struct("<HB")
+_FIELD_FLOAT32 = struct.Struct("<HBf")
+_FIELD_FLOAT64 = struct.Struct("<HBd")
+
+# value types
+NULL, FLOAT32, FLOAT64, STRING, TRUE, FALSE, TIME, JSON, EMPTY = range(9)
+
+# numbers this large are sent as float64 (e.g. epoch seconds), the rest as float32
+FLOAT32_LIMIT = 2.0**24
+
+Path = Tuple[str, ...]
+
+
+def _flatten(value: Dict[str, Any], prefix: Path = ()):
+    for key, item in value.items():
+        path = prefix + (key,)
+        if isinstance(item, dict) and item:
+            yield from _flatten(item, path)
+        else:
+            yield path, item
+
+
+class BinaryCodec:
+    """Schema-indexed binary encoding of dashboard messages.
+
+    A message (a ``data_update`` payload or a ``data_patch``) is flattened into
+    ``(path, value)`` pairs, and each path, e.g. ``("solar", "battery_percentage")``,
+    is sent as a 2-byte field id instead of its key names. Numbers are float32
+    unless too large for it, and ISO timestamps are epoch milliseconds.
+
+    The schema maps field ids to paths. It only ever grows, as new paths (e.g. new
+    fleet units) are seen, and every message carries the schema size it needs, so a
+    client with an older schema knows to fetch it again before decoding.
+    """
+
+    def __init__(self):
+        self.paths: List[Path] = []
+        self._ids: Dict[Path, int] = {}
+        self._lock = threading.Lock()
+
+    def schema(self) -> List[List[str]]:
+        """Every path, by field id."""
+        with self._lock:
+            return [list(path) for path in self.paths]
+
+    def _field_id(self, path: Path) -> int:
+        field_id = self._ids.get(path)
+        if field_id is None:
+            with self._lock:
+                field_id = self._ids.get(path)
+                if field_id is None:
+                    field_id = self._ids[path] = len(self.paths)
+                    self.paths.append(path)
+        return field_id
+
+    def register(self, message: Dict[str, Any]):
+        """Give every path in ``message`` a field id, so clients can be sent a schema that covers it."""
+        for path, _value in _flatten(message):
+            self._field_id(path)
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        parts = []
+        needed = 0
+        for path, value in _flatten(message):
+            field_id = self._field_id(path)
+            needed = max(needed, field_id + 1)
+            parts.append(self._encode_value(field_id, path, value))
+        return _HEADER.pack(WIRE_VERSION, needed, len(parts)) + b"".join(parts)
+
+    @staticmethod
+    def _encode_value(field_id: int, path: Path, value: Any) -> bytes:
+        value_type = type(value)
+        if value_type is float or value_type is int:
+            if -FLOAT32_LIMIT < value < FLOAT32_LIMIT or is_nan(value):
+                return _FIELD_FLOAT32.pack(field_id, FLOAT32, value)
+            return _FIELD_FLOAT64.pack(field_id, FLOAT64, value)
+        if value is None:
+            return _FIELD.pack(field_id, NULL)
+        if value is True or value is False:
+            return _FIELD.pack(field_id, TRUE if value else FALSE)
+        if isinstance(value, (int, float)):
+            return _FIELD_FLOAT64.pack(field_id, FLOAT64, value)
+        if isinstance(value, str):
+            if path[-1] == "timestamp":
+                try:
+                    millis = datetime.fromisoformat(value).timestamp() * 1000
+                    return _FIELD_FLOAT64.pack(field_id, TIME, millis)
+                except ValueError:
+                    pass
+            data = value.encode("utf-8")
+            return _FIELD.pack(field_id, STRING) + struct.pack("<H", len(data)) + data
+        if value == {}:
+            return _FIELD.pack(field_id, EMPTY)
+        data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        return _FIELD.pack(field_id, JSON) + struct.pack("<I", len(data)) + data
+
+    def decode(self, data: bytes) -> Dict[str, Any]:
+        """Decode a message back into its nested dict, as the dashboard's JavaScript does.
+
+        Timestamps come back as epoch milliseconds.
+        """
+        wire_version, schema_size, count = _HEADER.unpack_from(data)
+        if wire_version != WIRE_VERSION or schema_size > len(self.paths):
+            raise ValueError(
+                f"Can't decode wire version {wire_version} with schema size {schema_size}"
+            )
+        result: Dict[str, Any] = {}
+        offset = _HEADER.size
+        for _ in range(count):
+            field_id, value_type = _FIELD.unpack_from(data, offset)
+            offset += _FIELD.size
+            if value_type == FLOAT32:
+                (value,) = struct.unpack_from("<f", data, offset)
+                offset += 4
+            elif value_type in (FLOAT64, TIME):
+                (value,) = struct.unpack_from("<d", data, offset)
+                offset += 8
+            elif value_type == STRING:
+                (length,) = struct.unpack_from("<H", data, offset)
+                value = data[offset + 2 : offset + 2 + length].decode("utf-8")
+                offset += 2 + length
+            elif value_type == JSON:
+                (length,) = struct.unpack_from("<I", data, offset)
+                value = json.loads(data[offset + 4 : offset + 4 + length])
+                offset += 4 + length
+            else:
+                value = {NULL: None, TRUE: True, FALSE: False, EMPTY: {}}[value_type]
+            *parents, key = self.paths[field_id]
+            target = result
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[key] = value
+        return result
+
+
+class WirePayload:
+    """A message to send to clients, encoded at most once for each wire format.
+
+    Each form is only encoded when the first client that needs it is sent the message.
+    """
+
+    __slots__ = ("message", "_json", "_binary", "_codec")
+
+    def __init__(
+        self,
+        message: Dict[str, Any],
+        codec: BinaryCodec,
+        encoded: Optional[RawJSON] = None,
+    ):
+        self.message = message
+        self._json = encoded
+        self._codec = codec
+        self._binary = None
+
+    @property
+    def json(self) -> RawJSON:
+        result = self._json
+        if result is None:
+            result = self._json = RawJSON.encode(self.message)
+        return result
+
+    @property
+    def binary(self) -> bytes:
+        result = self._binary
+        if result is None:
+            result = self._binary = self._codec.encode(self.message)
+        return result
+
+    def encoded(self, wire_format: str = "json"):
+        """The payload in ``wire_format``: :class:`RawJSON` or bytes."""
+        return self.binary if wire_format == "binary" else self.json
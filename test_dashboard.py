@@ -8,6 +8,7 @@ import time
 import threading
 import random
 from src.sia_local_control_ui.dashboard import SiaDashboard, DashboardInterface
+from src.sia_local_control_ui.fleet import Fleet
 
 def test_dashboard():
     """Test the dashboard with simulated data."""
@@ -45,7 +46,18 @@ def test_dashboard():
                 'tank_level_percent': 50.0 + random.uniform(-20.0, 20.0)
             }
             
+            pump_names = ['pump-1', 'pump-2', 'pump-3']
+            pumps = Fleet.from_rows('pumps', pump_names, [
+                {
+                    'target_rate': 15.0 + random.uniform(-2.0, 2.0),
+                    'flow_rate': 14.5 + random.uniform(-1.5, 1.5),
+                    'pump_state': random.choice(['standby', 'auto', 'calibration'])
+                }
+                for _ in pump_names
+            ])
+            
             # Update dashboard data
+            dashboard_interface.update_pump_fleet(pumps)
             dashboard_interface.update_pump_data(**pump_data)
             dashboard_interface.update_solar_data(**solar_data)
             dashboard_interface.update_tank_data(**tank_data)
@@ -0,0 +1,101 @@
+"""
+Tests for the alarm engine.
+"""
+
+from sia_local_control_ui.alarms import AlarmEngine, AlarmRule
+from sia_local_control_ui.dashboard import SiaDashboard
+
+
+def test_thresholds_use_the_deadband_and_delays():
+    engine = AlarmEngine(
+        [
+            AlarmRule(
+                "Low battery",
+                "solar.battery_percentage",
+                "low",
+                20,
+                deadband=2,
+                on_delay=10,
+                off_delay=5,
+            )
+        ]
+    )
+    assert engine.update([("solar.battery_percentage", 19.0)], now=0) == []
+    assert engine.tick(now=9) == []
+    [event] = engine.tick(now=10)
+    assert event["active"] and event["name"] == "Low battery" and event["value"] == 19.0
+    assert "Low battery" in engine.active
+
+    # back above the threshold, but not past the deadband: still active
+    assert engine.update([("solar.battery_percentage", 21.0)], now=20) == []
+    assert engine.tick(now=30) == []
+    assert engine.update([("solar.battery_percentage", 23.0)], now=31) == []
+    [event] = engine.tick(now=36)
+    assert not event["active"] and not engine.active
+    # nothing left waiting out a delay
+    assert engine.stats()["timed"] == 0
+
+
+def test_deviation_and_rate_rules():
+    engine = AlarmEngine(
+        [
+            AlarmRule(
+                "Flow off target",
+                "pump.flow_rate",
+                "deviation",
+                1.5,
+                reference="pump.target_rate",
+            ),
+            AlarmRule("Tank filling fast", "tank.tank_level_mm", "rate", 10),
+        ]
+    )
+    assert (
+        engine.update([("pump.target_rate", 10.0), ("pump.flow_rate", 9.0)], now=0)
+        == []
+    )
+    [event] = engine.update([("pump.target_rate", 12.0)], now=1)
+    assert event["name"] == "Flow off target" and event["value"] == 3.0
+
+    assert engine.update([("tank.tank_level_mm", 1000.0)], now=0) == []
+    [event] = engine.update([("tank.tank_level_mm", 1050.0)], now=2)
+    assert event["name"] == "Tank filling fast" and event["value"] == 25.0
+    # the level stops changing, so the rate alarm clears
+    [event] = engine.tick(now=4)
+    assert not event["active"]
+
+
+def test_only_rules_of_changed_metrics_are_evaluated():
+    rules = [
+        AlarmRule(f"High flow {n}", f"pumps.pump-{n}.flow_rate", "high", 50)
+        for n in range(500)
+    ]
+    engine = AlarmEngine(rules)
+    engine.update(
+        [("pumps.pump-7.flow_rate", 10.0), ("solar.battery_percentage", 80.0)], now=0
+    )
+    assert engine.evaluations == 1
+    # unchanged values are not evaluated again
+    engine.update([("pumps.pump-7.flow_rate", 10.0)], now=1)
+    assert engine.evaluations == 1
+
+
+def test_dashboard_pushes_alarm_events():
+    dashboard = SiaDashboard()
+    dashboard.alarms.set_rules(
+        [
+            AlarmRule(
+                "Low tank", "tank.tank_level_percent", "low", 15, severity="critical"
+            )
+        ]
+    )
+    events = []
+    dashboard.emit = lambda event, data: events.append((event, data))
+
+    dashboard.update_data(tank={"tank_level_percent": 10.0})
+    assert [(event, data["name"], data["active"]) for event, data in events] == [
+        ("alarm", "Low tank", True)
+    ]
+    response = dashboard.alarms_response()
+    assert response["rules"] == 1 and [
+        alarm["severity"] for alarm in response["active"]
+    ] == ["critical"]
@@ -0,0 +1,102 @@
+"""
+Tests for the application's command dispatch and shutdown.
+"""
+
+import asyncio
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+from pydoover.docker import Application
+
+from sia_local_control_ui.application import SiaLocalControlUiApplication
+from sia_local_control_ui.commands import Command, CommandQueue
+from sia_local_control_ui.dashboard import DashboardInterface, SiaDashboard
+from sia_local_control_ui.history import HistoryStore
+from sia_local_control_ui.segments import SegmentStore
+from sia_local_control_ui.tags import TagReadPlan
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_app(monkeypatch, **dashboard_kwargs):
+    """The application's dashboard and command queue, without pydoover's device connections."""
+    closed = []
+
+    async def close(self):
+        closed.append(self)
+
+    monkeypatch.setattr(Application, "close", close)
+    app = SiaLocalControlUiApplication.__new__(SiaLocalControlUiApplication)
+    app.dashboard = SiaDashboard(host="127.0.0.1", **dashboard_kwargs)
+    app.dashboard_interface = DashboardInterface(app.dashboard)
+    app.command_queue = CommandQueue(app.dispatch_command, app.dashboard.command_done)
+    app.tag_recorder = None
+    return app, closed
+
+
+def test_commands_are_written_to_the_configured_tags(monkeypatch):
+    app, _closed = make_app(monkeypatch)
+    app.tag_plan = TagReadPlan(["pump_a", "pump_b"], [], None, None, None)
+    app.command_tags = {"pump_state": "ModeRequest", "target_rate": "RateSetpoint"}
+    app.poll_scheduler = SimpleNamespace(wake=lambda name: None)
+    written = []
+
+    async def set_tag_async(tag_key, value, app_key=None, only_if_changed=True):
+        written.append((app_key, tag_key, value))
+
+    app.set_tag_async = set_tag_async
+    asyncio.run(app.dispatch_command(Command(1, "pump2", "pump_state", "standby")))
+    asyncio.run(app.dispatch_command(Command(2, "pump_a", "target_rate", 12.5)))
+    assert written == [
+        ("pump_b", "ModeRequest", "standby"),
+        ("pump_a", "RateSetpoint", 12.5),
+    ]
+
+
+def test_close_stops_the_dashboard_and_command_queue(monkeypatch):
+    port = free_port()
+    app, closed = make_app(monkeypatch, port=port, serving_mode="async")
+
+    async def run():
+        await app.command_queue.start()
+        app.dashboard_interface.start_dashboard()
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "the dashboard didn't start"
+                await asyncio.sleep(0.05)
+        await app.close()
+
+    asyncio.run(run())
+    assert not app.dashboard_interface._server_thread.is_alive()
+    assert not app.dashboard._running and app.command_queue._task is None
+    assert closed == [app]
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", port), timeout=0.5)
+
+
+def test_history_not_yet_synced_reaches_disk_on_close(monkeypatch, tmp_path):
+    app, _closed = make_app(monkeypatch)
+    archive = app.dashboard.history.archive = SegmentStore(
+        str(tmp_path), sample_interval=0.01
+    )
+    archive.start()
+    start = time.time()
+    app.dashboard.update_data(tank={"tank_level_mm": 1250.0})
+    while archive.pending_rows == 0:
+        time.sleep(0.01)
+
+    # long before the writer's next fsync
+    asyncio.run(app.close())
+    history = HistoryStore(archive=SegmentStore(str(tmp_path)))
+    points = history.query("tank.tank_level_mm", start - 1, time.time() + 1)["points"]
+    assert points and points[-1][1] == 1250.0
@@ -0,0 +1,88 @@
+"""
+Tests for fingerprinted, precompressed static assets.
+"""
+
+import gzip
+import os
+import re
+import shutil
+
+import pytest
+
+from sia_local_control_ui.assets import (
+    IMMUTABLE,
+    STATIC_DIR,
+    StaticAssets,
+    build,
+    index_asset,
+)
+
+
+def test_fingerprinted_urls_are_cached_and_compressed(tmp_path):
+    shutil.copytree(STATIC_DIR, tmp_path / "static")
+    directory = str(tmp_path / "static")
+    assert build(directory) >= 3
+    # a stale variant is ignored rather than served
+    with open(os.path.join(directory, "icons.svg.gz"), "wb") as f:
+        f.write(gzip.compress(b"old"))
+    os.utime(os.path.join(directory, "icons.svg.gz"), (0, 0))
+
+    assets = StaticAssets(directory)
+    url = assets.url("js/dashboard.js")
+    assert re.fullmatch(r"/static/js/dashboard\.[0-9a-f]{12}\.js", url)
+
+    status, headers, body = assets.respond(url[len("/static/") :], "gzip, deflate")
+    assert (
+        status == 200
+        and headers["Cache-Control"] == IMMUTABLE
+        and headers["Content-Encoding"] == "gzip"
+    )
+    with open(os.path.join(directory, "js", "dashboard.js"), "rb") as f:
+        assert gzip.decompress(body) == f.read()
+
+    status, headers, body = assets.respond("js/dashboard.js", "gzip;q=0")
+    assert headers["Cache-Control"] == "no-cache" and "Content-Encoding" not in headers
+    assert assets.respond("js/dashboard.js", None, headers["ETag"])[0] == 304
+
+    _status, _headers, body = assets.respond("icons.svg", "gzip")
+    assert b"<symbol" in gzip.decompress(body)
+    assert assets.respond("../app_config.py") is None
+    assert (
+        "Content-Encoding" not in assets.respond("remote_command_logo.png", "gzip")[1]
+    )
+
+
+def test_brotli_variants_are_built_and_preferred(tmp_path):
+    brotli = pytest.importorskip("brotli")
+    shutil.copytree(STATIC_DIR, tmp_path / "static")
+    directory = str(tmp_path / "static")
+    build(directory)
+    assert os.path.exists(os.path.join(directory, "js", "dashboard.js.br"))
+
+    status, headers, body = StaticAssets(directory).respond(
+        "js/dashboard.js", "gzip, br"
+    )
+    assert status == 200 and headers["Content-Encoding"] == "br"
+    with open(os.path.join(directory, "js", "dashboard.js"), "rb") as f:
+        assert brotli.decompress(body) == f.read()
+
+
+def test_page_needs_nothing_from_the_internet():
+    page = index_asset().variants["identity"]
+    assert b"https://" not in page and b"http://" not in page
+    assert re.search(rb'src="/static/js/socket\.io\.min\.[0-9a-f]{12}\.js"', page)
+
+
+def test_the_vendored_socket_io_client_is_served_like_any_other_asset():
+    url = index_asset().variants["identity"].decode()
+    url = re.search(r'src="/static/(js/socket\.io\.min\.[0-9a-f]{12}\.js)"', url).group(
+        1
+    )
+    status, headers, body = StaticAssets().respond(url, "gzip")
+    assert (
+        status == 200
+        and headers["Cache-Control"] == IMMUTABLE
+        and headers["Content-Encoding"] == "gzip"
+    )
+    # the upstream build, with its license header
+    assert gzip.decompress(body).startswith(b"/*!\n * Socket.IO v4.")
@@ -0,0 +1,90 @@
+"""
+Tests for UI command validation, dispatch and acknowledgement.
+"""
+
+import asyncio
+
+import pytest
+
+from sia_local_control_ui.commands import Command, CommandQueue
+from sia_local_control_ui.dashboard import SiaDashboard
+
+
+def test_command_validation():
+    command = Command.from_message(
+        {"id": 1, "pump": "pump2", "field": "target_rate", "value": "12.5"}, "sid"
+    )
+    assert (
+        command.key == ("pump2", "target_rate")
+        and command.value == 12.5
+        and command.sid == "sid"
+    )
+
+    for message in (
+        {"field": "pump_state", "value": "off"},
+        {"field": "target_rate", "value": -1},
+        {"field": "flow_rate", "value": 1},
+        {"field": "pump_state", "pump": 2, "value": "auto"},
+        None,
+    ):
+        with pytest.raises(ValueError):
+            Command.from_message(message)
+
+
+def test_queued_command_is_superseded_by_newer_one():
+    done = []
+
+    async def run():
+        dispatched = []
+
+        async def dispatch(command):
+            dispatched.append(command.value)
+            await asyncio.sleep(0)
+
+        queue = CommandQueue(
+            dispatch,
+            lambda command, status, *_times: done.append((command.value, status)),
+        )
+        await queue.start()
+        # submitted in one go, so the first two are still queued when the last arrives
+        for state in ("auto", "standby", "calibration"):
+            queue.submit(Command(state, "pump", "pump_state", state))
+        queue.submit(Command("rate", "pump", "target_rate", 10.0))
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await queue.stop()
+        return dispatched
+
+    assert asyncio.run(run()) == ["calibration", 10.0]
+    assert done == [
+        ("auto", "superseded"),
+        ("standby", "superseded"),
+        ("calibration", "ok"),
+        (10.0, "ok"),
+    ]
+
+
+def test_dashboard_acknowledges_commands():
+    dashboard = SiaDashboard()
+    event, ack = dashboard.command_request(
+        {"id": 7, "pump": "pump", "field": "pump_state", "value": "auto"}
+    )
+    assert event == "command_ack" and ack["status"] == "local" and ack["id"] == 7
+    assert dashboard.data.pump_state == "auto"
+
+    assert (
+        dashboard.command_request({"id": 8, "field": "pump_state", "value": "off"})[1][
+            "status"
+        ]
+        == "rejected"
+    )
+
+    handled = []
+    dashboard.command_handler = handled.append
+    assert (
+        dashboard.command_request(
+            {"id": 9, "pump": "pump-3", "field": "target_rate", "value": 4}, "sid"
+        )
+        is None
+    )
+    assert handled[0].pump == "pump-3" and handled[0].sid == "sid"
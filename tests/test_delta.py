@@ -0,0 +1,36 @@
+"""
+Tests for the versioned delta protocol used by the dashboard broadcasts.
+"""
+
+from sia_local_control_ui.delta import PatchLog, diff_sections, merge_patch
+
+
+def test_diff_only_changed_fields():
+    old = {
+        "pump": {"target_rate": 1.0, "flow_rate": 2.0},
+        "tank": {"tank_level_mm": 5.0},
+    }
+    new = {
+        "pump": {"target_rate": 1.0, "flow_rate": 3.0},
+        "tank": {"tank_level_mm": 5.0},
+    }
+    assert diff_sections(old, new) == {"pump": {"flow_rate": 3.0}}
+    assert merge_patch(old, diff_sections(old, new)) == new
+
+
+def test_patch_log_versions_and_catch_up():
+    log = PatchLog(max_patches=2)
+    assert (
+        log.record({"pump": {"flow_rate": 1.0, "pump_state": "auto"}})["version"] == 1
+    )
+    assert log.record({"pump": {"flow_rate": 1.0, "pump_state": "auto"}}) is None
+
+    message = log.record({"pump": {"flow_rate": 2.0, "pump_state": "auto"}})
+    assert message == {"version": 2, "base": 1, "patch": {"pump": {"flow_rate": 2.0}}}
+    log.record({"pump": {"flow_rate": 2.0, "pump_state": "standby"}})
+
+    assert log.since(1)["patch"] == {
+        "pump": {"flow_rate": 2.0, "pump_state": "standby"}
+    }
+    assert log.since(0) is None
+    assert log.since(3)["patch"] == {}
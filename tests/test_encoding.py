@@ -0,0 +1,36 @@
+"""
+Tests for JSON encoding, with and without orjson.
+"""
+
+import json
+
+import pytest
+
+from sia_local_control_ui import encoding
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_non_finite_floats_are_null(monkeypatch, use_orjson):
+    if use_orjson and encoding.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(encoding, "orjson", None)
+
+    data = {
+        "tank": {"level": float("nan"), "rate": float("inf")},
+        "rows": [1.5, float("-inf")],
+        "ok": 2.0,
+    }
+    encoded = encoding.dumps_bytes(data)
+    assert json.loads(encoded) == {
+        "tank": {"level": None, "rate": None},
+        "rows": [1.5, None],
+        "ok": 2.0,
+    }
+    assert b"NaN" not in encoded and b"Infinity" not in encoded
+
+
+def test_is_nan_is_only_true_for_nan_floats():
+    assert encoding.is_nan(float("nan"))
+    for value in (None, 0, 1.5, float("inf"), "nan", True):
+        assert not encoding.is_nan(value)
@@ -0,0 +1,86 @@
+"""
+Tests for per-client outbound queues and conflation.
+"""
+
+from sia_local_control_ui.fanout import FanOut
+
+
+def make_fanout(sent, **kwargs):
+    def send(sid, event, payload, callback):
+        sent.append((sid, payload, callback))
+
+    return FanOut(send, lambda since: ("data_patch", f"{since}->latest", 10), **kwargs)
+
+
+def test_slow_client_gets_latest_value_instead_of_backlog():
+    sent = []
+    fanout = make_fanout(sent, max_queue=3, max_in_flight=1)
+    fanout.add("fast", 0, paced=True)
+    fanout.add("slow", 0, paced=True)
+
+    for version in range(1, 11):
+        fanout.publish("data_patch", f"v{version}", version)
+        # the fast client acknowledges everything straight away
+        for sid, _payload, callback in list(sent):
+            if sid == "fast":
+                sent.remove((sid, _payload, callback))
+                callback()
+
+    # the slow client has one message in flight and overflowed its queue
+    assert [payload for _sid, payload, _callback in sent] == ["v1"]
+    stats = fanout.stats()
+    assert stats["fast"]["sent"] == 10 and stats["fast"]["lag_versions"] == 0
+    assert stats["slow"]["dropped"] == 9 and stats["slow"]["lag_versions"] == 9
+
+    sent.pop()[2]()
+    assert [payload for _sid, payload, _callback in sent] == ["1->latest"]
+    sent.pop()[2]()
+    assert fanout.stats()["slow"]["lag_seconds"] == 0.0 and fanout.lagging() == []
+
+
+def test_clients_behind_too_long_are_reported():
+    sent = []
+    fanout = make_fanout(sent, max_queue=2, max_in_flight=1, max_lag=5.0)
+    fanout.add("stuck", 0, paced=True)
+    fanout.publish("data_patch", "v1", 1)
+    fanout.publish("data_patch", "v2", 2)
+
+    behind_since = fanout._channels["stuck"].behind_since
+    assert fanout.lagging(now=behind_since + 1) == []
+    assert fanout.lagging(now=behind_since + 6) == ["stuck"]
+
+
+def test_clients_that_dont_ack_get_every_broadcast_and_are_never_lagging():
+    sent = []
+    fanout = make_fanout(sent, max_queue=2, max_in_flight=1, max_lag=0.0)
+    fanout.add("plain", 0)
+    for version in range(1, 6):
+        fanout.publish("data_patch", f"v{version}", version)
+
+    assert [(payload, callback) for _sid, payload, callback in sent] == [
+        (f"v{v}", None) for v in range(1, 6)
+    ]
+    assert fanout.lagging(now=1e12) == []
+    assert (
+        fanout.stats()["plain"]["dropped"] == 0 and not fanout.stats()["plain"]["paced"]
+    )
+
+
+def test_broadcasts_during_a_slow_write_are_conflated_and_sent_without_the_lock():
+    sent = []
+
+    def send(sid, event, payload, callback):
+        # a slow write: the lock is free, so more broadcasts are published meanwhile
+        assert not fanout._lock.locked()
+        sent.append(payload)
+        if payload == "v1":
+            fanout.publish("data_patch", "v2", 2)
+            fanout.publish("data_patch", "v3", 3)
+
+    fanout = FanOut(send, lambda since: ("data_patch", f"{since}->latest", 3))
+    fanout.add("plain", 0)
+    fanout.publish("data_patch", "v1", 1)
+
+    assert sent == ["v1", "1->latest"]
+    stats = fanout.stats()["plain"]
+    assert stats["version"] == 3 and stats["dropped"] == 2 and stats["conflations"] == 1
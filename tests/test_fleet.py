@@ -0,0 +1,68 @@
+"""
+Tests for column-oriented pump and solar fleet data.
+"""
+
+from sia_local_control_ui.fleet import Fleet
+from sia_local_control_ui.snapshot import SnapshotStore
+
+
+def test_fleet_aggregates_skip_missing_readings():
+    solar = Fleet.from_rows(
+        "solar_units",
+        ["s1", "s2", "s3"],
+        [
+            {
+                "battery_voltage": 24.0,
+                "battery_percentage": 80,
+                "panel_power": 100,
+                "battery_ah": 50,
+            },
+            {
+                "battery_voltage": 26.0,
+                "battery_percentage": 70,
+                "panel_power": None,
+                "battery_ah": 60,
+            },
+            {
+                "battery_voltage": "-",
+                "battery_percentage": 60,
+                "panel_power": 120,
+                "battery_ah": 70,
+            },
+        ],
+    )
+
+    summary = solar.summary()
+    assert summary["battery_voltage"] == {
+        "mean": 25.0,
+        "min": 24.0,
+        "max": 26.0,
+        "total": 50.0,
+        "count": 2,
+    }
+    assert summary["battery_ah"]["total"] == 180.0
+    assert summary["stale"] == 2
+    assert solar.unit("s2")["panel_power"] is None
+    assert solar.unit("missing") is None
+
+
+def test_fleets_are_part_of_the_snapshot_payload():
+    pumps = Fleet.from_rows(
+        "pumps",
+        ["p1", "p2"],
+        [
+            {"target_rate": 10, "flow_rate": 9.5, "pump_state": "auto"},
+            {"target_rate": 12, "flow_rate": 11.0, "pump_state": "standby"},
+        ],
+    )
+    snapshot = SnapshotStore().update({"pumps": pumps})
+
+    payload = snapshot.to_dict()
+    assert payload["pumps"]["count"] == 2
+    assert payload["pumps"]["units"]["p2"] == {
+        "target_rate": 12.0,
+        "flow_rate": 11.0,
+        "pump_state": "standby",
+    }
+    assert payload["pumps"]["summary"]["flow_rate"]["total"] == 20.5
+    assert payload["solar_units"]["count"] == 0
@@ -0,0 +1,56 @@
+"""
+Tests for the bounded in-memory metric history.
+"""
+
+from sia_local_control_ui.history import HistoryStore, RingBuffer, lttb
+
+
+def test_ring_buffer_overwrites_oldest_rows():
+    ring = RingBuffer(3, ("d", "f"))
+    for t in range(5):
+        ring.append(t, t * 1.5)
+
+    assert len(ring) == 3
+    assert ring.oldest() == 2
+    assert ring.rows(0, 10) == [(2.0, 3.0), (3.0, 4.5), (4.0, 6.0)]
+    assert ring.rows(2.5, 3.5) == [(3.0, 4.5)]
+
+
+def test_recent_queries_use_raw_samples_and_older_ones_use_rollups():
+    history = HistoryStore(raw_capacity=10, rollups={10: 100, 60: 100})
+    for t in range(100):
+        history.record(
+            [("tank.level", float(t)), ("tank.nan", float("nan"))], t=1000.0 + t
+        )
+
+    assert history.metrics() == ["tank.level"]
+    recent = history.query("tank.level", 1095, 1099)
+    assert recent["resolution"] == 0
+    assert recent["points"] == [
+        [1095.0, 95.0],
+        [1096.0, 96.0],
+        [1097.0, 97.0],
+        [1098.0, 98.0],
+        [1099.0, 99.0],
+    ]
+
+    older = history.query("tank.level", 1000, 1099)
+    assert older["resolution"] == 10
+    # [bucket start, avg, min, max]
+    assert older["points"][0] == [1000.0, 4.5, 0.0, 9.0]
+    assert older["points"][-1] == [1090.0, 94.5, 90.0, 99.0]
+
+    merged = history.query("tank.level", 1000, 1099, max_points=5)
+    assert len(merged["points"]) == 5
+    assert merged["points"][0] == [1000.0, 9.5, 0.0, 19.0]
+    assert history.query("missing", 0, 1) is None
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    points = [[float(t), 0.0] for t in range(100)]
+    points[42][1] = 50.0
+    sampled = lttb(points, 10)
+
+    assert len(sampled) == 10
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert [42.0, 50.0] in sampled
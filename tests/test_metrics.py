@@ -0,0 +1,52 @@
+"""
+Tests for the hot-path instrumentation and /api/metrics.
+"""
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.metrics import Registry
+
+
+def test_disabled_metrics_record_nothing():
+    registry = Registry(enabled=False)
+    counter = registry.counter("ticks", "Ticks")
+    histogram = registry.histogram("tick_seconds", "Tick time", buckets=(0.1, 1.0))
+    counter.inc()
+    with histogram.time():
+        pass
+    assert counter.value == 0 and histogram.count == 0
+
+    registry.enabled = True
+    counter.inc(2)
+    histogram.observe(0.5)
+    histogram.observe(5.0)
+    assert registry.to_dict() == {
+        "ticks": 2,
+        "tick_seconds": {"count": 2, "avg": 2.75, "p50": 1.0, "p99": 1.0},
+    }
+    assert registry.prometheus().splitlines() == [
+        "# HELP ticks Ticks",
+        "# TYPE ticks counter",
+        "ticks_total 2",
+        "# HELP tick_seconds Tick time",
+        "# TYPE tick_seconds histogram",
+        'tick_seconds_bucket{le="0.1"} 0',
+        'tick_seconds_bucket{le="1"} 1',
+        'tick_seconds_bucket{le="+Inf"} 2',
+        "tick_seconds_sum 5.5",
+        "tick_seconds_count 2",
+    ]
+
+
+def test_metrics_endpoint_follows_the_switch():
+    dashboard = SiaDashboard()
+    client = dashboard.app.test_client()
+    assert client.get("/api/metrics").status_code == 404
+
+    dashboard.metrics.enabled = True
+    dashboard.update_data(tank={"tank_level_mm": 1200})
+    text = client.get("/api/metrics").get_data(as_text=True)
+    assert "sia_dashboard_updates_total 1" in text
+    assert "sia_snapshot_version 1" in text
+    metrics = client.get("/api/metrics?format=json").json
+    assert metrics["sia_broadcasts"] == 1
+    assert metrics["sia_broadcast_encode_seconds"]["count"] == 1
@@ -0,0 +1,56 @@
+"""
+Tests for adaptive per-source polling.
+"""
+
+from sia_local_control_ui.polling import PollScheduler
+from sia_local_control_ui.tags import TagReadPlan
+
+
+def make_scheduler(values):
+    plan = TagReadPlan(["pump-1"], ["solar-1"], tank_app="tank")
+    scheduler = PollScheduler(
+        plan.poll_sources({"pumps": 0.2, "solar": 1.0, "tank": 1.0}, max_interval=8.0)
+    )
+    reads = []
+
+    def read(pairs):
+        reads.append({app for app, _tag in pairs})
+        return {pair: values.get(pair[0], 0.0) for pair in pairs}
+
+    return scheduler, reads, read
+
+
+def test_sources_poll_at_their_own_rate_and_back_off_when_stable():
+    values = {}
+    scheduler, reads, read = make_scheduler(values)
+    assert scheduler.tick == 0.2
+
+    assert scheduler.poll(read, now=0.0) == (["pumps", "solar", "tank"], True)
+    assert scheduler.poll(read, now=0.1) == ([], False)
+    # the pumps are due again before the slow sources, and nothing changed
+    assert scheduler.poll(read, now=0.2) == (["pumps"], False)
+    assert reads[-1] == {"pump-1"}
+
+    for now in range(1, 100):
+        scheduler.poll(read, now=float(now))
+    stats = scheduler.stats()
+    assert stats["pumps"]["interval"] == 8.0 and stats["tank"]["interval"] == 8.0
+
+    # a change tightens only the source it happened in
+    values["pump-1"] = 5.0
+    assert scheduler.poll(read, now=200.0) == (["pumps", "solar", "tank"], True)
+    stats = scheduler.stats()
+    assert stats["pumps"]["interval"] == 0.2 and stats["solar"]["interval"] == 8.0
+
+
+def test_connected_client_tightens_backed_off_sources():
+    scheduler, _reads, read = make_scheduler({})
+    for now in range(100):
+        scheduler.poll(read, now=float(now))
+
+    scheduler.set_active(True, now=100.0)
+    assert scheduler.stats()["solar"]["interval"] == 2.0
+    assert scheduler.poll(read, now=100.0)[0] == ["pumps", "solar", "tank"]
+
+    scheduler.wake("pumps")
+    assert scheduler.poll(read, now=100.01) == (["pumps"], False)
@@ -0,0 +1,56 @@
+"""
+Tests for coalesced dashboard publishing.
+"""
+
+import time
+
+from sia_local_control_ui.publisher import CoalescingPublisher
+
+
+def test_requests_coalesce_within_window():
+    flushes = []
+    publisher = CoalescingPublisher(
+        lambda: flushes.append(time.monotonic()), max_rate=10.0
+    )
+    publisher.start()
+    try:
+        publisher.request()
+        time.sleep(0.02)
+        for _ in range(50):
+            publisher.request()
+        time.sleep(0.3)
+    finally:
+        publisher.stop()
+
+    # one leading flush, one trailing flush for the rest of the burst
+    assert len(flushes) == 2
+    assert flushes[1] - flushes[0] >= 0.09
+
+
+def test_flushes_synchronously_when_not_started():
+    flushes = []
+    publisher = CoalescingPublisher(lambda: flushes.append(1))
+    publisher.request()
+    assert flushes == [1]
+
+
+def test_batch_commits_once():
+    from sia_local_control_ui.dashboard import DashboardInterface, SiaDashboard
+
+    dashboard = SiaDashboard()
+    interface = DashboardInterface(dashboard)
+    calls = []
+    dashboard.update_data = lambda **kwargs: calls.append(kwargs)
+
+    with interface.batch():
+        interface.update_pump_data(target_rate=1.0)
+        interface.update_tank_data(tank_level_mm=2.0)
+        interface.update_system_status("running")
+
+    assert calls == [
+        {
+            "pump": {"target_rate": 1.0},
+            "tank": {"tank_level_mm": 2.0},
+            "system": {"status": "running"},
+        }
+    ]
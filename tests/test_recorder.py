@@ -0,0 +1,111 @@
+"""
+Tests for recording tag reads and replaying them.
+"""
+
+import asyncio
+import gzip
+import time
+
+import pytest
+
+from sia_local_control_ui.recorder import TagRecorder, TagRecording, feed
+from sia_local_control_ui.simulator import FleetSimulator
+from sia_local_control_ui.tagcache import TagCache
+from sia_local_control_ui.tags import TagReader, TagReadPlan
+
+
+def record(tmp_path, seconds=5.0, step=0.2):
+    """Record a simulated fleet read every ``step``; returns the recording and every batch read."""
+    simulator = FleetSimulator(pumps=2, solar=1, tanks=1, seed=3)
+    config = simulator.app_config()
+    plan = TagReadPlan(
+        config["pump_controllers"],
+        config["solar_controllers"],
+        config["tank_level_app"],
+        config["flow_sensor_app"],
+        config["pressure_sensor_app"],
+    )
+    reader = TagReader(plan, simulator.store.get_tag)
+    recorder = TagRecorder(str(tmp_path / "tags.jsonl.gz"), config)
+    start = recorder.started
+    batches = []
+    for i in range(int(seconds / step)):
+        now = start + i * step
+        simulator.step(now)
+        # the solar controller is polled less often, and its reads fail for a while
+        reads = plan.reads if i % 5 == 0 else plan.source_reads["pumps"]
+        values = reader.read(reads)
+        if 10 <= i < 15:
+            values.update({pair: None for pair in plan.source_reads["solar"]})
+        recorder.record(values, now)
+        batches.append((round(now - start, 3), values))
+    return recorder, batches
+
+
+def test_replay_reads_back_every_batch(tmp_path):
+    recorder, batches = record(tmp_path)
+    recorder.close()
+    recording = TagRecording(recorder.path)
+
+    assert recording.config["pump_controllers"] == ["sim_pump_1", "sim_pump_2"]
+    assert list(recording.batches()) == batches
+    # only changed values are written
+    assert recorder.written < recorder.reads
+
+    with TagRecorder(str(tmp_path / "wrapped.jsonl.gz"), {}) as wrapped:
+        values = wrapped.wrap(lambda reads: {pair: 1.0 for pair in reads})(
+            [("app", "tag")]
+        )
+    assert not wrapped.recording
+    assert [values] == [batch for _t, batch in TagRecording(wrapped.path).batches()]
+
+
+def test_replay_is_identical_at_any_speed(tmp_path):
+    recorder, _batches = record(tmp_path)
+    recorder.close()
+    recording = TagRecording(recorder.path)
+
+    def run(speed):
+        cache = TagCache(default_ttl=0.5)
+        shown = []
+
+        async def publish():
+            shown.append(
+                (dict(cache.values), cache.stale_since(cache.tags) is not None)
+            )
+
+        stats = asyncio.run(feed(recording, cache, publish, speed))
+        return shown, stats
+
+    shown, stats = run(0)
+    assert stats["batches"] == 25 and stats["updates"] == len(shown) > 1
+    assert any(stale for _values, stale in shown)
+    start = time.monotonic()
+    assert run(20)[0] == shown
+    assert time.monotonic() - start >= 4.8 / 20  # the last batch was recorded at 4.8 s
+
+
+def test_a_recording_cut_short_replays_up_to_its_last_flush(tmp_path):
+    recorder, _batches = record(tmp_path)
+    recorder._file.flush()
+    with open(recorder.path, "rb") as f:
+        data = f.read()
+    path = tmp_path / "cut.jsonl.gz"
+    path.write_bytes(data)
+
+    assert len(list(TagRecording(str(path)).batches())) == recorder.batches
+    (tmp_path / "other.gz").write_bytes(
+        gzip.compress(b'{"format": "something else"}\n')
+    )
+    with pytest.raises(ValueError):
+        TagRecording(str(tmp_path / "other.gz"))
+
+
+def test_recordings_started_in_the_same_second_get_their_own_files(tmp_path):
+    paths = []
+    for _ in range(3):
+        with TagRecorder.create(str(tmp_path), {"run": len(paths)}) as recorder:
+            paths.append(recorder.path)
+
+    assert len(set(paths)) == 3
+    assert [TagRecording(path).config["run"] for path in paths] == [0, 1, 2]
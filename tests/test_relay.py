@@ -0,0 +1,85 @@
+"""
+Tests for relay mode, with a primary and a relay dashboard talking over a local socket.
+"""
+
+import asyncio
+
+from aiohttp.test_utils import TestServer
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.serving import AsyncDashboardServer
+
+
+async def wait_until(condition, timeout=5.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("Timed out")
+
+
+def test_relay_mirrors_the_primary_and_forwards_commands():
+    primary = SiaDashboard(serving_mode="async")
+    mirror = SiaDashboard(upstream="http://primary")
+    relay = mirror.relay
+    acks = []
+    mirror.emit_to = lambda sid, event, data, callback=None: acks.append(
+        (sid, event, data)
+    )
+
+    async def check():
+        server = AsyncDashboardServer(primary)
+        async with TestServer(server.app) as test_server:
+            server.loop = asyncio.get_running_loop()
+            primary._server = server
+            relay.upstream = str(test_server.make_url(""))
+            task = asyncio.create_task(relay._run())
+            await wait_until(lambda: relay.version is not None)
+            # the primary holds one client: the relay
+            assert len(primary.connected_clients) == 1
+
+            primary.update_data(
+                tank={"tank_level_mm": 1250.0}, solar={"battery_voltage": 12.5}
+            )
+            await wait_until(lambda: mirror.data.tank_level_mm == 1250.0)
+            assert mirror.data.battery_voltage == 12.5
+            await relay.ping()
+            stats = relay.stats()
+            assert (
+                stats["connected"]
+                and stats["versions_behind"] == 0
+                and stats["lag_ms"] is not None
+            )
+
+            assert (
+                mirror.command_request(
+                    {
+                        "id": "c1",
+                        "pump": "pump",
+                        "field": "pump_state",
+                        "value": "auto",
+                    },
+                    "panel",
+                )
+                is None
+            )
+            await wait_until(lambda: acks)
+            sid, event, ack = acks[0]
+            assert (sid, event, ack["id"], ack["status"]) == (
+                "panel",
+                "command_ack",
+                "c1",
+                "local",
+            )
+            await wait_until(lambda: mirror.data.pump_state == "auto")
+
+            relay._stopping.set()
+            await task
+
+    asyncio.run(check())
+    assert not relay.connected
+    # without the primary, commands fail straight away
+    mirror.command_request(
+        {"id": "c2", "pump": "pump", "field": "target_rate", "value": 3}, "panel"
+    )
+    assert acks[-1][2]["status"] == "failed"
@@ -0,0 +1,38 @@
+"""
+Tests for the render stats reported by dashboard clients.
+"""
+
+from sia_local_control_ui.dashboard import SiaDashboard
+
+
+def test_render_stats_are_totalled_per_client_and_observed():
+    dashboard = SiaDashboard(enable_metrics=True)
+    dashboard.client_connected("a")
+
+    report = {"frames": 3, "updates": 12, "writes": 40, "render_ms": [2.0, 1.0, 9.5]}
+    assert dashboard.render_stats_request(report, "a") is None
+    assert dashboard.render_stats_request({**report, "render_ms": [4.0]}, "a") is None
+
+    render = dashboard.clients_response()["clients"]["a"]["render"]
+    assert render["frames"] == 6 and render["updates"] == 24 and render["writes"] == 80
+    # render times are from the latest report
+    assert render["render_max_ms"] == 4.0
+    assert dashboard.metrics.client_render.count == 4
+    assert dashboard.metrics.client_updates.value == 24
+
+    dashboard.client_disconnected("a")
+    assert "a" not in dashboard.client_render
+
+
+def test_invalid_render_stats_are_rejected():
+    dashboard = SiaDashboard()
+    dashboard.client_connected("a")
+    for report in (
+        None,
+        {"frames": 1},
+        {"render_ms": ["slow"]},
+        {"frames": -1, "render_ms": []},
+        {"writes": True, "render_ms": []},
+    ):
+        assert dashboard.render_stats_request(report, "a")[0] == "error"
+    assert dashboard.client_render == {}
@@ -0,0 +1,65 @@
+"""
+Tests for the durable on-disk history segments.
+"""
+
+import os
+
+from sia_local_control_ui.history import HistoryStore
+from sia_local_control_ui.segments import SegmentStore
+
+BASE = 1_700_000_040.0
+
+
+def write_samples(store, seconds, start=BASE):
+    for i in range(seconds):
+        store.record(
+            [("tank.tank_level_mm", float(i)), ("skid.skid_flow", 2.0)], start + i
+        )
+        store._sample()
+    store._flush()
+
+
+def test_history_survives_a_restart(tmp_path):
+    store = SegmentStore(str(tmp_path), segment_seconds=60)
+    write_samples(store, 150)
+    store.stop()
+    assert len(os.listdir(tmp_path)) == 3
+
+    # a new process only has the on-disk history
+    history = HistoryStore(archive=SegmentStore(str(tmp_path)))
+    assert history.metrics() == ["skid.skid_flow", "tank.tank_level_mm"]
+    result = history.query("tank.tank_level_mm", BASE, BASE + 149, max_points=15)
+    assert result["resolution"] == 10
+    assert len(result["points"]) == 15
+    assert result["points"][0] == [BASE, 4.5, 0.0, 9.0]
+    assert result["points"][-1] == [BASE + 140, 144.5, 140.0, 149.0]
+
+
+def test_partly_written_rows_are_ignored(tmp_path):
+    store = SegmentStore(str(tmp_path))
+    write_samples(store, 10)
+    store.stop()
+    (path,) = tmp_path.iterdir()
+    with open(path, "ab") as f:
+        f.write(b"\1\2\3")
+
+    (segment,) = SegmentStore(str(tmp_path)).segments
+    assert (segment.rows, segment.start, segment.end) == (10, BASE, BASE + 9)
+
+
+def test_old_segments_are_compacted_then_deleted(tmp_path):
+    store = SegmentStore(
+        str(tmp_path), segment_seconds=3600, compact_after=3600, retention=86400
+    )
+    write_samples(store, 600)
+    store.stop()
+
+    store._maintain(now=BASE + 7200)
+    (segment,) = store.segments
+    assert (segment.resolution, segment.rows) == (60, 10)
+    assert SegmentStore(str(tmp_path)).query("tank.tank_level_mm", BASE, BASE + 60, 10)[
+        1
+    ][0] == (BASE, 29.5, 29.5, 29.5, 1)
+
+    store._maintain(now=BASE + 2 * 86400)
+    assert store.segments == [] and os.listdir(tmp_path) == []
@@ -0,0 +1,60 @@
+"""
+Tests for the async (aiohttp) serving mode.
+"""
+
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.serving import AsyncDashboardServer
+
+
+def test_async_routes_match_the_flask_routes():
+    dashboard = SiaDashboard(serving_mode="async")
+    dashboard.update_data(tank={"tank_level_mm": 1200})
+    flask_client = dashboard.app.test_client()
+
+    async def check():
+        async with TestClient(
+            TestServer(AsyncDashboardServer(dashboard).app)
+        ) as client:
+            response = await client.get("/api/data")
+            assert await response.read() == flask_client.get("/api/data").data
+            etag = response.headers["ETag"]
+            assert (
+                await client.get("/api/data", headers={"If-None-Match": etag})
+            ).status == 304
+
+            for path in (
+                "/api/fleet/pumps",
+                "/api/history",
+                "/api/history?metric=tank.tank_level_mm&from=0&to=2",
+            ):
+                response = await client.get(path)
+                assert response.status == 200
+                assert await response.json() == flask_client.get(path).json
+            for path in (
+                "/api/fleet/valves",
+                "/api/history?metric=nope",
+                "/api/history?metric=x&to=now",
+            ):
+                assert (await client.get(path)).status == flask_client.get(
+                    path
+                ).status_code
+            assert (await client.get("/static/js/dashboard.js")).status == 200
+
+    asyncio.run(check())
+
+
+def test_socket_handlers_reply_with_events():
+    dashboard = SiaDashboard()
+    assert dashboard.client_connected("a")[0] == "data_update"
+    assert dashboard.fleet_request({"kind": "pumps"})[0] == "fleet_data"
+    assert dashboard.fleet_request({"kind": "valves"}) == (
+        "error",
+        {"message": "Unknown fleet: valves"},
+    )
+    assert dashboard.data_request({"since": dashboard.data.version})[0] == "data_patch"
+    dashboard.client_disconnected("a")
+    assert not dashboard.connected_clients
@@ -0,0 +1,114 @@
+"""
+Tests for the fleet simulator and its stand-in tag store.
+"""
+
+import asyncio
+import random
+
+import pytest
+
+from sia_local_control_ui.simulator import (
+    Faults,
+    FleetSimulator,
+    SimulatedUnit,
+    parse_faults,
+)
+from sia_local_control_ui.tags import TagReader, TagReadPlan
+
+
+def run_for(simulator, seconds, step=0.1):
+    start = simulator._last or 0.0
+    for i in range(int(seconds / step) + 1):
+        simulator.step(start + i * step)
+
+
+def test_pumps_follow_their_target_and_draw_down_the_tank():
+    simulator = FleetSimulator(pumps=2, solar=1, tanks=1, seed=1)
+    for pump in simulator.pumps:
+        pump.state = "auto"
+    level = simulator.tanks[0].level_mm
+    run_for(simulator, 30)
+
+    for pump in simulator.pumps:
+        assert abs(pump.flow_rate - pump.target_rate) < 0.01
+        tags = simulator.store.tags[pump.app_key]
+        assert (
+            tags["StateString"] == "auto"
+            and abs(tags["FlowRate"] - pump.target_rate) < 1.0
+        )
+    assert simulator.tanks[0].level_mm < level
+    assert 0 <= simulator.store.tags["sim_tank_1"]["tank_level_percent"] <= 100
+
+
+def test_commands_written_to_the_store_change_the_pump():
+    simulator = FleetSimulator(pumps=1, solar=0, seed=1)
+    run_for(simulator, 1)
+    asyncio.run(
+        simulator.store.set_tag_async("StateCommand", "standby", app_key="sim_pump_1")
+    )
+    asyncio.run(
+        simulator.store.set_tag_async("TargetRateCommand", 42.0, app_key="sim_pump_1")
+    )
+    simulator.step(60.0)
+
+    assert simulator.store.get_tag("StateString", "sim_pump_1") == "standby"
+    assert simulator.store.get_tag("TargetRate", "sim_pump_1") == 42.0
+    assert simulator.pumps[0].flow_rate < 0.01
+
+
+def test_solar_charges_by_day_and_drains_by_night():
+    simulator = FleetSimulator(
+        pumps=0, solar=1, tanks=0, time_scale=60.0, start_hour=9.0, seed=1
+    )
+    solar = simulator.solar[0]
+    charge = solar.remaining_ah
+    run_for(simulator, 60, step=1.0)  # an hour around mid-morning
+    assert solar.panel_power > 0 and solar.remaining_ah > charge
+
+    simulator.clock = 22 * 3600.0
+    charge = solar.remaining_ah
+    run_for(simulator, 60, step=1.0)
+    assert solar.panel_power == 0 and solar.remaining_ah < charge
+
+
+def test_faults_freeze_or_drop_tags():
+    simulator = FleetSimulator(
+        pumps=1, solar=0, tanks=0, faults=Faults(dropout_per_hour=3600.0), seed=1
+    )
+    run_for(simulator, 5)
+    assert simulator.fault_counts["dropout"] >= 1
+    assert simulator.store.get_tag("FlowRate", "sim_pump_1") is None
+
+    simulator = FleetSimulator(
+        pumps=1, solar=0, tanks=0, faults=parse_faults("stale=3600"), seed=1
+    )
+    run_for(simulator, 5)
+    writes = simulator.store.writes
+    simulator.step(5.2)
+    assert simulator.pumps[0].fault == "stale" and simulator.store.writes == writes
+
+
+def test_tag_reader_reads_the_simulated_fleet():
+    simulator = FleetSimulator(pumps=3, solar=2, tanks=1, seed=1)
+    run_for(simulator, 2)
+    config = simulator.app_config()
+    plan = TagReadPlan(
+        config["pump_controllers"],
+        config["solar_controllers"],
+        config["tank_level_app"],
+        config["flow_sensor_app"],
+        config["pressure_sensor_app"],
+    )
+    values = TagReader(plan, simulator.store.get_tag).read()
+
+    assert len(values) == len(plan) and None not in values.values()
+    assert values[("sim_flow_sensor", "flow_rate")] >= 0
+
+
+def test_a_unit_must_implement_step_and_tags():
+    class Incomplete(SimulatedUnit):
+        def step(self, dt, now, store):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", 1.0, random.Random(1))
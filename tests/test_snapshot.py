@@ -0,0 +1,76 @@
+"""
+Tests for the immutable dashboard snapshot store.
+"""
+
+import threading
+import time
+
+import pytest
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.snapshot import DashboardData, SnapshotStore
+
+
+def test_updates_build_new_snapshots():
+    store = SnapshotStore()
+    first = store.current
+    second = store.update(
+        {
+            "pump": {"flow_rate": "12.5", "pump_state": "auto"},
+            "system": {"status": "standby"},
+        }
+    )
+
+    assert store.current is second
+    assert second.version == first.version + 1
+    assert (first.flow_rate, second.flow_rate) == (0.0, 12.5)
+    assert second.to_dict()["pump"] == {
+        "target_rate": 0.0,
+        "flow_rate": 12.5,
+        "pump_state": "auto",
+        "stale_since": None,
+    }
+    assert second.to_dict()["system"]["status"] == "standby"
+    with pytest.raises(AttributeError):
+        second.flow_rate = 1.0
+
+
+def test_invalid_section_is_rejected_whole():
+    with pytest.raises(ValueError):
+        DashboardData.coerce_section("pump2", {"flow_rate": 1.0, "target_rate": "-"})
+
+
+def test_serialisation_is_cached_per_snapshot():
+    snapshot = SnapshotStore().update({"tank": {"tank_level_mm": 100}})
+    assert snapshot.encoded() is snapshot.encoded()
+    assert snapshot.to_dict() is snapshot.to_dict()
+
+
+def test_encoded_payload_is_spliced_into_packets():
+    import json
+
+    from sia_local_control_ui.encoding import PacketJSON
+
+    snapshot = SnapshotStore().update({"tank": {"tank_level_mm": 100}})
+    packet = PacketJSON.dumps(["data_update", snapshot.encoded()])
+    event, payload = json.loads(packet)
+    assert event == "data_update"
+    assert payload == {**snapshot.to_dict(), "version": snapshot.version}
+
+
+def test_heartbeats_leave_the_version_and_etag_alone():
+    dashboard = SiaDashboard()
+    dashboard.client_connected("a")
+    sent = []
+    dashboard.emit = lambda event, data: sent.append(event)
+    before = dashboard.data
+
+    dashboard._running = True
+    thread = threading.Thread(target=dashboard._background_updates)
+    thread.start()
+    time.sleep(0.2)
+    dashboard._running = False
+    thread.join()
+
+    assert sent == ["heartbeat"]
+    assert dashboard.data is before and dashboard.data.etag == before.etag
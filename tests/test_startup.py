@@ -0,0 +1,43 @@
+"""
+Tests for the deferred web stack and startup timings.
+"""
+
+import subprocess
+import sys
+
+from sia_local_control_ui.assets import index_page
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.startup import StartupTimer
+
+
+def test_application_import_defers_the_web_stack():
+    code = (
+        "import sys, sia_local_control_ui.application; "
+        "print(sorted(m for m in ('flask', 'flask_socketio', 'jinja2') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_index_page_is_rendered_once_with_static_urls():
+    page = index_page()
+    assert page is index_page()
+    assert b'src="/static/js/dashboard.' in page and b"{{" not in page
+
+    # the Flask app is only built when it's first used, and serves the same page
+    dashboard = SiaDashboard()
+    assert dashboard._app is None
+    assert dashboard.app.test_client().get("/").data == page
+
+
+def test_startup_timer_records_phases():
+    timer = StartupTimer()
+    with timer.phase("setup"):
+        pass
+    timer.mark("first loop")
+    assert timer.reached("first loop") and not timer.reached("dashboard serving")
+    phases = timer.to_dict()
+    assert list(phases) == ["setup", "first loop"]
+    assert phases["first loop"]["at_ms"] >= phases["setup"]["at_ms"] >= 0
@@ -0,0 +1,90 @@
+"""
+Tests for the /api/stream data stream.
+"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.stream import DataStream, parse_fields, select_fields
+
+
+def test_fields_select_sections_fields_and_units():
+    fields = parse_fields("tank, pump.flow_rate,pumps/pump-1")
+    assert fields == (("tank", None), ("pump", "flow_rate"), ("pumps/pump-1", None))
+    data = {
+        "tank": {"tank_level_mm": 1.0},
+        "pump": {"flow_rate": 2.0, "target_rate": 3.0},
+        "pumps": {
+            "count": 2,
+            "units": {"pump-1": {"flow": 1.0}, "pump-2": {"flow": 2.0}},
+        },
+    }
+    assert select_fields(data, fields) == {
+        "tank": {"tank_level_mm": 1.0},
+        "pump": {"flow_rate": 2.0},
+        "pumps": {"units": {"pump-1": {"flow": 1.0}}},
+    }
+    for invalid in ("nope", "pump.nope", "tank/unit"):
+        with pytest.raises(ValueError):
+            parse_fields(invalid)
+    with pytest.raises(ValueError):
+        DataStream.from_args({"interval": "-1"})
+    assert DataStream.from_args({}, "text/event-stream").format == "sse"
+
+
+def test_frames_skip_versions_that_dont_change_the_selected_fields():
+    dashboard = SiaDashboard()
+    stream = DataStream(parse_fields("tank.tank_level_mm"), interval=60.0)
+    dashboard.update_data(tank={"tank_level_mm": 1000.0})
+    dashboard.broadcast_update()
+    assert json.loads(stream.frame(dashboard.published)) == {
+        "tank": {"tank_level_mm": 1000.0},
+        "version": 1,
+    }
+    assert stream.frame(dashboard.published) is None
+    dashboard.update_data(solar={"battery_voltage": 12.0})
+    dashboard.broadcast_update()
+    assert stream.frame(dashboard.published) is None
+    assert stream.delay() > 59
+
+
+def test_streams_follow_broadcasts_until_the_dashboard_stops():
+    dashboard = SiaDashboard()
+    frames = dashboard.streams.frames(DataStream(fmt="sse"))
+    assert next(frames).startswith(b"id: 0\nevent: data\ndata: {")
+
+    def publish():
+        dashboard.update_data(tank={"tank_level_mm": 1250.0})
+        dashboard.broadcast_update()
+
+    threading.Timer(0.05, publish).start()
+    assert b'"tank_level_mm":1250.0' in next(frames)
+    assert len(dashboard.streams) == 1
+    dashboard.streams.close()
+    assert list(frames) == []
+    assert len(dashboard.streams) == 0
+
+
+def test_async_streams_are_woken_from_other_threads():
+    dashboard = SiaDashboard()
+
+    async def consume():
+        frames = dashboard.streams.aframes(DataStream())
+        first = await anext(frames)
+        threading.Timer(
+            0.05,
+            lambda: (
+                dashboard.update_data(tank={"tank_level_mm": 5.0}),
+                dashboard.broadcast_update(),
+            ),
+        ).start()
+        second = await asyncio.wait_for(anext(frames), 5)
+        dashboard.streams.close()
+        rest = [frame async for frame in frames]
+        return json.loads(first)["version"], json.loads(second)["version"], rest
+
+    assert asyncio.run(consume()) == (0, 1, [])
@@ -0,0 +1,76 @@
+"""
+Tests for section and unit subscriptions.
+"""
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.delta import select_topics
+
+
+def make_dashboard():
+    dashboard = SiaDashboard()
+    sent = []
+    dashboard.fanout._send = lambda sid, event, payload, callback: sent.append(
+        (sid, event, payload.message)
+    )
+    return dashboard, sent
+
+
+def test_select_topics_keeps_sections_and_units():
+    data = {
+        "tank": {"tank_level_mm": 1.0},
+        "solar": {"battery_voltage": 12.0},
+        "pumps": {
+            "count": 2,
+            "units": {"pump-1": {"flow": 1.0}, "pump-2": {"flow": 2.0}},
+        },
+    }
+    assert select_topics(data, ("tank",)) == {"tank": {"tank_level_mm": 1.0}}
+    assert select_topics(data, ("pumps/pump-2", "skid")) == {
+        "pumps": {"units": {"pump-2": {"flow": 2.0}}}
+    }
+    assert select_topics(data, ("skid",)) == {}
+
+
+def test_subscribe_sends_only_the_subscribed_parts():
+    dashboard, _sent = make_dashboard()
+    dashboard.update_data(
+        tank={"tank_level_mm": 1250.0}, solar={"battery_voltage": 12.5}
+    )
+    dashboard.broadcast_update()
+    dashboard.client_connected("a")
+
+    event, payload = dashboard.subscribe_request({"topics": ["tank"]}, "a")
+    assert event == "data_update"
+    message = payload.data if hasattr(payload, "data") else payload
+    assert b"tank_level_mm" in message and b"battery_voltage" not in message
+    assert dashboard.fanout.room("a") == ("tank",)
+    assert dashboard.subscribe_request({"topics": ["nope"]}, "a")[0] == "error"
+    # a fleet subscribed in full covers its units
+    assert dashboard._room(["pumps/pump-1", "pumps", "tank"]) == ("pumps", "tank")
+    assert dashboard._room([]) is None
+
+
+def test_broadcasts_only_reach_rooms_whose_data_changed():
+    dashboard, sent = make_dashboard()
+    dashboard.update_data(
+        tank={"tank_level_mm": 1000.0}, solar={"battery_voltage": 12.0}
+    )
+    dashboard.broadcast_update()
+    for sid, topics in (("tank", ["tank"]), ("solar", ["solar"]), ("all", None)):
+        dashboard.client_connected(sid)
+        dashboard.subscribe_request({"topics": topics}, sid)
+    sent.clear()
+
+    dashboard.update_data(tank={"tank_level_mm": 1100.0})
+    dashboard.broadcast_update()
+    assert sorted(sid for sid, _event, _message in sent) == ["all", "tank"]
+    room_patch = next(message for sid, _event, message in sent if sid == "tank")
+    assert room_patch["patch"] == {"tank": {"tank_level_mm": 1100.0}}
+    version = room_patch["version"]
+
+    # a room's patches are based on the last version the room was sent
+    dashboard.fanout.acknowledged("solar")
+    dashboard.update_data(solar={"battery_voltage": 12.4})
+    dashboard.broadcast_update()
+    solar_patch = next(message for sid, _event, message in sent if sid == "solar")
+    assert solar_patch["base"] < version < solar_patch["version"]
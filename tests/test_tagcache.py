@@ -0,0 +1,80 @@
+"""
+Tests for last-good-value caching and staleness of tag reads.
+"""
+
+import time
+
+from sia_local_control_ui.polling import PollScheduler
+from sia_local_control_ui.tagcache import GOOD, MISSING, STALE, TagCache
+from sia_local_control_ui.tags import TagReader, TagReadPlan
+
+FLOW = ("pump-1", "FlowRate")
+LEVEL = ("tank", "tank_level_mm")
+
+
+def test_failed_reads_keep_the_last_good_value_until_the_ttl():
+    cache = TagCache({FLOW: 5.0})
+    assert cache.update({FLOW: 12.5}, now=0.0) == {FLOW}
+    assert cache.update({FLOW: 12.5}, now=1.0) == set()
+
+    # a failing read holds the last good value and isn't a change
+    assert cache.update({FLOW: None}, now=2.0) == set()
+    assert cache.values[FLOW] == 12.5 and cache.quality(FLOW, now=2.0) == GOOD
+    assert not cache.expire(now=2.0)
+
+    # past the TTL it is stale, with its age, until a read succeeds again
+    assert cache.expire(now=7.0)
+    assert cache.quality(FLOW, now=7.0) == STALE and cache.age(FLOW, now=7.0) == 6.0
+    # since the wall clock time of the last good read, the same on every call
+    since = cache.stale_since([FLOW], now=7.0)
+    assert abs(since - time.time()) < 1.0
+    assert not cache.expire(now=8.0)
+    assert cache.stale_since([FLOW], now=8.0) == since
+
+    assert cache.update({FLOW: 13.0}, now=9.0) == {FLOW}
+    assert cache.expire(now=9.0) and cache.stale_since([FLOW], now=9.0) is None
+
+
+def test_tags_that_never_read_are_missing():
+    cache = TagCache()
+    cache.update({FLOW: 12.5, LEVEL: None}, now=0.0)
+    assert cache.quality(LEVEL) == MISSING and cache.values[LEVEL] is None
+    assert cache.stale_since([LEVEL]) == 0.0
+    assert cache.stale_since([FLOW]) is None
+    assert cache.stats(now=0.0) == {GOOD: 1, STALE: 0, MISSING: 1}
+
+
+def test_a_failing_tag_does_not_lose_the_rest_of_the_batch():
+    plan = TagReadPlan(["pump-1"], [], tank_app="tank")
+
+    def get_tag(tag, app):
+        if app == "tank":
+            raise ConnectionError("agent unavailable")
+        return 1.0
+
+    reader = TagReader(plan, get_tag)
+    values = reader.read()
+    assert values[("tank", "tank_level_mm")] is None
+    assert values[FLOW] == 1.0
+    assert reader.errors == 2 and reader.stats()["errors"] == 2
+
+
+def test_scheduler_publishes_only_when_a_section_goes_stale():
+    plan = TagReadPlan(["pump-1"], [], tank_app="tank")
+    cache = TagCache(default_ttl=1.0)
+    scheduler = PollScheduler(
+        plan.poll_sources({"pumps": 0.2, "solar": 1.0, "tank": 0.2}, max_interval=0.2),
+        cache,
+    )
+    values = {"tank": 500.0}
+
+    def read(pairs):
+        return {pair: values.get(pair[0], 1.0) for pair in pairs}
+
+    assert scheduler.poll(read, now=0.0)[1]
+    values["tank"] = None
+    assert not scheduler.poll(read, now=0.2)[1]
+    assert scheduler.values[LEVEL] == 500.0
+    assert scheduler.poll(read, now=1.2)[1]
+    assert cache.stale_since(plan.section_reads["tank"], now=1.2) is not None
+    assert cache.stale_since(plan.section_reads["pump"], now=1.2) is None
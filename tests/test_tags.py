@@ -0,0 +1,31 @@
+"""
+Tests for planned, batched tag acquisition.
+"""
+
+from sia_local_control_ui.tags import TagReader, TagReadPlan
+
+
+def test_plan_covers_every_configured_app():
+    plan = TagReadPlan(
+        ["pump-1", "pump-2"], ["solar-1"], tank_app="tank", flow_sensor_app="flow"
+    )
+    assert len(plan) == 2 * 3 + 4 + 2 + 1
+    assert ("pump-2", "StateString") in plan.reads
+    assert ("solar-1", "remaining_ah") in plan.reads
+    assert ("flow", "flow_rate") in plan.reads
+
+
+def test_reader_reads_batch_and_reports_latency():
+    tags = {"pump-1": {"TargetRate": 5.0, "FlowRate": 4.0, "StateString": "auto"}}
+    reader = TagReader(
+        TagReadPlan(["pump-1"], []), lambda tag, app: tags.get(app, {}).get(tag)
+    )
+
+    values = reader.read()
+    assert values == {
+        ("pump-1", "TargetRate"): 5.0,
+        ("pump-1", "FlowRate"): 4.0,
+        ("pump-1", "StateString"): "auto",
+    }
+    assert reader.stats()["tags"] == 3
+    assert reader.stats()["max_ms"] >= 0.0
@@ -0,0 +1,72 @@
+"""
+Tests for the binary wire format.
+"""
+
+from datetime import datetime
+
+from sia_local_control_ui.dashboard import SiaDashboard
+from sia_local_control_ui.encoding import RawJSON
+from sia_local_control_ui.wire import BinaryCodec, WirePayload
+
+
+def test_messages_round_trip_with_float32_values():
+    codec = BinaryCodec()
+    timestamp = datetime(2025, 1, 2, 3, 4, 5)
+    message = {
+        "version": 7,
+        "pump": {"flow_rate": 12.3, "pump_state": "auto", "stale_since": 1792292246.5},
+        "tank": {"tank_level_mm": None},
+        "pumps": {"count": 0, "units": {}},
+        "system": {"timestamp": timestamp.isoformat(), "ok": True},
+    }
+    decoded = codec.decode(codec.encode(message))
+
+    assert abs(decoded["pump"]["flow_rate"] - 12.3) < 1e-5
+    assert (
+        decoded["pump"]["stale_since"] == 1792292246.5
+    )  # too big for float32, sent as float64
+    assert decoded["pump"]["pump_state"] == "auto"
+    assert decoded["tank"] == {"tank_level_mm": None}
+    assert decoded["pumps"] == {"count": 0, "units": {}}
+    assert decoded["system"] == {"timestamp": timestamp.timestamp() * 1000, "ok": True}
+    assert decoded["version"] == 7
+
+
+def test_field_ids_replace_key_names_and_the_schema_only_grows():
+    codec = BinaryCodec()
+    message = {"solar": {"battery_percentage": 81.5}}
+    first = codec.encode(message)
+    assert b"battery_percentage" not in first
+    assert len(first) == 7 + 3 + 4
+    assert codec.encode({"tank": {"tank_level_percent": 50.0}})
+    assert codec.schema() == [
+        ["solar", "battery_percentage"],
+        ["tank", "tank_level_percent"],
+    ]
+    # a message only needs the part of the schema it uses
+    assert codec.encode(message) == first
+
+
+def test_payloads_are_encoded_per_client_format():
+    dashboard = SiaDashboard()
+    dashboard.update_data(tank={"tank_level_mm": 1250.0})
+    dashboard.broadcast_update()
+
+    reply = dashboard.format_request({"format": "binary"}, "binary-client")
+    assert ["tank", "tank_level_mm"] in reply["schema"]
+    assert ["patch", "tank", "tank_level_mm"] in reply["schema"]
+    assert "error" in dashboard.format_request({"format": "xml"}, "other")
+
+    event, payload = dashboard.data_request({}, "binary-client")
+    assert event == "data_update" and isinstance(payload, bytes)
+    assert dashboard.codec.decode(payload)["tank"]["tank_level_mm"] == 1250.0
+    event, payload = dashboard.data_request({}, "json-client")
+    assert isinstance(payload, RawJSON)
+
+    message = {"version": 2, "base": 1, "patch": {"tank": {"tank_level_mm": 1.0}}}
+    wire = WirePayload(message, dashboard.codec)
+    assert wire.encoded("json").data == RawJSON.encode(message).data
+    assert wire.encoded("binary") is wire.encoded("binary")
+
+    dashboard.client_disconnected("binary-client")
+    assert "binary-client" not in dashboard.client_formats